@@ -0,0 +1,32 @@
+"""
+Export every Measurement's summary features and Context/Component keys from Neo4j
+into a memory-mapped NumPy index for k-NN few-shot example selection.
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+
+from src.kg.knn_index import MeasurementIndex
+from src.kg.store import load_neo4j_store
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the Measurement k-NN index.")
+    parser.add_argument("--neo4j-config", default="configs/neo4j.yaml")
+    parser.add_argument("--output-dir", default="outputs/measurement_index")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with load_neo4j_store(Path(args.neo4j_config)) as store:
+        index = MeasurementIndex.build_from_store(store, batch_size=args.batch_size)
+    index.save(Path(args.output_dir))
+    elapsed = time.perf_counter() - start
+    print(f"Indexed {len(index)} measurements into {args.output_dir} in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Score predicted SOC sequences against ground truth for a whole testset.
+
+The testset JSONL holds one query per line with its id, the user query and
+either the ground-truth SOC list (``ground_truth``) or the recordId of the
+ground-truth State node (``state_id``), read from the KG. Context fields used for
+the breakdowns (``temperature_C``, ``lifeStage``, ``chemistry`` by default) come
+from the testset line (top level or under ``context``) or, when missing, from
+hints in the user query. Predictions are JSONL lines with the same query id and
+the final LLM reply (or a list of numbers).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.evaluation import SOC_GROUP_KEYS, parse_soc_batch, score_soc, truth_array
+from src.kg.features import query_hints
+from src.kg.store import load_graph_store
+
+ID_FIELDS = ("query_id", "request_id", "id")
+PREDICTION_FIELDS = ("estimated_soc", "prediction", "final_response", "response", "output")
+TRUTH_FIELDS = ("ground_truth", "soc_ground_truth", "soc")
+
+
+def first_field(item: Dict[str, Any], fields: Tuple[str, ...]) -> Any:
+    for name in fields:
+        if item.get(name) not in (None, ""):
+            return item[name]
+    return None
+
+
+def load_jsonl(path: Path) -> List[Dict[str, Any]]:
+    with path.open("r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def group_label(item: Dict[str, Any], hints: Dict[str, Any], key: str) -> Optional[Any]:
+    for source in (item, item.get("context") or {}, hints):
+        if source.get(key) is not None:
+            return source[key]
+    return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Score SOC predictions against a testset.")
+    parser.add_argument("--testset", required=True, help="JSONL of queries with ground truth.")
+    parser.add_argument("--predictions", required=True, help="JSONL of predictions by query id.")
+    parser.add_argument(
+        "--prediction-field",
+        default=None,
+        help=f"Field holding the prediction (default: first of {', '.join(PREDICTION_FIELDS)}).",
+    )
+    parser.add_argument("--neo4j-config", default="configs/neo4j.yaml")
+    parser.add_argument(
+        "--graph-snapshot",
+        default=None,
+        help="Local KG snapshot used instead of Neo4j to read State.values for state_id lines.",
+    )
+    parser.add_argument("--value-dict", default="configs/kg_value_dict_min.json")
+    parser.add_argument("--group-by", nargs="*", default=list(SOC_GROUP_KEYS))
+    parser.add_argument(
+        "--workers", type=int, default=0, help="Processes for parsing replies (0: in-process)."
+    )
+    parser.add_argument("--output", default="outputs/kg_prompting/soc_metrics.json")
+    parser.add_argument("--per-query-output", default=None, help="Also write per-query scores.")
+    args = parser.parse_args()
+
+    testset = load_jsonl(Path(args.testset))
+    predictions: Dict[str, Any] = {}
+    fields = (args.prediction_field,) if args.prediction_field else PREDICTION_FIELDS
+    for item in load_jsonl(Path(args.predictions)):
+        predictions[str(first_field(item, ID_FIELDS))] = first_field(item, fields)
+
+    start = time.perf_counter()
+    query_ids = [
+        str(first_field(item, ID_FIELDS) or line_no)
+        for line_no, item in enumerate(testset, start=1)
+    ]
+    truths = [truth_array(first_field(item, TRUTH_FIELDS)) for item in testset]
+    state_ids = [
+        item["state_id"]
+        for item, truth in zip(testset, truths)
+        if truth is None and item.get("state_id") is not None
+    ]
+    if state_ids:
+        snapshot = Path(args.graph_snapshot) if args.graph_snapshot else None
+        with load_graph_store(Path(args.neo4j_config), snapshot) as store:
+            values = store.fetch_values("State", state_ids)
+        truths = [
+            truth if truth is not None else truth_array(values.get(item.get("state_id")))
+            for item, truth in zip(testset, truths)
+        ]
+    loaded = time.perf_counter()
+
+    parsed = parse_soc_batch(
+        [predictions.get(query_id) for query_id in query_ids],
+        [len(truth) if truth is not None else None for truth in truths],
+        workers=args.workers,
+    )
+    parse_done = time.perf_counter()
+
+    scores = score_soc(query_ids, parsed, truths)
+    value_dict_path = Path(args.value_dict)
+    value_dict = (
+        json.loads(value_dict_path.read_text(encoding="utf-8")) if value_dict_path.exists() else {}
+    )
+    hints = [query_hints(str(item.get("user_query") or ""), value_dict) for item in testset]
+    labels = {
+        key: [group_label(item, hint, key) for item, hint in zip(testset, hints)]
+        for key in args.group_by
+    }
+    report: Dict[str, Any] = {
+        "overall": scores.summary(),
+        "missing_truth": sum(truth is None for truth in truths),
+        "missing_prediction": sum(query_id not in predictions for query_id in query_ids),
+        "by": {key: scores.breakdown(key_labels) for key, key_labels in labels.items()},
+    }
+    scored = time.perf_counter()
+    report["timing_s"] = {
+        "load": round(loaded - start, 4),
+        "parse": round(parse_done - loaded, 4),
+        "score": round(scored - parse_done, 4),
+    }
+
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    if args.per_query_output:
+        with Path(args.per_query_output).open("w", encoding="utf-8") as out:
+            for row in scores.per_query():
+                out.write(json.dumps(row) + "\n")
+
+    overall = report["overall"]
+    print(
+        f"{overall['parsed']}/{overall['queries']} parsed; MAE={overall['mae']} "
+        f"RMSE={overall['rmse']} max={overall['max_error']}"
+    )
+    for key, groups in report["by"].items():
+        for name, stats in sorted(groups.items()):
+            print(
+                f"  {key}={name:<12} n={stats['queries']:<6} "
+                f"MAE={stats['mae']} RMSE={stats['rmse']}"
+            )
+    print(f"Timing: {report['timing_s']}; wrote {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+Copy the battery KG from Neo4j into a local sqlite snapshot that the pipeline
+scripts can use via --graph-snapshot, without a running Neo4j server.
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+
+from src.kg.local_store import export_snapshot
+from src.kg.store import load_neo4j_store
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export the KG into a local snapshot.")
+    parser.add_argument("--neo4j-config", default="configs/neo4j.yaml")
+    parser.add_argument("--output", default="outputs/kg_snapshot.sqlite")
+    parser.add_argument(
+        "--batch-size", type=int, default=2000, help="Records per fetch of each streamed read."
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with load_neo4j_store(Path(args.neo4j_config)) as store:
+        counts = export_snapshot(store, Path(args.output), batch_size=args.batch_size)
+    elapsed = time.perf_counter() - start
+    summary = ", ".join(f"{name}={count}" for name, count in counts.items())
+    print(f"Wrote {args.output} in {elapsed:.1f}s ({summary})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Load a campaign of raw cell test data (Excel/CSV) into the KG: files are parsed
+in parallel worker processes, cut into fixed-length windows and written as
+Measurement/State nodes with batched, idempotent MERGEs on recordId.
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+
+from src.kg.ingest import (
+    Neo4jIngestWriter,
+    SnapshotIngestWriter,
+    iter_source_results,
+    load_ingest_spec,
+)
+from src.kg.store import load_neo4j_store
+from src.kg.values import VALUE_FORMATS
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Ingest raw test data into the KG.")
+    parser.add_argument("--manifest", required=True, help="Campaign YAML (see README).")
+    parser.add_argument("--neo4j-config", default="configs/neo4j.yaml")
+    parser.add_argument(
+        "--snapshot",
+        default=None,
+        help="Write a new local snapshot (for --graph-snapshot) instead of writing to Neo4j.",
+    )
+    parser.add_argument("--workers", type=int, default=4, help="Parser processes.")
+    parser.add_argument("--batch-size", type=int, default=2000, help="Rows per UNWIND batch.")
+    parser.add_argument("--window", type=int, default=None, help="Override the manifest window.")
+    parser.add_argument("--stride", type=int, default=None, help="Override the manifest stride.")
+    parser.add_argument(
+        "--value-format",
+        default=None,
+        choices=VALUE_FORMATS,
+        help="Override the manifest value_format (storage of values arrays).",
+    )
+    args = parser.parse_args()
+
+    spec = load_ingest_spec(Path(args.manifest))
+    if args.window:
+        spec.window = args.window
+    if args.stride:
+        spec.stride = args.stride
+    if args.value_format:
+        spec.value_format = args.value_format
+    print(f"Campaign {spec.campaign}: {len(spec.sources)} files, window {spec.window} rows")
+
+    store = None
+    if args.snapshot:
+        writer = SnapshotIngestWriter(Path(args.snapshot))
+    else:
+        store = load_neo4j_store(Path(args.neo4j_config))
+        writer = Neo4jIngestWriter(store.driver, store.config.database, args.batch_size)
+    start = time.perf_counter()
+    rows = records = dropped = failed = 0
+    try:
+        writer.prepare(spec)
+        for result in iter_source_results(spec, workers=args.workers):
+            if result.error is not None:
+                failed += 1
+                print(f"{result.source.path.name}: failed ({result.error})")
+                continue
+            written = writer.write(result.records)
+            rows += result.rows
+            records += written
+            dropped += len(result.records) - written
+            skipped = f", skipped sheets {result.skipped_sheets}" if result.skipped_sheets else ""
+            if written < len(result.records):
+                skipped += f", dropped {len(result.records) - written} windows"
+            elapsed = time.perf_counter() - start
+            print(
+                f"{result.source.path.name}: {result.rows} rows -> {len(result.records)} windows"
+                f"{skipped} ({rows / max(elapsed, 1e-9):.0f} rows/s)"
+            )
+        counts = writer.close()
+    finally:
+        if store is not None:
+            store.close()
+    elapsed = time.perf_counter() - start
+    print(
+        f"Ingested {rows} rows into {records} measurements in {elapsed:.1f}s "
+        f"({failed} files failed, {dropped} windows dropped): {counts}"
+    )
+
+
+if __name__ == "__main__":
+    main()
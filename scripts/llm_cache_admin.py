@@ -0,0 +1,35 @@
+"""
+Inspect or invalidate the on-disk LLM completion cache.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+
+from src.llm_cache import CompletionCache
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage the LLM completion cache.")
+    parser.add_argument("--cache", required=True, help="sqlite cache file.")
+    parser.add_argument("--invalidate-model", action="append", default=[])
+    parser.add_argument("--clear", action="store_true")
+    args = parser.parse_args()
+
+    cache = CompletionCache(Path(args.cache))
+    try:
+        if args.clear:
+            cache.clear()
+            print("Cleared cache.")
+        for model in args.invalidate_model:
+            removed = cache.invalidate_model(model)
+            print(f"Removed {removed} entries for model {model}.")
+        print(json.dumps(cache.stats(), indent=2))
+    finally:
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
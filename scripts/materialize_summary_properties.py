@@ -0,0 +1,39 @@
+"""
+Explode Measurement/State summary JSON strings into typed summary_* properties
+and create range indexes on them and on the Context/Component filter fields.
+"""
+
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+
+from src.kg.store import load_neo4j_store
+from src.kg.summary import create_indexes, materialize_summaries
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Materialize typed summary properties.")
+    parser.add_argument("--neo4j-config", default="configs/neo4j.yaml")
+    parser.add_argument("--labels", nargs="+", default=["Measurement", "State"])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--skip-indexes", action="store_true")
+    args = parser.parse_args()
+
+    store = load_neo4j_store(Path(args.neo4j_config))
+    driver, database = store.driver, store.config.database
+    try:
+        for label in args.labels:
+            updated = materialize_summaries(
+                driver, label, database=database, batch_size=args.batch_size
+            )
+            print(f"{label}: materialized summary properties on {updated} nodes")
+        if not args.skip_indexes:
+            for statement in create_indexes(driver, database=database):
+                print(statement)
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
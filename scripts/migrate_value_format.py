@@ -0,0 +1,54 @@
+"""
+Re-encode Measurement/State ``values`` arrays as JSON strings, native float
+lists or little-endian float32 byte arrays (see src/kg/values.py), in Neo4j or
+in a local snapshot.
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+
+from src.kg.local_store import migrate_snapshot_values
+from src.kg.store import load_neo4j_store
+from src.kg.values import VALUE_FORMATS, migrate_values
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Migrate the storage format of values arrays.")
+    parser.add_argument("--format", required=True, choices=VALUE_FORMATS)
+    parser.add_argument("--neo4j-config", default="configs/neo4j.yaml")
+    parser.add_argument(
+        "--snapshot", default=None, help="Migrate this local snapshot in place instead of Neo4j."
+    )
+    parser.add_argument("--labels", nargs="+", default=["Measurement", "State"])
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.snapshot:
+        for label in args.labels:
+            updated = migrate_snapshot_values(
+                Path(args.snapshot), label, args.format, batch_size=args.batch_size
+            )
+            print(f"{label}: re-encoded values of {updated} nodes as {args.format}")
+    else:
+        store = load_neo4j_store(Path(args.neo4j_config))
+        try:
+            for label in args.labels:
+                updated = migrate_values(
+                    store.driver,
+                    label,
+                    args.format,
+                    database=store.config.database,
+                    batch_size=args.batch_size,
+                )
+                print(f"{label}: re-encoded values of {updated} nodes as {args.format}")
+        finally:
+            store.close()
+    print(f"Done in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
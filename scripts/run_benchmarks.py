@@ -0,0 +1,201 @@
+"""
+Benchmark the KG prompting pipeline against a local mock LLM endpoint and a KG
+snapshot, writing per-stage latency percentiles, QPS and peak RSS to JSON.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import tempfile
+import time
+from contextlib import ExitStack
+from dataclasses import replace
+from pathlib import Path
+from typing import Any, Dict, List
+
+from src.benchmark.fixtures import synthetic_queries, write_synthetic_snapshot
+from src.benchmark.harness import Scenario, peak_rss_mb, run_scenario
+from src.benchmark.mock_llm import MockLLMServer, MockLLMSettings
+from src.config import LLMConfig, ProviderConfig
+from src.kg.local_store import LocalGraphStore
+from src.llm_router import LLMRouter, build_llm_client
+from src.pipeline_cli import add_pipeline_arguments, build_pipeline, load_assets
+
+MODES = ("llm", "rules")
+
+
+def parse_int_list(text: str) -> List[int]:
+    return [int(part) for part in text.split(",") if part.strip()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the KG prompting pipeline.")
+    parser.add_argument("--output", default="outputs/benchmarks/results.json")
+    parser.add_argument(
+        "--graph-snapshot",
+        default=None,
+        help="Recorded KG snapshot (scripts/export_kg_snapshot.py); a synthetic one is "
+        "generated when omitted.",
+    )
+    parser.add_argument("--measurements", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200, help="Queries per batch scenario.")
+    parser.add_argument("--single-queries", type=int, default=20)
+    parser.add_argument("--concurrency", default="1,4,16")
+    parser.add_argument("--modes", default="llm,rules", help=f"Subset of {','.join(MODES)}.")
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of slow replies.")
+    parser.add_argument("--slow-ms", type=float, default=1000.0)
+    parser.add_argument(
+        "--providers",
+        type=int,
+        default=1,
+        help="Number of mock providers; more than one routes requests through LLMRouter.",
+    )
+    parser.add_argument(
+        "--mock-max-in-flight",
+        type=int,
+        default=0,
+        help="Mock providers answer 429 beyond this many concurrent requests (0 = unlimited).",
+    )
+    parser.add_argument("--retry-after-ms", type=float, default=None)
+    parser.add_argument("--rpm", type=float, default=None, help="Client-side requests/minute.")
+    parser.add_argument("--tpm", type=float, default=None, help="Client-side tokens/minute.")
+    parser.add_argument("--max-concurrency", type=int, default=64)
+    parser.add_argument("--max-retries", type=int, default=1)
+    parser.add_argument("--retry-backoff-ms", type=float, default=0.0)
+    parser.add_argument("--hedge-after-ms", type=float, default=None)
+    parser.add_argument("--hedge-quantile", type=float, default=None)
+    parser.add_argument(
+        "--chunk-interval-ms",
+        type=float,
+        default=0.0,
+        help="Mock delay between streamed chunks, emulating decode speed.",
+    )
+    parser.add_argument("--label", default=None, help="Free-form tag stored with the results.")
+    add_pipeline_arguments(
+        parser, backends=False, stream_help="Stream completions (SSE) with early Cypher dispatch."
+    )
+    args = parser.parse_args()
+
+    modes = [mode for mode in args.modes.split(",") if mode]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        raise SystemExit(f"Unknown modes: {', '.join(sorted(unknown))}")
+
+    settings = MockLLMSettings(
+        latency_s=args.latency_ms / 1000.0,
+        jitter_s=args.jitter_ms / 1000.0,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        chunk_interval_s=args.chunk_interval_ms / 1000.0,
+        slow_rate=args.slow_rate,
+        slow_s=args.slow_ms / 1000.0,
+        max_in_flight=args.mock_max_in_flight,
+        retry_after_s=args.retry_after_ms / 1000.0 if args.retry_after_ms is not None else None,
+    )
+    assets = load_assets(args)
+    queries = synthetic_queries(max(args.queries, args.single_queries))
+    results: Dict[str, Any] = {
+        "label": args.label,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            key: value for key, value in vars(args).items() if key not in ("output", "label")
+        },
+        "scenarios": [],
+    }
+
+    with tempfile.TemporaryDirectory() as tmp, ExitStack() as servers:
+        mocks = [
+            servers.enter_context(MockLLMServer(replace(settings, seed=settings.seed + i)))
+            for i in range(max(args.providers, 1))
+        ]
+        if args.graph_snapshot:
+            snapshot = Path(args.graph_snapshot)
+            results["fixture"] = {"snapshot": str(snapshot)}
+        else:
+            snapshot = Path(tmp) / "kg_snapshot.sqlite"
+            start = time.perf_counter()
+            counts = write_synthetic_snapshot(snapshot, measurements=args.measurements)
+            results["fixture"] = {
+                "synthetic": counts,
+                "build_s": round(time.perf_counter() - start, 3),
+            }
+        llm_cfg = LLMConfig(
+            provider="mock",
+            api_base=mocks[0].api_base,
+            api_key="benchmark",
+            model="mock",
+            max_retries=args.max_retries,
+            retry_backoff=args.retry_backoff_ms / 1000.0,
+            rpm=args.rpm,
+            tpm=args.tpm,
+            max_concurrency=args.max_concurrency,
+            providers=[
+                ProviderConfig(f"mock{i}", mock.api_base, "mock", api_key="benchmark")
+                for i, mock in enumerate(mocks)
+            ],
+            hedge_after_s=(
+                args.hedge_after_ms / 1000.0 if args.hedge_after_ms is not None else None
+            ),
+            hedge_quantile=args.hedge_quantile,
+        )
+        client = build_llm_client(llm_cfg)
+        store = LocalGraphStore(snapshot)
+        try:
+            start = time.perf_counter()
+            store.warm_up()
+            results["fixture"]["load_s"] = round(time.perf_counter() - start, 3)
+            for mode in modes:
+                pipeline = build_pipeline(
+                    argparse.Namespace(**dict(vars(args), rule_based_retrieval=mode == "rules")),
+                    assets=assets,
+                    llm_config=llm_cfg,
+                    llm_client=client,
+                    store=store,
+                )
+                scenarios = [Scenario(f"{mode}/single", 1, args.single_queries)] + [
+                    Scenario(f"{mode}/batch-c{level}", level, args.queries)
+                    for level in parse_int_list(args.concurrency)
+                ]
+                for scenario in scenarios:
+                    try:
+                        result = run_scenario(pipeline, scenario, queries)
+                    finally:
+                        pipeline.close()
+                    result["mode"] = mode
+                    results["scenarios"].append(result)
+                    total = result["stages"]["total"]
+                    print(
+                        f"{scenario.name:<18} qps={result['qps']} "
+                        f"p50={total.get('p50_ms')}ms p95={total.get('p95_ms')}ms "
+                        f"p99={total.get('p99_ms')}ms errors={sum(result['errors'].values())}"
+                    )
+        finally:
+            if isinstance(client, LLMRouter):
+                results["providers"] = client.stats()
+            else:
+                results["rate_limiter"] = client.limiter(llm_cfg.model).stats()
+            store.close()
+            client.close()
+        results["mock_llm"] = {
+            "requests": sum(mock.requests for mock in mocks),
+            "injected_errors": sum(mock.errors for mock in mocks),
+            "throttled": sum(mock.throttled for mock in mocks),
+        }
+    results["peak_rss_mb"] = peak_rss_mb()
+
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"Wrote {output_path}")
+
+
+if __name__ == "__main__":
+    main()
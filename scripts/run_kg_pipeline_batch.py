@@ -0,0 +1,241 @@
+"""
+Batch KG prompting pipeline over a JSONL file of queries with bounded concurrency.
+
+Each input line is a JSON object holding a query id and the user query text.
+Results are appended to the output JSONL as they complete; re-running with the
+same output file skips queries that already finished successfully. With
+``--run-store`` every run is also kept, with its prompts, KG rows and trace, in
+a compressed sqlite run store (``src/run_store.py``).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from src import tracing
+from src.kg.values import json_default
+from src.pipeline import KGPromptingPipeline
+from src.pipeline_cli import add_pipeline_arguments, build_pipeline, close_pipeline, pipeline_stats
+from src.run_store import RunStore
+
+ID_FIELDS = ("query_id", "request_id", "id")
+QUERY_FIELDS = ("user_query", "query", "body")
+
+
+def first_field(item: Dict[str, Any], fields: Tuple[str, ...]) -> Any:
+    for name in fields:
+        if item.get(name) not in (None, ""):
+            return item[name]
+    return None
+
+
+def iter_queries(path: Path) -> Iterator[Tuple[str, str]]:
+    with path.open("r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            query_id = first_field(item, ID_FIELDS)
+            user_query = first_field(item, QUERY_FIELDS)
+            if user_query is None:
+                raise RuntimeError(f"{path}:{line_no}: missing one of {QUERY_FIELDS}.")
+            yield str(query_id if query_id is not None else line_no), str(user_query)
+
+
+def load_completed_ids(path: Path) -> Set[str]:
+    completed: Set[str] = set()
+    if not path.exists():
+        return completed
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A partially written trailing line from an interrupted run.
+                continue
+            if not record.get("error"):
+                completed.add(str(record.get("query_id")))
+    return completed
+
+
+def run_one(
+    pipeline: KGPromptingPipeline,
+    query_id: str,
+    user_query: str,
+    include_kg_results: bool,
+    trace_writer: Optional[tracing.TraceWriter] = None,
+    trace_aggregator: Optional[tracing.TraceAggregator] = None,
+    stream_dir: Optional[Path] = None,
+    run_store: Optional[RunStore] = None,
+) -> Dict[str, Any]:
+    record: Dict[str, Any] = {"query_id": query_id, "user_query": user_query}
+    start = time.perf_counter()
+    stream_file = None
+    output = None
+    trace = None
+    try:
+        with tracing.start_trace(query_id) as trace:
+            try:
+                if stream_dir is not None:
+                    stream_file = (stream_dir / f"{query_id}.txt").open("w", encoding="utf-8")
+                output = pipeline.run(
+                    user_query, on_delta=stream_file.write if stream_file is not None else None
+                )
+            finally:
+                if stream_file is not None:
+                    stream_file.close()
+                if trace_writer is not None:
+                    trace_writer.write(trace)
+                if trace_aggregator is not None:
+                    trace_aggregator.add(trace)
+        record.update(
+            {
+                "retrieval_response": output.retrieval_raw,
+                "retrieval_source": output.retrieval_source,
+                "cypher": output.cypher,
+                "cypher_parameters": output.cypher_parameters,
+                "kg_row_count": len(output.rows),
+                "kg_triplets": output.triplets,
+                "enhanced_prompt": output.enhanced_prompt,
+                "stage_s": {stage: round(t, 4) for stage, t in output.timings.items()},
+            }
+        )
+        if output.relaxation:
+            record["relaxation"] = output.relaxation
+        if output.context_report:
+            record["context_report"] = output.context_report
+        if include_kg_results:
+            record["kg_results"] = output.rows
+    except Exception as exc:
+        record["error"] = f"{type(exc).__name__}: {exc}"
+    record["elapsed_s"] = round(time.perf_counter() - start, 4)
+    if run_store is not None:
+        stored = dict(record)
+        if output is not None:
+            stored["retrieval_prompt"] = output.retrieval_prompt
+            stored["kg_results"] = output.rows
+        if trace is not None:
+            stored["trace"] = trace.to_dict()
+        run_store.append(stored)
+    return record
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run KG prompting pipeline over a JSONL batch.")
+    parser.add_argument("--queries", required=True, help="JSONL file of queries.")
+    parser.add_argument("--output", default="outputs/kg_prompting/batch_results.jsonl")
+    parser.add_argument("--concurrency", type=int, default=8)
+    add_pipeline_arguments(
+        parser,
+        stream_help="Stream completions: each query's graph lookup starts as soon as its Cypher "
+        "arrives, and enhanced prompts are written to <output>.stream/<query_id>.txt "
+        "while they are generated.",
+    )
+    parser.add_argument("--include-kg-results", action="store_true")
+    parser.add_argument(
+        "--trace-output",
+        default=None,
+        help="Per-query span JSONL (default: <output>.trace.jsonl); a .summary.json with "
+        "per-span aggregates is written next to it.",
+    )
+    parser.add_argument("--chrome-trace", default=None, help="Also write a Chrome trace JSON.")
+    parser.add_argument(
+        "--run-store",
+        default=None,
+        help="sqlite run store that also keeps each run's prompts, KG rows and trace "
+        "(scripts/run_store_admin.py reads it); its finished queries are skipped too.",
+    )
+    args = parser.parse_args()
+
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    completed = load_completed_ids(output_path)
+    run_store = RunStore(Path(args.run_store)) if args.run_store else None
+    if run_store is not None:
+        completed |= run_store.completed_ids()
+    pending: List[Tuple[str, str]] = [
+        (query_id, user_query)
+        for query_id, user_query in iter_queries(Path(args.queries))
+        if query_id not in completed
+    ]
+    print(f"{len(completed)} queries already done, {len(pending)} pending.")
+    if not pending:
+        if run_store is not None:
+            run_store.close()
+        return
+
+    stream_dir = output_path.with_name(output_path.stem + ".stream") if args.stream else None
+    if stream_dir is not None:
+        stream_dir.mkdir(parents=True, exist_ok=True)
+    pipeline = build_pipeline(args)
+
+    trace_path = (
+        Path(args.trace_output)
+        if args.trace_output
+        else output_path.with_name(output_path.stem + ".trace.jsonl")
+    )
+    trace_writer = tracing.TraceWriter(
+        trace_path, Path(args.chrome_trace) if args.chrome_trace else None
+    )
+    trace_aggregator = tracing.TraceAggregator()
+
+    failed = 0
+    start = time.perf_counter()
+    try:
+        with output_path.open("a", encoding="utf-8") as out, ThreadPoolExecutor(
+            max_workers=max(args.concurrency, 1)
+        ) as pool:
+            futures = [
+                pool.submit(
+                    run_one,
+                    pipeline,
+                    query_id,
+                    user_query,
+                    args.include_kg_results,
+                    trace_writer,
+                    trace_aggregator,
+                    stream_dir,
+                    run_store,
+                )
+                for query_id, user_query in pending
+            ]
+            for done, future in enumerate(as_completed(futures), start=1):
+                record = future.result()
+                if record.get("error"):
+                    failed += 1
+                out.write(json.dumps(record, ensure_ascii=True, default=json_default) + "\n")
+                out.flush()
+                if done % 50 == 0 or done == len(futures):
+                    elapsed = time.perf_counter() - start
+                    print(f"{done}/{len(futures)} done ({done / elapsed:.2f} q/s, {failed} failed)")
+    finally:
+        close_pipeline(pipeline)
+        for name, stats in pipeline_stats(pipeline).items():
+            print(f"{name}: {stats}")
+        trace_writer.close()
+        if run_store is not None:
+            print(f"Run store: {run_store.stats()}")
+            run_store.close()
+
+    summary = trace_aggregator.summary()
+    summary_path = trace_path.with_name(trace_path.name.replace(".jsonl", "") + ".summary.json")
+    summary_path.write_text(json.dumps(summary, indent=2), encoding="utf-8")
+    for name, stats in sorted(summary["spans"].items(), key=lambda item: -item[1]["total_s"]):
+        print(
+            f"  {name:<36} n={stats['count']:<6} total={stats['total_s']:.2f}s "
+            f"p50={stats['p50_ms']:.1f}ms p95={stats['p95_ms']:.1f}ms"
+        )
+    print(f"Wrote results to {output_path} and traces to {trace_path}")
+
+
+if __name__ == "__main__":
+    main()
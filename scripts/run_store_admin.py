@@ -0,0 +1,66 @@
+"""
+Look up, list or export runs kept in a run store (``--run-store``).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+from src.run_store import RunStore
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Inspect a pipeline run store.")
+    parser.add_argument("--store", required=True, help="sqlite run store file.")
+    parser.add_argument("--query-id", default=None, help="Show the latest run of this query.")
+    parser.add_argument("--run-id", type=int, default=None, help="Show this run.")
+    parser.add_argument(
+        "--field",
+        action="append",
+        default=[],
+        help="Print only these fields of the shown run (repeatable), e.g. enhanced_prompt.",
+    )
+    parser.add_argument("--list", action="store_true", help="List runs, newest first.")
+    parser.add_argument("--since-hours", type=float, default=None)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--export", default=None, help="Write all runs to this JSONL file.")
+    args = parser.parse_args()
+
+    since = time.time() - args.since_hours * 3600 if args.since_hours is not None else None
+    store = RunStore(Path(args.store))
+    try:
+        if args.run_id is not None or (args.query_id and not args.list):
+            record = store.get(args.run_id) if args.run_id is not None else None
+            if record is None and args.query_id:
+                record = store.latest(args.query_id)
+            if record is None:
+                sys.exit("No such run.")
+            for name in args.field:
+                value = record.get(name)
+                print(value if isinstance(value, str) else json.dumps(value, indent=2))
+            if not args.field:
+                print(json.dumps(record, ensure_ascii=False, indent=2, default=str))
+            return
+        if args.list:
+            for run in store.runs(query_id=args.query_id, since=since, limit=args.limit):
+                created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(run.created))
+                status = f"error: {run.error}" if run.error else "ok"
+                print(f"{run.run_id:>8}  {created}  {run.query_id:<24} {status}")
+        if args.export:
+            count = 0
+            with Path(args.export).open("w", encoding="utf-8") as out:
+                for record in store.iter_records(since=since):
+                    out.write(json.dumps(record, ensure_ascii=True, default=str) + "\n")
+                    count += 1
+            print(f"Exported {count} runs to {args.export}")
+        print(json.dumps(store.stats(), indent=2))
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Resident KG prompting service: loads configs, templates, schema and value
+dictionary once, keeps the graph store and LLM connections warm and answers
+concurrent queries over HTTP (TCP or a Unix socket). Asset files are reloaded
+when they change on disk.
+"""
+
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+
+from src.file_cache import ReloadingValue
+from src.pipeline_cli import (
+    add_pipeline_arguments,
+    asset_files,
+    build_pipeline,
+    close_pipeline,
+    load_assets,
+)
+from src.run_store import RunStore
+from src.service import PipelineService, make_server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve the KG prompting pipeline over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--unix-socket", default=None, help="Listen on this Unix socket instead of --host/--port."
+    )
+    parser.add_argument(
+        "--reload-interval",
+        type=float,
+        default=1.0,
+        help="Seconds between checks of the schema/example/value-dict files for changes.",
+    )
+    parser.add_argument(
+        "--max-concurrent",
+        type=int,
+        default=32,
+        help="Queries run at once; further requests wait for a slot.",
+    )
+    add_pipeline_arguments(
+        parser,
+        stream_help="Stream completions: the graph query starts as soon as the Cypher field "
+        "arrives and requests with \"stream\": true receive the enhanced prompt as it is "
+        "generated.",
+    )
+    parser.add_argument(
+        "--run-store",
+        default=None,
+        help="Keep every answered query (prompts, KG rows, trace) in this sqlite run store.",
+    )
+    args = parser.parse_args()
+
+    assets = ReloadingValue(
+        lambda: load_assets(args),
+        list(asset_files(args).values()),
+        check_interval_s=args.reload_interval,
+    )
+    pipeline = build_pipeline(args, assets=assets.get())
+    pipeline.store.warm_up()
+    service = PipelineService(
+        pipeline,
+        assets,
+        Path(args.schema_file),
+        llm_client=pipeline.generation.client,
+        max_concurrent=args.max_concurrent,
+        run_store=RunStore(Path(args.run_store)) if args.run_store else None,
+    )
+    server = make_server(
+        service,
+        host=args.host,
+        port=args.port,
+        unix_socket=Path(args.unix_socket) if args.unix_socket else None,
+    )
+    where = args.unix_socket or f"http://{args.host}:{server.server_address[1]}"
+    print(f"Serving the KG prompting pipeline on {where} (POST /query, GET /health, GET /stats)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        close_pipeline(pipeline)
+        if service.run_store is not None:
+            service.run_store.close()
+
+
+if __name__ == "__main__":
+    main()
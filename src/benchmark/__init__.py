@@ -0,0 +1 @@
+"""Benchmark harness: mock LLM endpoint, synthetic KG fixtures and scenario runner."""
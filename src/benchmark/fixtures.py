@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import json
+import random
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from src.kg.local_store import SnapshotWriter
+from src.kg.summary import SUMMARY_SIGNALS
+
+COMPONENTS = (("NMC", 2.0), ("NMC", 3.0), ("LFP", 2.5))
+TEMPERATURES_C = (0.0, 25.0, 45.0)
+LIFE_STAGES = ("fresh", "aged")
+SUBPHASES = ("CC", "CV", "rest")
+
+# Reply of the mock retrieval LLM; matches a broad slice of the synthetic KG.
+CANNED_CYPHER = """MATCH (m:Measurement)-[r1:MEASURES]->(c:Component)
+MATCH (ctx:Context)-[r2:SUPPLIES]->(m)
+MATCH (m)-[r3:ESTIMATES]->(s:State)
+WHERE c.chemistry = 'NMC'
+  AND s.stateType = 'SOC'
+  AND m.summary_voltage_v_mean >= 3.40 AND m.summary_voltage_v_mean <= 4.10
+OPTIONAL MATCH (ctx)-[r4:DEGRADES]->(c)
+RETURN c, ctx, m, s, r1, r2, r3, r4
+LIMIT 20"""
+
+
+def _sequence(rng: random.Random, points: int, temperature: float) -> List[Tuple[float, ...]]:
+    voltage = rng.uniform(3.3, 4.15)
+    current = rng.choice((-2.0, -1.0, -0.5, 0.5, 1.0))
+    temp = temperature + rng.uniform(-1.0, 1.0)
+    rows = []
+    for _ in range(points):
+        rows.append((round(voltage, 4), round(current, 3), round(temp, 2)))
+        voltage += 0.004 * current + rng.uniform(-0.002, 0.002)
+        temp += rng.uniform(-0.05, 0.1)
+    return rows
+
+
+def _summary(sequence: List[Tuple[float, ...]]) -> Dict[str, Dict[str, float]]:
+    summary = {}
+    for i, signal in enumerate(SUMMARY_SIGNALS):
+        column = [row[i] for row in sequence]
+        summary[signal] = {
+            "start": column[0],
+            "end": column[-1],
+            "mean": round(sum(column) / len(column), 4),
+        }
+    return summary
+
+
+def write_synthetic_snapshot(
+    path: Path, measurements: int = 2000, points: int = 30, seed: int = 0
+) -> Dict[str, int]:
+    """Write a KG snapshot shaped like the battery KG, with random (V, I, T) windows."""
+    rng = random.Random(seed)
+    writer = SnapshotWriter(path)
+    for i, (chemistry, capacity) in enumerate(COMPONENTS):
+        writer.add_node(
+            f"c{i}",
+            "Component",
+            {"id": f"C{i}", "chemistry": chemistry, "ratedCapacity_Ah": capacity},
+        )
+    contexts = []
+    for temperature in TEMPERATURES_C:
+        for stage in LIFE_STAGES:
+            for subphase in SUBPHASES:
+                key = f"ctx{len(contexts)}"
+                props = {
+                    "id": key.upper(),
+                    "temperature_C": temperature,
+                    "lifeStage": stage,
+                    "operatingSubphase": subphase,
+                }
+                writer.add_node(key, "Context", props)
+                contexts.append((key, temperature))
+                if stage == "aged":
+                    for c in range(len(COMPONENTS)):
+                        writer.add_relationship("DEGRADES", key, f"c{c}", {"factor": 0.9})
+    for i in range(measurements):
+        ctx_key, temperature = rng.choice(contexts)
+        sequence = _sequence(rng, points, temperature)
+        soc = rng.uniform(0.2, 0.95)
+        writer.add_node(
+            f"m{i}",
+            "Measurement",
+            {
+                "recordId": f"M{i:06d}",
+                "summary": json.dumps(_summary(sequence)),
+                "values": json.dumps([list(row) for row in sequence]),
+            },
+        )
+        writer.add_node(
+            f"s{i}",
+            "State",
+            {
+                "recordId": f"S{i:06d}",
+                "stateType": "SOC",
+                "values": json.dumps([round(soc - 0.001 * k, 4) for k in range(points)]),
+            },
+        )
+        writer.add_relationship("MEASURES", f"m{i}", f"c{rng.randrange(len(COMPONENTS))}", {})
+        writer.add_relationship("SUPPLIES", ctx_key, f"m{i}", {})
+        writer.add_relationship("ESTIMATES", f"m{i}", f"s{i}", {"method": "coulomb_counting"})
+    return writer.close()
+
+
+def synthetic_queries(count: int, points: int = 30, seed: int = 1) -> List[str]:
+    """User queries with a (V, I, T) sequence plus chemistry/capacity/context hints."""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        chemistry, capacity = rng.choice(COMPONENTS)
+        temperature = rng.choice(TEMPERATURES_C)
+        sequence = ", ".join(
+            f"({v}, {i}, {t})" for v, i, t in _sequence(rng, points, temperature)
+        )
+        queries.append(
+            f"Estimate SOC for this {points}-point (V, I, T) sequence of a {chemistry} "
+            f"{capacity} Ah cell ({rng.choice(LIFE_STAGES)}, {rng.choice(SUBPHASES)}) at "
+            f"{temperature:g} °C: {sequence}"
+        )
+    return queries
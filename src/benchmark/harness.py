@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import math
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+from src.pipeline import KGPromptingPipeline
+
+STAGES = ("retrieval", "graph", "format", "generation", "total")
+
+
+@dataclass
+class Scenario:
+    name: str
+    concurrency: int
+    queries: int
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of ``values``; ``nan`` when empty."""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def latency_stats(values: Sequence[float]) -> Dict[str, Any]:
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": round(1000 * sum(values) / len(values), 3),
+        "p50_ms": round(1000 * percentile(values, 50), 3),
+        "p95_ms": round(1000 * percentile(values, 95), 3),
+        "p99_ms": round(1000 * percentile(values, 99), 3),
+        "max_ms": round(1000 * max(values), 3),
+    }
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process, or ``None`` where unsupported."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is kilobytes on Linux and bytes on macOS.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_scenario(
+    pipeline: KGPromptingPipeline, scenario: Scenario, queries: Sequence[str]
+) -> Dict[str, Any]:
+    batch = [queries[i % len(queries)] for i in range(scenario.queries)]
+    samples: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+    errors: Dict[str, int] = {}
+    rows: List[int] = []
+    lock = threading.Lock()
+
+    def one(user_query: str) -> None:
+        start = time.perf_counter()
+        try:
+            output = pipeline.run(user_query)
+        except Exception as exc:
+            with lock:
+                name = type(exc).__name__
+                errors[name] = errors.get(name, 0) + 1
+            return
+        elapsed = time.perf_counter() - start
+        with lock:
+            samples["total"].append(elapsed)
+            for stage, seconds in output.timings.items():
+                samples.setdefault(stage, []).append(seconds)
+            rows.append(len(output.rows))
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=scenario.concurrency) as pool:
+        list(pool.map(one, batch))
+    wall = time.perf_counter() - wall_start
+    completed = len(samples["total"])
+    return {
+        "name": scenario.name,
+        "concurrency": scenario.concurrency,
+        "queries": scenario.queries,
+        "completed": completed,
+        "errors": errors,
+        "wall_s": round(wall, 4),
+        "qps": round(completed / wall, 3) if wall > 0 else None,
+        "mean_rows": round(sum(rows) / len(rows), 2) if rows else 0,
+        "stages": {stage: latency_stats(values) for stage, values in samples.items()},
+        "peak_rss_mb": peak_rss_mb(),
+    }
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from src.benchmark.fixtures import CANNED_CYPHER
+
+CANNED_ENHANCED_PROMPT = (
+    "You are estimating SOC for a battery cell. Use the KG examples below as few-shot "
+    "references: each pairs a (V, I, T) measurement summary with its SOC sequence."
+)
+CANNED_RATIONALE = (
+    "The query describes an NMC cell discharging at room temperature, so the Cypher "
+    "filters Measurements by component chemistry and operating context, follows the "
+    "ESTIMATES edge to the SOC state and orders by measurement id so the examples are "
+    "stable across runs."
+)
+
+
+@dataclass
+class MockLLMSettings:
+    latency_s: float = 0.05
+    jitter_s: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 503
+    # A fraction ``slow_rate`` of requests takes ``slow_s`` longer (tail latency).
+    slow_rate: float = 0.0
+    slow_s: float = 1.0
+    # Reply 429 (with Retry-After, if set) beyond this many concurrent requests; 0 = unlimited.
+    max_in_flight: int = 0
+    retry_after_s: Optional[float] = None
+    cypher: str = CANNED_CYPHER
+    enhanced_prompt: str = CANNED_ENHANCED_PROMPT
+    rationale: str = CANNED_RATIONALE
+    seed: int = 0
+    # Replies are decoded in chunks of this many characters, this far apart: streamed
+    # replies send each chunk as it is ready, others wait for the whole reply.
+    chunk_chars: int = 16
+    chunk_interval_s: float = 0.0
+
+
+class MockLLMServer:
+    """Local stand-in for an OpenAI-compatible ``/chat/completions`` endpoint.
+
+    Retrieval prompts get a ``{"cypher": ..., "rationale": ...}`` reply and
+    generation prompts (those containing ``<KG Triplets>``) the canned
+    enhanced prompt, after ``latency_s`` (+ uniform jitter). A fraction
+    ``error_rate`` of requests fails with ``error_status``. Requests with
+    ``"stream": true`` get the reply as SSE chunks.
+    """
+
+    def __init__(
+        self, settings: Optional[MockLLMSettings] = None, host: str = "127.0.0.1", port: int = 0
+    ) -> None:
+        self.settings = settings or MockLLMSettings()
+        self._rng = random.Random(self.settings.seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self.in_flight = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                status, body = server.respond(self.path, payload)
+                if status == 200 and payload.get("stream"):
+                    self.send_stream(body)
+                    return
+                if status == 200:
+                    time.sleep(server.decode_time(body))
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                if status == 429 and server.settings.retry_after_s is not None:
+                    self.send_header("Retry-After", f"{server.settings.retry_after_s:g}")
+                self.end_headers()
+                self.wfile.write(data)
+
+            def send_stream(self, body: Dict[str, Any]) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for event in server.stream_events(body):
+                        data = f"data: {event}\n\n".encode("utf-8")
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                        self.wfile.flush()
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client stopped reading mid-stream.
+                    self.close_connection = True
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def api_base(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def respond(self, path: str, payload: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        settings = self.settings
+        with self._lock:
+            self.requests += 1
+            delay = settings.latency_s + self._rng.uniform(0.0, settings.jitter_s)
+            if self._rng.random() < settings.slow_rate:
+                delay += settings.slow_s
+            failed = self._rng.random() < settings.error_rate
+            if failed:
+                self.errors += 1
+            throttled = 0 < settings.max_in_flight <= self.in_flight
+            if throttled:
+                self.throttled += 1
+            else:
+                self.in_flight += 1
+        if throttled:
+            return 429, {"error": {"message": "rate limit exceeded"}}
+        try:
+            time.sleep(delay)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        if not path.rstrip("/").endswith("/chat/completions"):
+            return 404, {"error": {"message": f"Unknown path {path}"}}
+        if failed:
+            return settings.error_status, {"error": {"message": "injected failure"}}
+        prompt = "\n".join(str(m.get("content", "")) for m in payload.get("messages", []))
+        if "<KG Triplets>" in prompt:
+            content = settings.enhanced_prompt
+        else:
+            content = json.dumps({"cypher": settings.cypher, "rationale": settings.rationale})
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(content) // 4
+        return 200, {
+            "id": f"mock-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "mock"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def decode_time(self, body: Dict[str, Any]) -> float:
+        content = body["choices"][0]["message"]["content"]
+        chunks = -(-len(content) // max(self.settings.chunk_chars, 1))
+        return max(chunks - 1, 0) * self.settings.chunk_interval_s
+
+    def stream_events(self, body: Dict[str, Any]) -> Iterator[str]:
+        content = body["choices"][0]["message"]["content"]
+        size = max(self.settings.chunk_chars, 1)
+        start = time.perf_counter()
+        for n, i in enumerate(range(0, len(content), size)):
+            # Pace against the start time so per-sleep overshoot does not accumulate.
+            wait = start + n * self.settings.chunk_interval_s - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            delta = {"content": content[i : i + size]}
+            yield json.dumps({"id": body["id"], "choices": [{"index": 0, "delta": delta}]})
+        yield json.dumps({"id": body["id"], "choices": [], "usage": body["usage"]})
+        yield "[DONE]"
+
+    def start(self) -> "MockLLMServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "MockLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
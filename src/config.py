@@ -1,6 +1,8 @@
+import os
 from dataclasses import dataclass
 from dataclasses import field
 from pathlib import Path
+from typing import List, Optional
 
 
 @dataclass
@@ -14,6 +16,31 @@ class Neo4jConfig:
     connection_acquisition_timeout: int = 30
     read_tx_timeout: int = 60
     default_limit: int = 100
+    fetch_size: int = 1000
+
+
+@dataclass
+class ProviderConfig:
+    name: str
+    api_base: str
+    model: str
+    type: str = "openai"
+    api_key: Optional[str] = None
+    api_key_env: Optional[str] = None
+    temperature: Optional[float] = None
+    max_tokens: Optional[int] = None
+    # Per-provider quota; defaults to the top-level rpm/tpm.
+    rpm: Optional[float] = None
+    tpm: Optional[float] = None
+
+    def resolve_api_key(self) -> str:
+        if self.api_key:
+            return self.api_key
+        if self.api_key_env and os.environ.get(self.api_key_env):
+            return os.environ[self.api_key_env]
+        raise RuntimeError(
+            f"No API key for provider {self.name!r}: set api_key or ${self.api_key_env}."
+        )
 
 
 @dataclass
@@ -24,6 +51,19 @@ class LLMConfig:
     model: str
     max_retries: int = 3
     retry_backoff: float = 2.0
+    cache_path: Optional[str] = None
+    cache_max_mb: int = 512
+    # Client-side quota (requests / tokens per minute) and the ceiling for the adaptive
+    # concurrency limit, shared by every client of the same endpoint and model.
+    rpm: Optional[float] = None
+    tpm: Optional[float] = None
+    max_concurrency: int = 64
+    # Several OpenAI-compatible endpoints behind one router (src/llm_router.py).
+    providers: List[ProviderConfig] = field(default_factory=list)
+    # Send a second request to the next provider when the first takes longer than this.
+    hedge_after_s: Optional[float] = None
+    # Raise the hedge delay to this percentile (0-100) of the provider's recent latency.
+    hedge_quantile: Optional[float] = None
 
 
 @dataclass
@@ -46,10 +86,26 @@ def load_yaml_config(path: Path) -> dict:
         return yaml.safe_load(f)
 
 
+def load_llm_config(path: Path) -> LLMConfig:
+    """LLM config from either the single-endpoint format or a ``providers:`` list.
+
+    With a ``providers:`` list, the first provider also fills the single-endpoint
+    fields, so callers that ignore ``providers`` keep working.
+    """
+    llm_dict = dict(load_yaml_config(path))
+    providers = [ProviderConfig(**entry) for entry in llm_dict.pop("providers", None) or []]
+    if providers and "api_base" not in llm_dict:
+        primary = providers[0]
+        llm_dict.setdefault("provider", primary.name)
+        llm_dict.setdefault("model", primary.model)
+        llm_dict["api_base"] = primary.api_base
+        llm_dict.setdefault("api_key", primary.resolve_api_key())
+    return LLMConfig(**llm_dict, providers=providers)
+
+
 def load_app_config(
     neo4j_path: Path = Path("configs/neo4j.yaml"),
     llm_path: Path = Path("configs/llm_baseline.yaml"),
 ) -> AppConfig:
     neo4j_dict = load_yaml_config(neo4j_path)
-    llm_dict = load_yaml_config(llm_path)
-    return AppConfig(neo4j=Neo4jConfig(**neo4j_dict), llm=LLMConfig(**llm_dict))
+    return AppConfig(neo4j=Neo4jConfig(**neo4j_dict), llm=load_llm_config(llm_path))
@@ -0,0 +1,213 @@
+"""
+Batch SOC evaluation: parse predicted SOC sequences from LLM outputs, align them
+with ground-truth ``State.values`` and score the whole batch at once.
+
+Parsing follows the old per-script rule: the last non-empty line if it holds
+exactly the expected number of values, otherwise every number in the text
+(the trailing ``expected`` ones when there are more). Scoring pads sequences
+into one ``(queries, points)`` matrix so MAE/RMSE/max-error and per-context
+breakdowns are a handful of NumPy reductions.
+"""
+
+from __future__ import annotations
+
+import re
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+FLOAT_RE = re.compile(r"[-+]?(?:\d+\.\d*|\.\d+|\d+)(?:[eE][-+]?\d+)?")
+SOC_GROUP_KEYS = ("temperature_C", "lifeStage", "chemistry")
+UNKNOWN_GROUP = "unknown"
+
+
+def _floats(text: str) -> np.ndarray:
+    return np.array(FLOAT_RE.findall(text), dtype=np.float64)
+
+
+def parse_soc(text: Any, expected: Optional[int] = None) -> Optional[np.ndarray]:
+    """Predicted SOC sequence in ``text`` (an LLM reply, or a list of numbers)."""
+    if text is None:
+        return None
+    if not isinstance(text, str):
+        values = np.asarray(text, dtype=np.float64).ravel()
+        return values if expected is None or len(values) == expected else None
+    lines = [line for line in text.splitlines() if line.strip()]
+    if lines and expected:
+        values = _floats(lines[-1])
+        if len(values) == expected:
+            return values
+    values = _floats(text)
+    if expected is None:
+        return values if len(values) else None
+    if len(values) < expected or expected == 0:
+        return None
+    return values[-expected:]
+
+
+def _parse_chunk(
+    texts: Sequence[Any], expected: Sequence[Optional[int]]
+) -> List[Optional[np.ndarray]]:
+    return [parse_soc(text, count) for text, count in zip(texts, expected)]
+
+
+def parse_soc_batch(
+    texts: Sequence[Any],
+    expected: Sequence[Optional[int]],
+    workers: int = 0,
+    chunk_size: int = 2000,
+) -> List[Optional[np.ndarray]]:
+    """``parse_soc`` over many outputs, split into chunks across ``workers`` processes.
+
+    With ``workers <= 1`` (or a single chunk) parsing stays in this process.
+    """
+    if len(texts) != len(expected):
+        raise ValueError("texts and expected must have the same length.")
+    starts = range(0, len(texts), max(chunk_size, 1))
+    if workers <= 1 or len(starts) <= 1:
+        return _parse_chunk(texts, expected)
+    parsed: List[Optional[np.ndarray]] = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunks = pool.map(
+            _parse_chunk,
+            [texts[i : i + chunk_size] for i in starts],
+            [expected[i : i + chunk_size] for i in starts],
+        )
+        for chunk in chunks:
+            parsed.extend(chunk)
+    return parsed
+
+
+def truth_array(values: Any) -> Optional[np.ndarray]:
+    """Ground-truth SOC as a 1-D array, from decoded ``State.values`` or a plain list."""
+    if values is None:
+        return None
+    if isinstance(values, dict):
+        values = values.get("soc", next(iter(values.values()), None))
+        if values is None:
+            return None
+    if isinstance(values, str):
+        return parse_soc(values)
+    return np.asarray(values, dtype=np.float64).ravel()
+
+
+def pad_sequences(sequences: Sequence[Optional[np.ndarray]], width: int) -> np.ndarray:
+    """``(len(sequences), width)`` matrix, NaN where a sequence is missing or shorter."""
+    matrix = np.full((len(sequences), width), np.nan)
+    for i, sequence in enumerate(sequences):
+        if sequence is not None and len(sequence):
+            n = min(len(sequence), width)
+            matrix[i, :n] = sequence[:n]
+    return matrix
+
+
+def _metrics(sum_abs: float, sum_sq: float, points: float, max_error: float) -> Dict[str, Any]:
+    if not points:
+        return {"points": 0, "mae": None, "rmse": None, "max_error": None}
+    return {
+        "points": int(points),
+        "mae": float(sum_abs / points),
+        "rmse": float(np.sqrt(sum_sq / points)),
+        "max_error": float(max_error),
+    }
+
+
+@dataclass
+class SOCScores:
+    """Per-query error sums over the aligned points (NaN/0 where a query was not parsed)."""
+
+    query_ids: List[str]
+    parsed: np.ndarray
+    points: np.ndarray
+    sum_abs: np.ndarray
+    sum_sq: np.ndarray
+    max_error: np.ndarray
+
+    @property
+    def mae(self) -> np.ndarray:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.points > 0, self.sum_abs / self.points, np.nan)
+
+    @property
+    def rmse(self) -> np.ndarray:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.points > 0, np.sqrt(self.sum_sq / self.points), np.nan)
+
+    def summary(self) -> Dict[str, Any]:
+        """Pooled metrics over every aligned point, plus the per-query mean MAE/RMSE."""
+        scored = self.points > 0
+        summary = {
+            "queries": len(self.query_ids),
+            "parsed": int(self.parsed.sum()),
+            "failed": int((~self.parsed).sum()),
+        }
+        summary.update(
+            _metrics(
+                self.sum_abs.sum(),
+                self.sum_sq.sum(),
+                self.points.sum(),
+                self.max_error[scored].max() if scored.any() else 0.0,
+            )
+        )
+        summary["mean_query_mae"] = float(self.mae[scored].mean()) if scored.any() else None
+        summary["mean_query_rmse"] = float(self.rmse[scored].mean()) if scored.any() else None
+        return summary
+
+    def breakdown(self, labels: Sequence[Any]) -> Dict[str, Dict[str, Any]]:
+        """Pooled metrics per distinct label (e.g. every query's temperature)."""
+        keys = np.array(
+            [UNKNOWN_GROUP if label is None else str(label) for label in labels], dtype=object
+        )
+        names, inverse = np.unique(keys, return_inverse=True)
+        size = len(names)
+        sum_abs = np.bincount(inverse, weights=self.sum_abs, minlength=size)
+        sum_sq = np.bincount(inverse, weights=self.sum_sq, minlength=size)
+        points = np.bincount(inverse, weights=self.points, minlength=size)
+        parsed = np.bincount(inverse, weights=self.parsed, minlength=size)
+        queries = np.bincount(inverse, minlength=size)
+        max_error = np.zeros(size)
+        np.maximum.at(max_error, inverse, np.where(self.points > 0, self.max_error, 0.0))
+        groups: Dict[str, Dict[str, Any]] = {}
+        for i, name in enumerate(names):
+            groups[name] = {"queries": int(queries[i]), "parsed": int(parsed[i])}
+            groups[name].update(_metrics(sum_abs[i], sum_sq[i], points[i], max_error[i]))
+        return groups
+
+    def per_query(self) -> List[Dict[str, Any]]:
+        mae, rmse = self.mae, self.rmse
+        return [
+            {
+                "query_id": query_id,
+                "parsed": bool(self.parsed[i]),
+                "points": int(self.points[i]),
+                "mae": float(mae[i]) if self.points[i] else None,
+                "rmse": float(rmse[i]) if self.points[i] else None,
+                "max_error": float(self.max_error[i]) if self.points[i] else None,
+            }
+            for i, query_id in enumerate(self.query_ids)
+        ]
+
+
+def score_soc(
+    query_ids: Sequence[str],
+    predictions: Sequence[Optional[np.ndarray]],
+    truths: Sequence[Optional[np.ndarray]],
+) -> SOCScores:
+    """Score aligned prediction/truth pairs; a query counts only where both have a value."""
+    if not (len(query_ids) == len(predictions) == len(truths)):
+        raise ValueError("query_ids, predictions and truths must have the same length.")
+    width = max((len(truth) for truth in truths if truth is not None), default=0)
+    pred = pad_sequences(predictions, width)
+    true = pad_sequences(truths, width)
+    mask = ~(np.isnan(pred) | np.isnan(true))
+    error = np.abs(np.where(mask, pred - true, 0.0))
+    return SOCScores(
+        query_ids=[str(query_id) for query_id in query_ids],
+        parsed=np.array([p is not None and t is not None for p, t in zip(predictions, truths)]),
+        points=mask.sum(axis=1),
+        sum_abs=error.sum(axis=1),
+        sum_sq=(error * error).sum(axis=1),
+        max_error=error.max(axis=1) if width else np.zeros(len(query_ids)),
+    )
@@ -0,0 +1,88 @@
+"""
+mtime-checked file caches: prompt templates and pipeline assets are read once
+and re-read only when the file on disk changes.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Generic, Optional, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+Signature = Optional[Tuple[int, int]]
+
+
+def file_signature(path: Path) -> Signature:
+    """``(mtime_ns, size)`` of ``path``, or ``None`` when it does not exist."""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+_texts: Dict[Path, Tuple[Signature, str]] = {}
+_texts_lock = threading.Lock()
+
+
+def read_text_cached(path: Path, encoding: str = "utf-8") -> str:
+    """``path.read_text()``, served from memory until the file's mtime or size changes."""
+    signature = file_signature(path)
+    with _texts_lock:
+        cached = _texts.get(path)
+    if cached is not None and signature is not None and cached[0] == signature:
+        return cached[1]
+    text = path.read_text(encoding=encoding)
+    with _texts_lock:
+        _texts[path] = (signature, text)
+    return text
+
+
+class ReloadingValue(Generic[T]):
+    """A value built from files by ``loader`` and rebuilt when any of them changes.
+
+    Files are checked at most every ``check_interval_s``; a failed reload keeps
+    the previous value (``last_error`` says why) so a half-saved file cannot take
+    a running service down.
+    """
+
+    def __init__(
+        self, loader: Callable[[], T], paths: Sequence[Path], check_interval_s: float = 1.0
+    ) -> None:
+        self.loader = loader
+        self.paths = list(paths)
+        self.check_interval_s = check_interval_s
+        self.version = 1
+        self.last_error: Optional[str] = None
+        self._signatures = self._current_signatures()
+        self._value = loader()
+        self._checked = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _current_signatures(self) -> Tuple[Signature, ...]:
+        return tuple(file_signature(path) for path in self.paths)
+
+    def get(self) -> T:
+        if time.monotonic() - self._checked >= self.check_interval_s:
+            self.reload()
+        return self._value
+
+    def reload(self, force: bool = False) -> bool:
+        """Rebuild the value if a file changed (or ``force``); returns whether it was rebuilt."""
+        with self._lock:
+            self._checked = time.monotonic()
+            signatures = self._current_signatures()
+            if not force and signatures == self._signatures:
+                return False
+            try:
+                value = self.loader()
+            except Exception as exc:
+                self.last_error = f"{type(exc).__name__}: {exc}"
+                return False
+            self._signatures = signatures
+            self._value = value
+            self.version += 1
+            self.last_error = None
+            return True
@@ -0,0 +1,322 @@
+"""
+Token-budgeted rendering of KG rows and the value dictionary for the LLM prompts.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.kg.features import node_summary
+from src.kg.summary import SUMMARY_SIGNALS, SUMMARY_STATS
+from src.kg.values import decode_values, node_values
+from src.retrieval.two_phase import rank_rows
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+# Properties the generation prompt uses, per retrieval alias; everything else is dropped.
+KEEP_PROPS = {
+    "c": ("chemistry", "ratedCapacity_Ah", "componentType", "ratedVoltage_V", "formFactor"),
+    "ctx": (
+        "temperature_C",
+        "lifeStage",
+        "operatingSubphase",
+        "operatingMode",
+        "drivingScenario",
+        "testProfile",
+    ),
+    "m": ("samplingRate_Hz", "variables"),
+    "s": ("stateType", "method", "isGroundTruth"),
+    "r1": ("signal",),
+    "r2": ("confidence",),
+    "r3": ("method",),
+    "r4": ("direction", "degradationRisk", "expectedImpact", "drivers"),
+}
+SIGNAL_LABELS = {"voltage_v": "V", "current_a": "I", "temperature_c": "T"}
+# Value-dictionary fields the retrieval prompt filters on; these keys are listed first.
+FILTER_FIELDS = (
+    "chemistry",
+    "ratedCapacity_Ah",
+    "temperature_C",
+    "lifeStage",
+    "operatingSubphase",
+    "stateType",
+    "summary",
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough BPE-style token count: words, numbers and punctuation marks."""
+    return len(_TOKEN_RE.findall(text))
+
+
+def estimate_tokens_sampled(text: str, sample_chars: int = 20000) -> int:
+    """``estimate_tokens`` extrapolated from a prefix, for very long texts."""
+    if len(text) <= sample_chars:
+        return estimate_tokens(text)
+    return int(estimate_tokens(text[:sample_chars]) * len(text) / sample_chars)
+
+
+def _number(value: Any, precision: int) -> str:
+    if isinstance(value, bool) or not isinstance(value, (int, float, np.floating, np.integer)):
+        return str(value)
+    rounded = round(float(value), precision)
+    return f"{rounded:g}" if rounded != 0 else "0"
+
+
+def _props(node: Any, keys: Sequence[str], precision: int) -> str:
+    if not isinstance(node, dict):
+        return ""
+    parts = [f"{key}: {_number(node[key], precision)}" for key in keys if node.get(key) is not None]
+    return "{" + ", ".join(parts) + "}" if parts else ""
+
+
+def _relationship_props(value: Any) -> Any:
+    # Full relationships come back as (start, TYPE, end) tuples without properties.
+    return value if isinstance(value, dict) else None
+
+
+def downsample(values: Sequence[Any], points: int) -> Tuple[List[Any], int]:
+    """Evenly spaced subset of ``values`` (first and last kept) and the original length."""
+    n = len(values)
+    if points <= 0 or n <= points:
+        return list(values), n
+    if points == 1:
+        return [values[0]], n
+    index = sorted({round(i * (n - 1) / (points - 1)) for i in range(points)})
+    return [values[i] for i in index], n
+
+
+def _sequence(name: str, values: Any, points: int, precision: int) -> Optional[str]:
+    values = decode_values(values)
+    if isinstance(values, dict):
+        lines = [_sequence(f"{name}.{key}", seq, points, precision) for key, seq in values.items()]
+        return "; ".join(line for line in lines if line) or None
+    if isinstance(values, np.ndarray):
+        if not values.size:
+            return None
+        # Only the sampled points of a decoded array are converted.
+        sample, total = downsample(values, points)
+        sample = [item.tolist() for item in sample]
+    elif isinstance(values, (list, tuple)) and values:
+        sample, total = downsample(values, points)
+    else:
+        return None
+    items = []
+    for item in sample:
+        if isinstance(item, (list, tuple)):
+            items.append("(" + ", ".join(_number(x, precision) for x in item) + ")")
+        else:
+            items.append(_number(item, precision))
+    label = f"{len(sample)} of {total} points" if len(sample) < total else f"{total} points"
+    return f"{name} [{label}]: " + " ".join(items)
+
+
+def _summary_text(measurement: Dict[str, Any], precision: int) -> str:
+    summary = node_summary(measurement)
+    parts = []
+    for signal in SUMMARY_SIGNALS:
+        stats = [
+            f"{stat} {_number(summary[f'summary_{signal}_{stat}'], precision)}"
+            for stat in SUMMARY_STATS
+            if summary.get(f"summary_{signal}_{stat}") is not None
+        ]
+        if stats:
+            parts.append(f"{SIGNAL_LABELS[signal]} " + ", ".join(stats))
+    return "; ".join(parts)
+
+
+def _with_decoded_values(row: Dict[str, Any]) -> Dict[str, Any]:
+    row = dict(row)
+    for alias in ("m", "s"):
+        node = row.get(alias)
+        if isinstance(node, dict) and node.get("values") is not None:
+            row[alias] = dict(node, values=node_values(node))
+    return row
+
+
+@dataclass
+class PackLevel:
+    rows: int
+    points: int
+    precision: int
+    sequences: bool = True
+
+
+@dataclass
+class PackReport:
+    token_budget: int
+    tokens: int
+    tokens_unpacked: int
+    rows_in: int
+    rows_out: int
+    points: int
+    precision: int
+    sequences: bool
+    fits: bool
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        saved = self.tokens_unpacked - self.tokens
+        data["tokens_saved"] = saved
+        data["reduction"] = round(saved / self.tokens_unpacked, 4) if self.tokens_unpacked else 0.0
+        return data
+
+
+@dataclass
+class PackedContext:
+    text: str
+    report: PackReport
+
+
+class ContextPacker:
+    """Render retrieval rows as compact KG evidence that fits ``token_budget``.
+
+    Rows are ranked by closeness to the user's (V, I, T) sequence. Then the
+    packer walks a ladder of progressively cheaper renderings: fewer sequence
+    points, lower precision, fewer rows, no raw sequences. It returns the
+    first rendering that fits.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 3000,
+        max_rows: int = 50,
+        min_rows: int = 3,
+        max_points: int = 16,
+        min_points: int = 4,
+        precision: int = 3,
+        min_precision: int = 2,
+    ) -> None:
+        self.token_budget = token_budget
+        self.max_rows = max_rows
+        self.min_rows = min_rows
+        self.max_points = max_points
+        self.min_points = min_points
+        self.precision = precision
+        self.min_precision = min_precision
+
+    def levels(self, row_count: int) -> Iterator[PackLevel]:
+        rows = min(row_count, self.max_rows)
+        points = self.max_points
+        while points >= self.min_points:
+            yield PackLevel(rows, points, self.precision)
+            points //= 2
+        floor_points = max(self.min_points, 1)
+        for precision in range(self.precision - 1, self.min_precision - 1, -1):
+            yield PackLevel(rows, floor_points, precision)
+        keep = rows
+        while keep > min(self.min_rows, rows):
+            keep = max(min(self.min_rows, rows), keep // 2)
+            yield PackLevel(keep, floor_points, self.min_precision)
+        for keep in range(min(self.min_rows, rows), 0, -1):
+            yield PackLevel(keep, 0, self.min_precision, sequences=False)
+
+    def render_row(self, index: int, row: Dict[str, Any], level: PackLevel) -> str:
+        precision = level.precision
+        measurement = row.get("m") if isinstance(row.get("m"), dict) else {}
+        state = row.get("s") if isinstance(row.get("s"), dict) else {}
+        head = []
+        for alias, label in (("c", "Component"), ("ctx", "Context")):
+            props = _props(row.get(alias), KEEP_PROPS[alias], precision)
+            if props:
+                head.append(f"{label}{props}")
+        degrades = _props(_relationship_props(row.get("r4")), KEEP_PROPS["r4"], precision)
+        if row.get("r4") is not None:
+            head.append(f"DEGRADES{degrades}")
+        lines = [f"[{index}] " + " | ".join(head)]
+        if measurement or state:
+            link = f"    Measurement {measurement.get('recordId', '?')}"
+            link += _props(measurement, KEEP_PROPS["m"], precision)
+            estimates = _props(_relationship_props(row.get("r3")), KEEP_PROPS["r3"], precision)
+            link += f" -ESTIMATES{estimates}-> State {state.get('recordId', '?')}"
+            link += _props(state, KEEP_PROPS["s"], precision)
+            lines.append(link)
+        summary = _summary_text(measurement, precision)
+        if summary:
+            lines.append(f"    summary: {summary}")
+        if level.sequences:
+            state_name = state.get("stateType") or "state"
+            for name, node in (("(V, I, T)", measurement), (state_name, state)):
+                text = _sequence(name, node.get("values"), level.points, precision)
+                if text:
+                    lines.append(f"    {text}")
+        for key in (key for key in row if key not in KEEP_PROPS):
+            lines.append(f"    {key}: {_number(row[key], precision)}")
+        return "\n".join(lines)
+
+    def pack_rows(self, rows: List[Dict[str, Any]], user_query: str) -> PackedContext:
+        ranked = [_with_decoded_values(row) for row in rank_rows(rows, user_query)[: self.max_rows]]
+        cache: Dict[Tuple[int, int, int, bool], Tuple[str, int]] = {}
+        text, tokens, blocks = "", 0, []
+        level = PackLevel(0, 0, self.precision)
+        for level in self.levels(len(ranked)):
+            blocks = []
+            tokens = 0
+            for i, row in enumerate(ranked[: level.rows]):
+                key = (i, level.points, level.precision, level.sequences)
+                if key not in cache:
+                    block = self.render_row(i + 1, row, level)
+                    cache[key] = (block, estimate_tokens(block))
+                blocks.append(cache[key][0])
+                tokens += cache[key][1]
+                if tokens > self.token_budget:
+                    break
+            text = "\n".join(blocks)
+            if tokens <= self.token_budget:
+                break
+        # What the plain key=value rendering of the same rows would have cost.
+        unpacked_text = "\n".join(
+            "; ".join(f"{key}={value}" for key, value in row.items())
+            for row in rows[: self.max_rows]
+        )
+        report = PackReport(
+            token_budget=self.token_budget,
+            tokens=tokens,
+            tokens_unpacked=estimate_tokens_sampled(unpacked_text),
+            rows_in=len(rows),
+            rows_out=len(blocks),
+            points=level.points,
+            precision=level.precision,
+            sequences=level.sequences,
+            fits=tokens <= self.token_budget,
+        )
+        return PackedContext(text=text, report=report)
+
+
+def _value_dict_entry(entry: Dict[str, Any]) -> str:
+    parts = [f"type={entry.get('type')}"]
+    examples = entry.get("examples") or []
+    if examples:
+        parts.append(f"examples={examples}")
+    if entry.get("min") is not None or entry.get("max") is not None:
+        parts.append(f"range=[{entry.get('min')}, {entry.get('max')}]")
+    return ", ".join(parts)
+
+
+def pack_value_dict(
+    value_dict: Dict[str, Any], max_keys: int = 0, token_budget: Optional[int] = None
+) -> str:
+    """Value dictionary lines, filter fields first, capped by ``max_keys`` and ``token_budget``.
+
+    Without a ``token_budget`` only keys on ``FILTER_FIELDS`` are listed, so a large
+    dictionary does not grow the retrieval prompt; other keys only fill a budget.
+    """
+    keys = [key for key, entry in value_dict.items() if entry]
+    relevant = [key for key in keys if set(key.split(".")) & set(FILTER_FIELDS)]
+    keys = relevant + [key for key in keys if key not in relevant] if token_budget else relevant
+    if max_keys > 0:
+        keys = keys[:max_keys]
+    lines: List[str] = ["Focused KG value dictionary:"]
+    tokens = estimate_tokens(lines[0])
+    for key in keys:
+        line = f"- {key}: {_value_dict_entry(value_dict[key])}"
+        cost = estimate_tokens(line)
+        if token_budget is not None and tokens + cost > token_budget:
+            break
+        lines.append(line)
+        tokens += cost
+    return "\n".join(lines)
@@ -1,10 +1,13 @@
 from __future__ import annotations
 from pathlib import Path
 from dataclasses import dataclass
-from typing import Optional
+from typing import Any, Callable, Optional
 
-from src.config import LLMConfig, load_yaml_config
-from src.llm_client import LLMClient, LLMRequest
+from src import tracing
+from src.config import LLMConfig, load_llm_config
+from src.file_cache import read_text_cached
+from src.llm_client import LLMRequest
+from src.llm_router import ChatClient, build_llm_client
 
 
 @dataclass
@@ -20,35 +23,49 @@ class GenerationModule:
         system_prompt_path: Path,
         temperature: float = 0.0,
         max_tokens: Optional[int] = None,
+        client: Optional[ChatClient] = None,
+        stream: bool = False,
     ) -> None:
         self.llm_config = llm_config
         self.system_prompt_path = system_prompt_path
         self.temperature = temperature
         self.max_tokens = max_tokens
-        self.client = LLMClient(
-            api_base=llm_config.api_base,
-            api_key=llm_config.api_key,
-            max_retries=llm_config.max_retries,
-            retry_backoff=llm_config.retry_backoff,
-        )
+        self.client = client or build_llm_client(llm_config)
+        self.stream = stream
 
     def build_prompt(self, user_query: str, kg_triplets: str) -> str:
-        template = self.system_prompt_path.read_text(encoding="utf-8")
+        template = read_text_cached(self.system_prompt_path)
         return template.format(
             kg_triplets=kg_triplets,
             user_query=user_query,
         )
 
-    def build_enhanced_prompt(self, user_query: str, kg_triplets: str) -> GenerationResult:
-        prompt = self.build_prompt(user_query, kg_triplets)
-        request = LLMRequest(
-            model=self.llm_config.model,
-            messages=[{"role": "system", "content": prompt}],
-            temperature=self.temperature,
-            max_tokens=self.max_tokens,
-        )
-        response = self.client.chat(request)
-        raw = self.client.extract_text(response).strip()
+    def build_enhanced_prompt(
+        self,
+        user_query: str,
+        kg_triplets: str,
+        on_delta: Optional[Callable[[str], Any]] = None,
+    ) -> GenerationResult:
+        with tracing.span("generation.build_enhanced_prompt", model=self.llm_config.model):
+            with tracing.span("generation.build_prompt") as span:
+                prompt = self.build_prompt(user_query, kg_triplets)
+                span.set(prompt_chars=len(prompt))
+            request = LLMRequest(
+                model=self.llm_config.model,
+                messages=[{"role": "system", "content": prompt}],
+                temperature=self.temperature,
+                max_tokens=self.max_tokens,
+            )
+            if self.stream:
+                parts = []
+                for delta in self.client.chat_stream(request):
+                    parts.append(delta)
+                    if on_delta is not None:
+                        on_delta(delta)
+                raw = "".join(parts).strip()
+            else:
+                response = self.client.chat(request)
+                raw = self.client.extract_text(response).strip()
         return GenerationResult(enhanced_prompt=raw, raw=raw)
 
 
@@ -58,8 +75,7 @@ def load_generation_module(
     temperature: float = 0.0,
     max_tokens: Optional[int] = None,
 ) -> GenerationModule:
-    llm_dict = load_yaml_config(llm_config_path)
-    llm_config = LLMConfig(**llm_dict)
+    llm_config = load_llm_config(llm_config_path)
     return GenerationModule(
         llm_config=llm_config,
         system_prompt_path=system_prompt_path,
@@ -0,0 +1,146 @@
+"""
+Coalesces concurrent retrieval reads into batched ``UNWIND`` queries.
+
+Threads that run retrieval Cypher at about the same time (a batch run or a busy
+service) hand their parsed filters to ``BatchingGraphStore``. Same-shape
+patterns collected within ``max_wait_s`` (or until ``max_batch`` arrive) go out
+as one parameterized read, so the batch shares one plan-cache entry and one
+network round trip; rows are routed back to each caller.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from src import tracing
+from src.kg.cypher_pattern import UnsupportedQueryError, clause_shape, parse_retrieval_cypher
+from src.kg.pattern import RETURN_ALIASES, RetrievalPattern
+from src.kg.store import GraphStore, QueryPlan
+
+_PROPERTY_RE = re.compile(r"^\w+$")
+
+
+class _Batch:
+    def __init__(self) -> None:
+        self.items: List[Tuple[RetrievalPattern, Future]] = []
+        self.full = threading.Event()
+
+
+class BatchingGraphStore(GraphStore):
+    """Wraps a store; retrieval-pattern reads are batched, everything else passes through."""
+
+    def __init__(self, store: GraphStore, max_batch: int = 64, max_wait_s: float = 0.005) -> None:
+        self.store = store
+        self.max_batch = max(max_batch, 1)
+        self.max_wait_s = max_wait_s
+        self.batches = 0
+        self.batched_reads = 0
+        self.direct_reads = 0
+        self._pending: Dict[Tuple[Any, ...], _Batch] = {}
+        self._lock = threading.Lock()
+
+    def _batchable(
+        self, cypher: str, parameters: Optional[Dict[str, Any]]
+    ) -> Optional[Tuple[Tuple[Any, ...], RetrievalPattern]]:
+        try:
+            parsed = parse_retrieval_cypher(cypher, parameters)
+            pattern = parsed.pattern
+            # Only queries the batched rewrite answers identically: the same clauses
+            # and joins as ``to_cypher`` (this also rules out summary JSON aliases).
+            # A pattern with the same property/operator twice has no ``to_cypher`` form.
+            if clause_shape(cypher) != clause_shape(pattern.to_cypher()[0]):
+                return None
+        except (UnsupportedQueryError, ValueError):
+            return None
+        if pattern.limit is None or any(item.mode != "full" for item in parsed.returns):
+            return None
+        if not all(_PROPERTY_RE.match(cond.prop) for cond in pattern.conditions):
+            return None
+        returns = tuple(item.alias for item in parsed.returns)
+        return (pattern.shape(), returns), pattern
+
+    def run_read(
+        self, cypher: str, parameters: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        batchable = self._batchable(cypher, parameters)
+        if batchable is None:
+            with self._lock:
+                self.direct_reads += 1
+            return self.store.run_read(cypher, parameters)
+        key, pattern = batchable
+        future: Future = Future()
+        with self._lock:
+            batch = self._pending.get(key)
+            leader = batch is None
+            if leader:
+                batch = self._pending[key] = _Batch()
+            batch.items.append((pattern, future))
+            if len(batch.items) >= self.max_batch:
+                del self._pending[key]
+                batch.full.set()
+        if leader:
+            # The first caller waits briefly for company, then runs the whole batch.
+            batch.full.wait(self.max_wait_s)
+            with self._lock:
+                if self._pending.get(key) is batch:
+                    del self._pending[key]
+            self._execute(batch, list(key[1]))
+        return future.result()
+
+    def _execute(self, batch: _Batch, returns: Sequence[str]) -> None:
+        patterns = [pattern for pattern, _ in batch.items]
+        with self._lock:
+            self.batches += 1
+            self.batched_reads += len(patterns)
+        try:
+            with tracing.span("graph.batch_read") as span:
+                results = self.store.run_read_batch(patterns, returns)
+                span.set(queries=len(patterns), rows=sum(len(rows) for rows in results))
+        except Exception as exc:
+            for _, future in batch.items:
+                future.set_exception(exc)
+            return
+        for (_, future), rows in zip(batch.items, results):
+            future.set_result(rows)
+
+    def iter_read(
+        self, cypher: str, parameters: Optional[Dict[str, Any]] = None, fetch_size: int = 1000
+    ) -> Iterator[Dict[str, Any]]:
+        return self.store.iter_read(cypher, parameters, fetch_size)
+
+    def run_read_batch(
+        self, patterns: List[RetrievalPattern], returns: Sequence[str] = RETURN_ALIASES
+    ) -> List[List[Dict[str, Any]]]:
+        return self.store.run_read_batch(patterns, returns)
+
+    def explain(
+        self, cypher: str, parameters: Optional[Dict[str, Any]] = None
+    ) -> Optional[QueryPlan]:
+        return self.store.explain(cypher, parameters)
+
+    def warm_up(self) -> None:
+        self.store.warm_up()
+
+    def data_version(self) -> Optional[str]:
+        return self.store.data_version()
+
+    def fetch_values(self, label: str, record_ids: List[Any]) -> Dict[Any, Any]:
+        return self.store.fetch_values(label, record_ids)
+
+    def fetch_rows_by_ids(self, pairs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return self.store.fetch_rows_by_ids(pairs)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "batched_reads": self.batched_reads,
+                "direct_reads": self.direct_reads,
+                "mean_batch_size": (self.batched_reads / self.batches) if self.batches else 0.0,
+            }
+
+    def close(self) -> None:
+        self.store.close()
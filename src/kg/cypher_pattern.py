@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import ast
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.kg.pattern import ALIAS_LABELS, RETURN_ALIASES, Condition, RetrievalPattern
+
+RETRIEVAL_RELATIONSHIPS = {
+    "r1": "MEASURES",
+    "r2": "SUPPLIES",
+    "r3": "ESTIMATES",
+    "r4": "DEGRADES",
+}
+
+_CLAUSE_RE = re.compile(
+    r"(?<![$.\w])(OPTIONAL\s+MATCH|MATCH|WITH|WHERE|RETURN|ORDER\s+BY|SKIP|LIMIT|UNWIND|CALL"
+    r"|CREATE|MERGE|SET|DELETE|DETACH|REMOVE|FOREACH|LOAD\s+CSV|UNION)\b",
+    re.IGNORECASE,
+)
+_NODE_RE = re.compile(r"\(\s*(\w+)\s*(?::\s*(\w+))?\s*(\{[^}]*\})?\s*\)")
+_REL_RE = re.compile(r"\[\s*(\w+)\s*:\s*(\w+)\s*\]")
+# One hop of a path: (start)-[alias:TYPE]->(end); the end node is only looked ahead
+# at so chained paths like (a)-[..]->(b)-[..]->(c) yield every hop.
+_EDGE_RE = re.compile(
+    r"\(\s*(\w+)[^()]*\)\s*(<-|-)\s*\[\s*(\w+)\s*:\s*(\w+)\s*\]\s*(->|-)\s*(?=\(\s*(\w+))"
+)
+_JSON_SUMMARY_RE = re.compile(
+    r"apoc\.convert\.fromJsonMap\(\s*(\w+)\.summary\s*\)\s+AS\s+(\w+)", re.IGNORECASE
+)
+_PREDICATE_RE = re.compile(
+    r"^\(?\s*(\w+)\.([\w.]+)\s*(=|<>|>=|<=|>|<|IN)\s*(.+?)\s*\)?$", re.IGNORECASE | re.DOTALL
+)
+_REVERSED_PREDICATE_RE = re.compile(
+    r"^\(?\s*(.+?)\s*(=|<>|>=|<=|>|<)\s*(\w+)\.([\w.]+)\s*\)?$", re.DOTALL
+)
+_AND_RE = re.compile(r"\s+AND\s+", re.IGNORECASE)
+_RETURN_ITEM_RE = re.compile(r"^(\w+)(?:\s*(\{.*\})\s+AS\s+(\w+))?$", re.DOTALL)
+_FLIP = {"=": "=", "<>": "<>", ">=": "<=", "<=": ">=", ">": "<", "<": ">"}
+# (start, end) of each relationship in the retrieval pattern; r1-r3 are required
+# matches and r4 must be an OPTIONAL MATCH, as in ``RetrievalPattern.to_cypher``.
+RETRIEVAL_EDGES = {"r1": ("m", "c"), "r2": ("ctx", "m"), "r3": ("m", "s"), "r4": ("ctx", "c")}
+REQUIRED_EDGES = ("r1", "r2", "r3")
+OPTIONAL_EDGES = ("r4",)
+
+
+class UnsupportedQueryError(ValueError):
+    """Raised when a Cypher query is not the retrieval pattern the local backend answers."""
+
+
+@dataclass
+class ReturnItem:
+    alias: str
+    # "full" returns the node/relationship as Neo4j would, "lean" drops values arrays
+    # from nodes, "props" returns a relationship's properties plus its type.
+    mode: str = "full"
+
+
+@dataclass
+class ParsedRetrievalQuery:
+    pattern: RetrievalPattern
+    returns: List[ReturnItem] = field(default_factory=list)
+
+
+def _split_clauses(query: str) -> List[Tuple[str, str]]:
+    matches = list(_CLAUSE_RE.finditer(query))
+    clauses = []
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(query)
+        keyword = re.sub(r"\s+", " ", match.group(1).upper())
+        clauses.append((keyword, query[match.end():end].strip()))
+    return clauses
+
+
+def _literal(text: str, parameters: Dict[str, Any]) -> Any:
+    text = text.strip()
+    if text.startswith("$"):
+        name = text[1:]
+        if name not in parameters:
+            raise UnsupportedQueryError(f"Missing query parameter ${name}")
+        return parameters[name]
+    lowered = text.lower()
+    if lowered in ("true", "false"):
+        return lowered == "true"
+    if lowered == "null":
+        return None
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError) as exc:
+        raise UnsupportedQueryError(f"Unsupported value: {text}") from exc
+
+
+def _property(alias: str, path: str, json_aliases: Dict[str, str]) -> Tuple[str, str]:
+    if alias in json_aliases:
+        return json_aliases[alias], "summary_" + path.replace(".", "_")
+    if "." in path:
+        raise UnsupportedQueryError(f"Unsupported property path {alias}.{path}")
+    return alias, path
+
+
+def _parse_predicate(
+    text: str, parameters: Dict[str, Any], json_aliases: Dict[str, str]
+) -> Condition:
+    match = _PREDICATE_RE.match(text)
+    if match:
+        alias, path, op, value = match.groups()
+        alias, prop = _property(alias, path, json_aliases)
+        return Condition(alias, prop, op.upper(), _literal(value, parameters))
+    match = _REVERSED_PREDICATE_RE.match(text)
+    if match:
+        value, op, alias, path = match.groups()
+        alias, prop = _property(alias, path, json_aliases)
+        return Condition(alias, prop, _FLIP[op], _literal(value, parameters))
+    raise UnsupportedQueryError(f"Unsupported predicate: {text}")
+
+
+def _parse_edges(body: str) -> List[str]:
+    """Relationship aliases matched in a MATCH body, checked against ``RETRIEVAL_EDGES``."""
+    edges = []
+    for start, left, alias, _, right, end in _EDGE_RE.findall(body):
+        if left == "<-" and right == "-":
+            start, end = end, start
+        elif not (left == "-" and right == "->"):
+            raise UnsupportedQueryError(f"Relationship [{alias}] must have one direction")
+        if RETRIEVAL_EDGES.get(alias) != (start, end):
+            raise UnsupportedQueryError(f"Unexpected relationship ({start})-[{alias}]->({end})")
+        edges.append(alias)
+    if len(edges) != len(_REL_RE.findall(body)):
+        raise UnsupportedQueryError(f"Unsupported MATCH pattern: {body}")
+    return edges
+
+
+def _parse_inline_map(alias: str, text: str, parameters: Dict[str, Any]) -> List[Condition]:
+    conditions = []
+    for entry in text.strip("{} ").split(","):
+        if not entry.strip():
+            continue
+        key, _, value = entry.partition(":")
+        conditions.append(Condition(alias, key.strip(), "=", _literal(value, parameters)))
+    return conditions
+
+
+def _parse_return(text: str) -> List[ReturnItem]:
+    items = []
+    depth = 0
+    current = ""
+    for char in text:
+        if char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+        if char == "," and depth == 0:
+            items.append(current.strip())
+            current = ""
+        else:
+            current += char
+    if current.strip():
+        items.append(current.strip())
+    returns = []
+    for item in items:
+        match = _RETURN_ITEM_RE.match(item)
+        if not match or (match.group(3) and match.group(3) != match.group(1)):
+            raise UnsupportedQueryError(f"Unsupported RETURN item: {item}")
+        alias, projection = match.group(1), match.group(2)
+        if alias not in RETURN_ALIASES:
+            raise UnsupportedQueryError(f"Unknown RETURN alias: {alias}")
+        mode = "full"
+        if projection:
+            mode = "props" if alias in RETRIEVAL_RELATIONSHIPS else "lean"
+        returns.append(ReturnItem(alias, mode))
+    return returns
+
+
+def clause_shape(cypher: str) -> Tuple[Tuple[str, Tuple[str, ...]], ...]:
+    """Clause keywords of a query with the relationships each MATCH binds.
+
+    Consecutive MATCH clauses are merged, so a chained path and one MATCH per hop
+    have the same shape; filter values and RETURN/LIMIT bodies are ignored.
+    """
+    query = re.sub(r"//[^\n]*", "", cypher).strip().rstrip(";")
+    shape: List[Tuple[str, Tuple[str, ...]]] = []
+    for keyword, body in _split_clauses(query):
+        edges: Tuple[str, ...] = ()
+        if keyword in ("MATCH", "OPTIONAL MATCH"):
+            edges = tuple(_parse_edges(body))
+        if keyword == "MATCH" and shape and shape[-1][0] == "MATCH":
+            edges = shape.pop()[1] + edges
+        shape.append((keyword, edges))
+    return tuple((keyword, tuple(sorted(edges))) for keyword, edges in shape)
+
+
+def parse_retrieval_cypher(
+    cypher: str, parameters: Optional[Dict[str, Any]] = None
+) -> ParsedRetrievalQuery:
+    """Parse the fixed retrieval pattern (match/filter/optional DEGRADES/limit).
+
+    Only conjunctions of simple comparisons are accepted; anything else raises
+    ``UnsupportedQueryError``.
+    """
+    parameters = parameters or {}
+    query = re.sub(r"//[^\n]*", "", cypher).strip().rstrip(";")
+    conditions: List[Condition] = []
+    returns: List[ReturnItem] = []
+    json_aliases: Dict[str, str] = {}
+    limit: Optional[int] = None
+    previous = ""
+    required: List[str] = []
+    optional: List[str] = []
+    for keyword, body in _split_clauses(query):
+        if keyword in ("MATCH", "OPTIONAL MATCH"):
+            if keyword == "MATCH" and optional:
+                raise UnsupportedQueryError("MATCH after OPTIONAL MATCH is not supported")
+            (optional if keyword == "OPTIONAL MATCH" else required).extend(_parse_edges(body))
+            for alias, label, props in _NODE_RE.findall(body):
+                if alias not in ALIAS_LABELS or (label and ALIAS_LABELS[alias] != label):
+                    raise UnsupportedQueryError(f"Unexpected node ({alias}:{label})")
+                if props:
+                    conditions.extend(_parse_inline_map(alias, props, parameters))
+            for alias, rel_type in _REL_RE.findall(body):
+                if RETRIEVAL_RELATIONSHIPS.get(alias) != rel_type:
+                    raise UnsupportedQueryError(f"Unexpected relationship [{alias}:{rel_type}]")
+            if keyword == "OPTIONAL MATCH" and "r4" not in body:
+                raise UnsupportedQueryError("Only the DEGRADES relationship may be optional")
+        elif keyword == "WITH":
+            for source, target in _JSON_SUMMARY_RE.findall(body):
+                json_aliases[target] = source
+        elif keyword == "WHERE":
+            if previous == "OPTIONAL MATCH":
+                # Neo4j would only use these to null out r4, not to filter rows.
+                raise UnsupportedQueryError("WHERE attached to OPTIONAL MATCH is not supported")
+            for predicate in _AND_RE.split(body):
+                if re.search(r"\b(OR|NOT|XOR)\b", predicate, re.IGNORECASE):
+                    raise UnsupportedQueryError(f"Unsupported predicate: {predicate}")
+                conditions.append(_parse_predicate(predicate, parameters, json_aliases))
+        elif keyword == "RETURN":
+            returns = _parse_return(body)
+        elif keyword == "LIMIT":
+            limit = int(_literal(body, parameters))
+        else:
+            raise UnsupportedQueryError(f"Unsupported clause: {keyword}")
+        previous = keyword
+    if not returns:
+        raise UnsupportedQueryError("Query has no RETURN clause")
+    # Anything but the fixed join would return different rows than Neo4j.
+    if sorted(required) != list(REQUIRED_EDGES) or optional != list(OPTIONAL_EDGES):
+        raise UnsupportedQueryError(
+            "Expected MATCH on r1:MEASURES, r2:SUPPLIES, r3:ESTIMATES and "
+            "OPTIONAL MATCH on r4:DEGRADES"
+        )
+    pattern = RetrievalPattern(conditions=conditions, limit=limit)
+    return ParsedRetrievalQuery(pattern=pattern, returns=returns)
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from src.kg.summary import (
+    MEASUREMENT_SUMMARY_PROPERTIES,
+    SUMMARY_SIGNALS,
+    SUMMARY_STATS,
+    flatten_summary,
+    summary_property,
+)
+
+_NUM = r"[-+]?(?:\d+\.\d*|\.\d+|\d+)(?:[eE][-+]?\d+)?"
+_TUPLE_RE = re.compile(rf"\(\s*({_NUM})\s*,\s*({_NUM})\s*,\s*({_NUM})\s*\)")
+
+# Differences of one scale unit count as "one step apart" when comparing summaries.
+SIGNAL_SCALES = {"voltage_v": 0.1, "current_a": 1.0, "temperature_c": 5.0}
+FEATURE_SCALES = np.array(
+    [SIGNAL_SCALES[signal] for signal in SUMMARY_SIGNALS for _ in SUMMARY_STATS],
+    dtype=np.float32,
+)
+
+
+def parse_vit_sequence(text: str, min_points: int = 2) -> Optional[np.ndarray]:
+    """Extract ``(V, I, T)`` tuples from a user query as an ``(n, 3)`` array."""
+    matches = _TUPLE_RE.findall(text)
+    if len(matches) < min_points:
+        return None
+    return np.asarray(matches, dtype=np.float64)
+
+
+def sequence_summary(sequence: np.ndarray) -> Dict[str, float]:
+    starts = sequence[0]
+    ends = sequence[-1]
+    means = sequence.mean(axis=0)
+    summary: Dict[str, float] = {}
+    for col, signal in enumerate(SUMMARY_SIGNALS):
+        summary[summary_property(signal, "start")] = float(starts[col])
+        summary[summary_property(signal, "end")] = float(ends[col])
+        summary[summary_property(signal, "mean")] = float(means[col])
+    return summary
+
+
+def query_summary(user_query: str) -> Optional[Dict[str, float]]:
+    sequence = parse_vit_sequence(user_query)
+    if sequence is None:
+        return None
+    return sequence_summary(sequence)
+
+
+def node_summary(node: Dict[str, Any]) -> Dict[str, float]:
+    """Typed summary properties of a Measurement node, falling back to its JSON summary."""
+    summary = {
+        prop: node[prop] for prop in MEASUREMENT_SUMMARY_PROPERTIES if node.get(prop) is not None
+    }
+    if len(summary) < len(MEASUREMENT_SUMMARY_PROPERTIES) and node.get("summary") is not None:
+        parsed = flatten_summary(node["summary"])
+        for prop in MEASUREMENT_SUMMARY_PROPERTIES:
+            summary.setdefault(prop, parsed.get(prop))
+    return summary
+
+
+def summary_vector(summary: Dict[str, Any]) -> np.ndarray:
+    """Raw summary values in ``MEASUREMENT_SUMMARY_PROPERTIES`` order; missing entries are NaN."""
+    values = [summary.get(prop) for prop in MEASUREMENT_SUMMARY_PROPERTIES]
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float32)
+
+
+def feature_vector(summary: Dict[str, Any]) -> np.ndarray:
+    return summary_vector(summary) / FEATURE_SCALES
+
+
+def summary_distance(a: Dict[str, Any], b: Dict[str, Any]) -> float:
+    diff = feature_vector(a) - feature_vector(b)
+    diff = diff[~np.isnan(diff)]
+    if diff.size == 0:
+        return float("inf")
+    return float(np.sqrt(np.mean(diff * diff)))
+
+
+_CAPACITY_RE = re.compile(rf"({_NUM})\s*(?:Ah|A\s*h|A·h)\b", re.IGNORECASE)
+_TEMPERATURE_RE = re.compile(
+    rf"({_NUM})\s*(?:°\s*C|℃|deg(?:rees?)?\s*C\b)|temperature\D{{0,20}}?({_NUM})",
+    re.IGNORECASE,
+)
+CATEGORICAL_HINT_KEYS = {
+    "chemistry": "component.chemistry",
+    "lifeStage": "context.lifeStage",
+    "operatingSubphase": "context.operatingSubphase",
+}
+
+
+def _match_example(text: str, examples: Any) -> Optional[str]:
+    for example in examples or []:
+        if not isinstance(example, str) or not example:
+            continue
+        if re.search(rf"(?<![\w-]){re.escape(example)}(?![\w-])", text, re.IGNORECASE):
+            return example
+    return None
+
+
+def query_hints(user_query: str, value_dict: Dict[str, Any]) -> Dict[str, Any]:
+    """Categorical/context hints (chemistry, capacity, temperature, ...) in a user query.
+
+    String hints are only accepted when they match a value dictionary example,
+    so the returned values can be used as exact KG filters.
+    """
+    # Ignore the numeric sequence itself when looking for scalar hints.
+    text = _TUPLE_RE.sub(" ", user_query)
+    hints: Dict[str, Any] = {}
+    for name, key in CATEGORICAL_HINT_KEYS.items():
+        value = _match_example(text, (value_dict.get(key) or {}).get("examples"))
+        if value is not None:
+            hints[name] = value
+    capacity = _CAPACITY_RE.search(text)
+    if capacity:
+        hints["ratedCapacity_Ah"] = float(capacity.group(1))
+    temperature = _TEMPERATURE_RE.search(text)
+    if temperature:
+        hints["temperature_C"] = float(temperature.group(1) or temperature.group(2))
+    return hints
@@ -0,0 +1,482 @@
+"""
+Bulk ingestion of raw cell test data (Excel/CSV) into the battery KG: sheets are
+parsed in worker processes, cut into fixed-length windows with vectorized
+summaries and written with batched, idempotent ``UNWIND ... MERGE`` statements.
+"""
+
+from __future__ import annotations
+
+import glob
+import json
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from src.config import load_yaml_config
+from src.kg.summary import SUMMARY_SIGNALS, SUMMARY_STATS, create_indexes, summary_property
+from src.kg.values import encode_values
+
+# Canonical signal -> accepted column headers (compared lower-case, alphanumerics only).
+COLUMN_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "time_s": ("time_s", "time", "test_time(s)", "testtime", "time(s)", "elapsed_time"),
+    "voltage_v": ("voltage_v", "voltage", "voltage(v)", "v", "cell_voltage"),
+    "current_a": ("current_a", "current", "current(a)", "i", "cell_current"),
+    "temperature_c": (
+        "temperature_c",
+        "temperature",
+        "temperature(c)",
+        "temperature (c)_1",
+        "temp",
+        "t",
+        "cell_temperature",
+    ),
+    "soc": ("soc", "state_of_charge", "soc(%)"),
+}
+REQUIRED_SIGNALS = SUMMARY_SIGNALS
+EXCEL_SUFFIXES = (".xlsx", ".xlsm", ".xls")
+
+ENTITY_QUERIES = {
+    "Component": "UNWIND $rows AS row MERGE (n:Component {id: row.id}) SET n += row",
+    "Context": "UNWIND $rows AS row MERGE (n:Context {id: row.id}) SET n += row",
+}
+# One round trip per batch; MERGE on recordId makes re-running a campaign a no-op.
+# Component/Context are matched first, so a row whose nodes are missing writes
+# nothing (no orphaned Measurement) and is left out of the returned count.
+WRITE_QUERY = """
+UNWIND $rows AS row
+MATCH (c:Component {id: row.component})
+MATCH (ctx:Context {id: row.context})
+MERGE (m:Measurement {recordId: row.m.recordId})
+SET m += row.m
+MERGE (m)-[:MEASURES]->(c)
+MERGE (ctx)-[:SUPPLIES]->(m)
+FOREACH (state IN CASE WHEN row.s IS NULL THEN [] ELSE [row.s] END |
+  MERGE (s:State {recordId: state.recordId})
+  SET s += state
+  MERGE (m)-[r:ESTIMATES]->(s)
+  SET r.method = row.method
+)
+RETURN count(*) AS written
+"""
+
+
+def _normalize(name: Any) -> str:
+    return re.sub(r"[^a-z0-9()%]", "", str(name).lower())
+
+
+@dataclass
+class IngestSource:
+    path: Path
+    component: str
+    context: str
+    sheets: Optional[List[str]] = None
+    # Canonical signal -> column header, overriding COLUMN_ALIASES for this source.
+    columns: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class IngestSpec:
+    campaign: str
+    sources: List[IngestSource]
+    components: List[Dict[str, Any]] = field(default_factory=list)
+    contexts: List[Dict[str, Any]] = field(default_factory=list)
+    window: int = 30
+    stride: Optional[int] = None
+    state_type: str = "SOC"
+    method: str = "ground_truth"
+    # Storage format of values arrays: "json", "list" or "float32" (see src.kg.values).
+    value_format: str = "json"
+
+
+def load_ingest_spec(path: Path) -> IngestSpec:
+    """Read a campaign manifest; ``path`` globs in sources are resolved against it."""
+    raw = load_yaml_config(path)
+    base = Path(path).parent
+    sources: List[IngestSource] = []
+    for entry in raw.get("sources", []):
+        pattern = str(base / entry["path"])
+        matches = sorted(glob.glob(pattern, recursive=True))
+        if not matches:
+            raise FileNotFoundError(f"No files match {pattern!r}")
+        for match in matches:
+            sources.append(
+                IngestSource(
+                    path=Path(match),
+                    component=str(entry["component"]),
+                    context=str(entry["context"]),
+                    sheets=entry.get("sheets"),
+                    columns=dict(entry.get("columns") or {}),
+                )
+            )
+    return IngestSpec(
+        campaign=str(raw["campaign"]),
+        sources=sources,
+        components=list(raw.get("components", [])),
+        contexts=list(raw.get("contexts", [])),
+        window=int(raw.get("window", 30)),
+        stride=int(raw["stride"]) if raw.get("stride") else None,
+        state_type=str(raw.get("state_type", "SOC")),
+        method=str(raw.get("method", "ground_truth")),
+        value_format=str(raw.get("value_format", "json")),
+    )
+
+
+def undeclared_entities(spec: IngestSpec) -> Dict[str, List[str]]:
+    """Component/Context ids that sources reference but the manifest does not declare."""
+    missing: Dict[str, List[str]] = {}
+    for label, rows, attr in (
+        ("Component", spec.components, "component"),
+        ("Context", spec.contexts, "context"),
+    ):
+        declared = {str(row["id"]) for row in rows}
+        ids = sorted({getattr(source, attr) for source in spec.sources} - declared)
+        if ids:
+            missing[label] = ids
+    return missing
+
+
+def resolve_columns(headers: Iterable[Any], overrides: Dict[str, str]) -> Dict[str, Any]:
+    """Map canonical signals to the sheet's headers; missing optional signals are left out."""
+    by_name = {_normalize(header): header for header in headers}
+    resolved: Dict[str, Any] = {}
+    for signal, aliases in COLUMN_ALIASES.items():
+        candidates = (overrides[signal],) if signal in overrides else aliases
+        for candidate in candidates:
+            header = by_name.get(_normalize(candidate))
+            if header is not None:
+                resolved[signal] = header
+                break
+    return resolved
+
+
+def _windows(values: np.ndarray, window: int, stride: int) -> np.ndarray:
+    return sliding_window_view(values, window)[::stride]
+
+
+def segment_arrays(
+    signals: Dict[str, np.ndarray], window: int, stride: Optional[int] = None
+) -> Dict[str, np.ndarray]:
+    """Cut aligned 1-D signals into ``window``-row segments, ``stride`` rows apart.
+
+    Returns ``(n, window)`` arrays per signal plus ``row_start`` (0-based
+    offsets); segments with a missing V/I/T/time value are dropped.
+    """
+    stride = stride or window
+    length = min(len(values) for values in signals.values())
+    if length < window:
+        return {"row_start": np.empty(0, dtype=np.int64)}
+    columns = {
+        name: np.asarray(values[:length], dtype=np.float64) for name, values in signals.items()
+    }
+    valid = np.ones(length, dtype=bool)
+    for name in REQUIRED_SIGNALS + ("time_s",):
+        if name in columns:
+            valid &= np.isfinite(columns[name])
+    keep = _windows(valid, window, stride).all(axis=1)
+    segments = {name: _windows(values, window, stride)[keep] for name, values in columns.items()}
+    segments["row_start"] = np.arange(0, length - window + 1, stride)[keep]
+    return segments
+
+
+def summarize_segments(segments: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Vectorized start/end/mean per signal, plus SOC start/end/delta when present."""
+    stats: Dict[str, np.ndarray] = {}
+    for signal in SUMMARY_SIGNALS:
+        values = segments[signal]
+        stats[summary_property(signal, "start")] = values[:, 0]
+        stats[summary_property(signal, "end")] = values[:, -1]
+        stats[summary_property(signal, "mean")] = values.mean(axis=1)
+    if "time_s" in segments:
+        time_s = segments["time_s"]
+        stats["startTime_s"] = time_s[:, 0]
+        stats["endTime_s"] = time_s[:, -1]
+        stats["duration_s"] = time_s[:, -1] - time_s[:, 0]
+        stats["samplingInterval_s"] = np.median(np.diff(time_s, axis=1), axis=1)
+    if "soc" in segments:
+        soc = segments["soc"]
+        stats["soc_start"] = soc[:, 0]
+        stats["soc_end"] = soc[:, -1]
+        stats["soc_delta"] = soc[:, -1] - soc[:, 0]
+    return {name: np.round(values, 6) for name, values in stats.items()}
+
+
+def build_records(
+    source: IngestSource,
+    sheet: str,
+    segments: Dict[str, np.ndarray],
+    campaign: str,
+    state_type: str = "SOC",
+    method: str = "ground_truth",
+    header_rows: int = 1,
+    value_format: str = "json",
+) -> List[Dict[str, Any]]:
+    """Measurement/State property maps for each segment, ready for ``WRITE_QUERY``."""
+    row_start = segments["row_start"]
+    if not len(row_start):
+        return []
+    stats = {name: values.tolist() for name, values in summarize_segments(segments).items()}
+    signals = [name for name in ("time_s",) + SUMMARY_SIGNALS if name in segments]
+    packed = value_format != "json"
+    # (windows, signals, rows) for packed formats; per-signal lists for JSON.
+    values: Any = np.round(np.stack([segments[name] for name in signals], axis=1), 6)
+    if not packed:
+        values = {name: values[:, k].tolist() for k, name in enumerate(signals)}
+    soc_values: Any = np.round(segments["soc"], 6) if "soc" in segments else None
+    if soc_values is not None and not packed:
+        soc_values = soc_values.tolist()
+    soc_key = state_type.lower()
+    soc_valid = np.isfinite(segments["soc"]).all(axis=1).tolist() if "soc" in segments else None
+    window = segments[SUMMARY_SIGNALS[0]].shape[1]
+    stem = f"{campaign}:{source.path.stem}:{sheet}"
+    records: List[Dict[str, Any]] = []
+    for i, offset in enumerate(row_start.tolist()):
+        # Spreadsheet row numbers: 1-based, after the header.
+        first = offset + header_rows + 1
+        last = first + window - 1
+        record_id = f"{stem}:{first}"
+        summary = {
+            signal: {stat: stats[summary_property(signal, stat)][i] for stat in SUMMARY_STATS}
+            for signal in SUMMARY_SIGNALS
+        }
+        measurement: Dict[str, Any] = {
+            "recordId": record_id,
+            "sourceFile": source.path.name,
+            "filePath": str(source.path),
+            "sheet": sheet,
+            "rowStart": first,
+            "rowEnd": last,
+            "rowRange": f"{first}-{last}",
+            "recordIndex": i,
+            "dataType": "timeseries",
+            "timeUnit": "s",
+            "variables": signals,
+            "summary": json.dumps(summary),
+        }
+        if packed:
+            measurement.update(encode_values(values[i], value_format), valuesKeys=signals)
+        else:
+            measurement.update(
+                encode_values(None), values=json.dumps({name: values[name][i] for name in signals})
+            )
+        for name in stats:
+            if not name.startswith("soc_"):
+                measurement[name] = stats[name][i]
+        state = None
+        if soc_values is not None and soc_valid[i]:
+            state = {
+                "recordId": f"{record_id}:{state_type}",
+                "stateType": state_type,
+                "method": method,
+                "isGroundTruth": method == "ground_truth",
+                "sourceFile": source.path.name,
+                "filePath": str(source.path),
+                "recordIndex": i,
+                "summary": json.dumps(
+                    {
+                        "start": stats["soc_start"][i],
+                        "end": stats["soc_end"][i],
+                        "delta": stats["soc_delta"][i],
+                    }
+                ),
+                "summary_start": stats["soc_start"][i],
+                "summary_end": stats["soc_end"][i],
+                "summary_delta": stats["soc_delta"][i],
+            }
+            if packed:
+                state.update(encode_values(soc_values[i][None], value_format), valuesKeys=[soc_key])
+            else:
+                state.update(encode_values(None), values=json.dumps({soc_key: soc_values[i]}))
+        records.append(
+            {
+                "m": measurement,
+                "s": state,
+                "component": source.component,
+                "context": source.context,
+                "method": method,
+            }
+        )
+    return records
+
+
+def _numeric(column: Any) -> np.ndarray:
+    import pandas as pd
+
+    if pd.api.types.is_datetime64_any_dtype(column):
+        return (column - column.iloc[0]).dt.total_seconds().to_numpy(dtype=np.float64)
+    if pd.api.types.is_timedelta64_dtype(column):
+        return column.dt.total_seconds().to_numpy(dtype=np.float64)
+    return pd.to_numeric(column, errors="coerce").to_numpy(dtype=np.float64)
+
+
+def read_sheets(source: IngestSource) -> Iterator[Tuple[str, Any]]:
+    """``(sheet name, DataFrame)`` pairs of an Excel workbook or a CSV file."""
+    import pandas as pd
+
+    if source.path.suffix.lower() in EXCEL_SUFFIXES:
+        frames = pd.read_excel(source.path, sheet_name=source.sheets or None)
+        yield from frames.items()
+    else:
+        yield source.path.stem, pd.read_csv(source.path, low_memory=False)
+
+
+@dataclass
+class SourceResult:
+    source: IngestSource
+    records: List[Dict[str, Any]]
+    rows: int = 0
+    skipped_sheets: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+
+
+def load_source(
+    source: IngestSource,
+    campaign: str,
+    window: int,
+    stride: Optional[int] = None,
+    state_type: str = "SOC",
+    method: str = "ground_truth",
+    value_format: str = "json",
+) -> SourceResult:
+    """Parse and segment one file; runs in a worker process."""
+    result = SourceResult(source, [])
+    for sheet, frame in read_sheets(source):
+        columns = resolve_columns(frame.columns, source.columns)
+        if any(signal not in columns for signal in REQUIRED_SIGNALS):
+            result.skipped_sheets.append(str(sheet))
+            continue
+        result.rows += len(frame)
+        signals = {signal: _numeric(frame[header]) for signal, header in columns.items()}
+        segments = segment_arrays(signals, window, stride)
+        result.records.extend(
+            build_records(
+                source,
+                str(sheet),
+                segments,
+                campaign,
+                state_type,
+                method,
+                value_format=value_format,
+            )
+        )
+    return result
+
+
+def iter_source_results(spec: IngestSpec, workers: int = 4) -> Iterator[SourceResult]:
+    """Results in completion order; with ``workers <= 1`` files are parsed in-process.
+
+    A file that fails to parse yields a result with ``error`` set instead of raising.
+    """
+    args = (
+        spec.campaign,
+        spec.window,
+        spec.stride,
+        spec.state_type,
+        spec.method,
+        spec.value_format,
+    )
+    if workers <= 1:
+        for source in spec.sources:
+            try:
+                yield load_source(source, *args)
+            except Exception as exc:
+                yield SourceResult(source, [], error=f"{type(exc).__name__}: {exc}")
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(load_source, source, *args): source for source in spec.sources}
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as exc:
+                yield SourceResult(futures[future], [], error=f"{type(exc).__name__}: {exc}")
+
+
+class Neo4jIngestWriter:
+    """Writes ingest records to Neo4j in ``UNWIND`` batches, one transaction per batch."""
+
+    def __init__(
+        self, driver: Any, database: Optional[str] = None, batch_size: int = 2000
+    ) -> None:
+        self.driver = driver
+        self.database = database
+        self.batch_size = batch_size
+        self.written = 0
+        self.dropped = 0
+
+    def prepare(self, spec: IngestSpec) -> None:
+        # MERGE on recordId needs the range indexes to stay O(log n) per row.
+        create_indexes(self.driver, database=self.database)
+        with self.driver.session(database=self.database) as session:
+            for label, rows in (("Component", spec.components), ("Context", spec.contexts)):
+                if rows:
+                    query = ENTITY_QUERIES[label]
+                    session.execute_write(lambda tx: tx.run(query, rows=rows).consume())
+            # Sources may point at nodes of an earlier campaign; anything else is an error.
+            for label, ids in undeclared_entities(spec).items():
+                found = session.run(
+                    f"MATCH (n:{label}) WHERE n.id IN $ids RETURN collect(n.id) AS ids", ids=ids
+                ).single()["ids"]
+                unknown = sorted(set(ids) - set(found))
+                if unknown:
+                    raise ValueError(f"Sources reference unknown {label} ids: {unknown}")
+
+    def write(self, records: List[Dict[str, Any]]) -> int:
+        """Write ``records``; returns how many were written (the rest are counted as dropped)."""
+        written = 0
+        with self.driver.session(database=self.database) as session:
+            for start in range(0, len(records), self.batch_size):
+                batch = records[start : start + self.batch_size]
+                written += session.execute_write(
+                    lambda tx: tx.run(WRITE_QUERY, rows=batch).single()["written"]
+                )
+        self.written += written
+        self.dropped += len(records) - written
+        return written
+
+    def close(self) -> Dict[str, int]:
+        return {"records": self.written, "dropped": self.dropped}
+
+
+class SnapshotIngestWriter:
+    """Writes ingest records into a new local snapshot (``--graph-snapshot``) instead of Neo4j."""
+
+    def __init__(self, path: Path) -> None:
+        from src.kg.local_store import SnapshotWriter
+
+        self.writer = SnapshotWriter(path)
+        self._seen: Set[Tuple[str, str]] = set()
+
+    def prepare(self, spec: IngestSpec) -> None:
+        # A new snapshot only holds the manifest's Component/Context nodes.
+        missing = undeclared_entities(spec)
+        if missing:
+            raise ValueError(f"Sources reference ids the manifest does not declare: {missing}")
+        for label, rows in (("Component", spec.components), ("Context", spec.contexts)):
+            for row in rows:
+                self.writer.add_node((label, row["id"]), label, row)
+
+    def write(self, records: List[Dict[str, Any]]) -> int:
+        for record in records:
+            measurement = record["m"]
+            key = ("Measurement", measurement["recordId"])
+            if key in self._seen:
+                continue
+            self._seen.add(key)
+            self.writer.add_node(key, "Measurement", measurement)
+            self.writer.add_relationship("MEASURES", key, ("Component", record["component"]), {})
+            self.writer.add_relationship("SUPPLIES", ("Context", record["context"]), key, {})
+            if record["s"] is not None:
+                state_key = ("State", record["s"]["recordId"])
+                self.writer.add_node(state_key, "State", record["s"])
+                self.writer.add_relationship(
+                    "ESTIMATES", key, state_key, {"method": record["method"]}
+                )
+        # ``prepare`` checked every Component/Context, so nothing is dropped.
+        return len(records)
+
+    def close(self) -> Dict[str, int]:
+        return self.writer.close()
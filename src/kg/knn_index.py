@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.kg.features import FEATURE_SCALES, feature_vector, node_summary, summary_vector
+from src.kg.store import GraphStore
+from src.kg.summary import MEASUREMENT_SUMMARY_PROPERTIES
+
+STRING_KEYS = ("chemistry", "lifeStage", "operatingSubphase")
+NUMERIC_KEYS = ("ratedCapacity_Ah", "temperature_C")
+# Filters dropped first to last when a lookup returns nothing.
+RELAXATION_ORDER = (
+    "operatingSubphase",
+    "lifeStage",
+    "temperature_C",
+    "ratedCapacity_Ah",
+    "chemistry",
+)
+
+EXPORT_QUERY = """
+MATCH (m:Measurement) WHERE m.recordId > $after
+WITH m ORDER BY m.recordId LIMIT $batch_size
+OPTIONAL MATCH (m)-[:MEASURES]->(c:Component)
+OPTIONAL MATCH (ctx:Context)-[:SUPPLIES]->(m)
+OPTIONAL MATCH (m)-[:ESTIMATES]->(s:State {stateType: 'SOC'})
+WITH m, head(collect(c)) AS c, head(collect(ctx)) AS ctx, head(collect(s)) AS s
+RETURN m.recordId AS recordId, s.recordId AS stateRecordId,
+       m {.summary, %s} AS m,
+       c.chemistry AS chemistry, c.ratedCapacity_Ah AS ratedCapacity_Ah,
+       ctx.temperature_C AS temperature_C, ctx.lifeStage AS lifeStage,
+       ctx.operatingSubphase AS operatingSubphase
+ORDER BY recordId
+LIMIT $batch_size
+""" % ", ".join(f".{prop}" for prop in MEASUREMENT_SUMMARY_PROPERTIES)
+
+
+@dataclass
+class IndexMatch:
+    record_id: str
+    state_record_id: str
+    distance: float
+
+
+class MeasurementIndex:
+    """Memory-mapped matrix of Measurement summary features plus categorical keys."""
+
+    def __init__(
+        self,
+        features: np.ndarray,
+        record_ids: List[str],
+        state_record_ids: List[str],
+        codes: Dict[str, np.ndarray],
+        vocab: Dict[str, List[str]],
+        numeric: Dict[str, np.ndarray],
+    ) -> None:
+        self.features = features
+        self.record_ids = record_ids
+        self.state_record_ids = state_record_ids
+        self.codes = codes
+        self.vocab = vocab
+        self.numeric = numeric
+
+    def __len__(self) -> int:
+        return len(self.record_ids)
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Dict[str, Any]]) -> "MeasurementIndex":
+        features = np.empty((len(rows), len(MEASUREMENT_SUMMARY_PROPERTIES)), dtype=np.float32)
+        for i, row in enumerate(rows):
+            features[i] = summary_vector(node_summary(row.get("m") or {}))
+        codes: Dict[str, np.ndarray] = {}
+        vocab: Dict[str, List[str]] = {}
+        for key in STRING_KEYS:
+            values = ["" if row.get(key) is None else str(row[key]) for row in rows]
+            uniques, inverse = np.unique(np.asarray(values, dtype=object), return_inverse=True)
+            vocab[key] = [str(u) for u in uniques]
+            codes[key] = inverse.astype(np.int32)
+        numeric = {
+            key: np.array(
+                [np.nan if row.get(key) is None else float(row[key]) for row in rows],
+                dtype=np.float32,
+            )
+            for key in NUMERIC_KEYS
+        }
+        return cls(
+            features=features,
+            record_ids=[str(row["recordId"]) for row in rows],
+            state_record_ids=[str(row["stateRecordId"]) for row in rows],
+            codes=codes,
+            vocab=vocab,
+            numeric=numeric,
+        )
+
+    @classmethod
+    def build_from_store(cls, store: GraphStore, batch_size: int = 5000) -> "MeasurementIndex":
+        rows: List[Dict[str, Any]] = []
+        after = ""
+        while True:
+            batch = store.run_read(EXPORT_QUERY, {"after": after, "batch_size": batch_size})
+            if not batch:
+                break
+            rows.extend(row for row in batch if row.get("stateRecordId") is not None)
+            after = batch[-1]["recordId"]
+            if len(batch) < batch_size:
+                break
+        return cls.from_rows(rows)
+
+    def save(self, directory: Path) -> None:
+        directory.mkdir(parents=True, exist_ok=True)
+        np.save(directory / "features.npy", self.features)
+        for key, values in self.codes.items():
+            np.save(directory / f"code_{key}.npy", values)
+        for key, values in self.numeric.items():
+            np.save(directory / f"num_{key}.npy", values)
+        meta = {
+            "feature_names": list(MEASUREMENT_SUMMARY_PROPERTIES),
+            "record_ids": self.record_ids,
+            "state_record_ids": self.state_record_ids,
+            "vocab": self.vocab,
+        }
+        (directory / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+
+    @classmethod
+    def load(cls, directory: Path, mmap: bool = True) -> "MeasurementIndex":
+        mode = "r" if mmap else None
+        meta = json.loads((directory / "meta.json").read_text(encoding="utf-8"))
+        if meta["feature_names"] != list(MEASUREMENT_SUMMARY_PROPERTIES):
+            raise RuntimeError(f"Index at {directory} uses different features; rebuild it.")
+        return cls(
+            features=np.load(directory / "features.npy", mmap_mode=mode),
+            record_ids=meta["record_ids"],
+            state_record_ids=meta["state_record_ids"],
+            codes={
+                key: np.load(directory / f"code_{key}.npy", mmap_mode=mode) for key in STRING_KEYS
+            },
+            vocab=meta["vocab"],
+            numeric={
+                key: np.load(directory / f"num_{key}.npy", mmap_mode=mode) for key in NUMERIC_KEYS
+            },
+        )
+
+    def filter_mask(
+        self, filters: Dict[str, Any], temperature_tolerance: float = 5.0
+    ) -> np.ndarray:
+        mask = np.ones(len(self), dtype=bool)
+        for key in STRING_KEYS:
+            if filters.get(key) is None:
+                continue
+            wanted = str(filters[key]).lower()
+            matching = [i for i, value in enumerate(self.vocab[key]) if value.lower() == wanted]
+            mask &= np.isin(self.codes[key], matching)
+        if filters.get("ratedCapacity_Ah") is not None:
+            capacity = float(filters["ratedCapacity_Ah"])
+            mask &= np.isclose(self.numeric["ratedCapacity_Ah"], capacity)
+        if filters.get("temperature_C") is not None:
+            delta = np.abs(self.numeric["temperature_C"] - float(filters["temperature_C"]))
+            mask &= delta <= temperature_tolerance
+        return mask
+
+    def query(
+        self,
+        summary: Dict[str, Any],
+        k: int = 3,
+        filters: Optional[Dict[str, Any]] = None,
+        temperature_tolerance: float = 5.0,
+    ) -> List[IndexMatch]:
+        target = feature_vector(summary)
+        dims = ~np.isnan(target)
+        if not dims.any() or len(self) == 0:
+            return []
+        candidates = np.flatnonzero(self.filter_mask(filters or {}, temperature_tolerance))
+        if candidates.size == 0:
+            return []
+        scaled = np.asarray(self.features[candidates][:, dims]) / FEATURE_SCALES[dims]
+        diff = scaled - target[dims]
+        valid = ~np.isnan(diff)
+        counts = valid.sum(axis=1)
+        squared = np.where(valid, diff * diff, 0.0).sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            distances = np.where(counts > 0, np.sqrt(squared / counts), np.inf)
+        k = min(k, candidates.size)
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top], kind="stable")]
+        return [
+            IndexMatch(
+                record_id=self.record_ids[candidates[i]],
+                state_record_id=self.state_record_ids[candidates[i]],
+                distance=float(distances[i]),
+            )
+            for i in top
+            if np.isfinite(distances[i])
+        ]
+
+    def query_relaxed(
+        self,
+        summary: Dict[str, Any],
+        k: int = 3,
+        filters: Optional[Dict[str, Any]] = None,
+        temperature_tolerance: float = 5.0,
+    ) -> Tuple[List[IndexMatch], Dict[str, Any]]:
+        """Query, dropping filters in ``RELAXATION_ORDER`` until something matches."""
+        active = {key: value for key, value in (filters or {}).items() if value is not None}
+        while True:
+            matches = self.query(summary, k, active, temperature_tolerance)
+            if matches:
+                return matches, active
+            dropped = next((key for key in RELAXATION_ORDER if key in active), None)
+            if dropped is None:
+                return [], active
+            active.pop(dropped)
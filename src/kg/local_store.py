@@ -0,0 +1,439 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from src.file_cache import file_signature
+from src.kg.cypher_pattern import ReturnItem, UnsupportedQueryError, parse_retrieval_cypher
+from src.kg.pattern import ALIAS_LABELS, RETURN_ALIASES, Condition, RetrievalPattern
+from src.kg.store import GraphStore, QueryPlan
+from src.kg.summary import flatten_summary
+from src.kg.values import convert_values, decode_values
+
+SNAPSHOT_LABELS = ("Component", "Context", "Measurement", "State")
+SNAPSHOT_RELATIONSHIPS = ("MEASURES", "ESTIMATES", "SUPPLIES", "DEGRADES", "IS_PART_OF", "HAS_PART")
+SUMMARY_LABELS = ("Measurement", "State")
+
+_SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE nodes (
+    id INTEGER PRIMARY KEY,
+    label TEXT NOT NULL,
+    record_id TEXT,
+    props TEXT NOT NULL,
+    node_values
+);
+CREATE INDEX nodes_label_record ON nodes(label, record_id);
+CREATE TABLE rels (
+    type TEXT NOT NULL,
+    start_id INTEGER NOT NULL,
+    end_id INTEGER NOT NULL,
+    props TEXT NOT NULL
+);
+"""
+
+
+class SnapshotWriter:
+    """Writes KG nodes and relationships into a compact local sqlite snapshot."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp_path = self.path.with_name(self.path.name + ".tmp")
+        if self._tmp_path.exists():
+            self._tmp_path.unlink()
+        self._conn = sqlite3.connect(str(self._tmp_path))
+        self._conn.executescript(_SCHEMA)
+        self._ids: Dict[Any, int] = {}
+        self.counts: Dict[str, int] = {}
+
+    def add_node(self, key: Any, label: str, props: Dict[str, Any]) -> int:
+        props = dict(props)
+        values = props.pop("values", None)
+        if isinstance(values, (list, dict)):
+            values = json.dumps(values)
+        if label in SUMMARY_LABELS and props.get("summary") is not None:
+            for name, value in flatten_summary(props["summary"]).items():
+                props.setdefault(name, value)
+        node_id = len(self._ids) + 1
+        self._ids[key] = node_id
+        record_id = props.get("recordId", props.get("id"))
+        self._conn.execute(
+            "INSERT INTO nodes (id, label, record_id, props, node_values) VALUES (?, ?, ?, ?, ?)",
+            (
+                node_id,
+                label,
+                None if record_id is None else str(record_id),
+                json.dumps(props),
+                values,
+            ),
+        )
+        self.counts[label] = self.counts.get(label, 0) + 1
+        return node_id
+
+    def add_relationship(
+        self, rel_type: str, start_key: Any, end_key: Any, props: Dict[str, Any]
+    ) -> bool:
+        start_id = self._ids.get(start_key)
+        end_id = self._ids.get(end_key)
+        if start_id is None or end_id is None:
+            return False
+        self._conn.execute(
+            "INSERT INTO rels (type, start_id, end_id, props) VALUES (?, ?, ?, ?)",
+            (rel_type, start_id, end_id, json.dumps(props)),
+        )
+        self.counts[rel_type] = self.counts.get(rel_type, 0) + 1
+        return True
+
+    def close(self) -> Dict[str, int]:
+        self._conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('counts', ?)", (json.dumps(self.counts),)
+        )
+        self._conn.commit()
+        self._conn.close()
+        self._tmp_path.replace(self.path)
+        return self.counts
+
+
+def migrate_snapshot_values(path: Path, label: str, fmt: str, batch_size: int = 2000) -> int:
+    """Rewrite ``values`` of ``label`` nodes in a snapshot in ``fmt`` (see ``src.kg.values``)."""
+    conn = sqlite3.connect(str(path))
+    updated = 0
+    after = 0
+    try:
+        while True:
+            records = conn.execute(
+                "SELECT id, props, node_values FROM nodes "
+                "WHERE label = ? AND id > ? AND node_values IS NOT NULL ORDER BY id LIMIT ?",
+                (label, after, batch_size),
+            ).fetchall()
+            if not records:
+                break
+            updates = []
+            for node_id, props_text, raw in records:
+                props = json.loads(props_text)
+                try:
+                    converted = convert_values(dict(props, values=raw), fmt)
+                except ValueError:
+                    continue
+                values = converted.pop("values")
+                props.update({key: value for key, value in converted.items() if value is not None})
+                for key in [key for key, value in converted.items() if value is None]:
+                    props.pop(key, None)
+                if isinstance(values, list):
+                    values = json.dumps(values)
+                updates.append((json.dumps(props), values, node_id))
+            conn.executemany("UPDATE nodes SET props = ?, node_values = ? WHERE id = ?", updates)
+            conn.commit()
+            updated += len(updates)
+            after = records[-1][0]
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    return updated
+
+
+def export_snapshot(store: GraphStore, path: Path, batch_size: int = 2000) -> Dict[str, int]:
+    """Copy the four KG labels and six relationship types from ``store`` into ``path``.
+
+    Each label and relationship type is one streamed read (``batch_size`` records
+    per fetch); relationships have no indexed key to page on.
+    """
+    writer = SnapshotWriter(path)
+    for label in SNAPSHOT_LABELS:
+        query = f"MATCH (n:{label}) RETURN elementId(n) AS id, properties(n) AS props"
+        for row in store.iter_read(query, fetch_size=batch_size):
+            writer.add_node(row["id"], label, row["props"])
+    for rel_type in SNAPSHOT_RELATIONSHIPS:
+        query = (
+            f"MATCH (a)-[r:{rel_type}]->(b) "
+            "RETURN elementId(a) AS start, elementId(b) AS end, properties(r) AS props"
+        )
+        for row in store.iter_read(query, fetch_size=batch_size):
+            writer.add_relationship(rel_type, row["start"], row["end"], row["props"])
+    return writer.close()
+
+
+def _compare(actual: Any, op: str, expected: Any) -> bool:
+    if actual is None or (expected is None and op != "IN"):
+        return False
+    try:
+        if op == "=":
+            return actual == expected
+        if op == "<>":
+            return actual != expected
+        if op == ">=":
+            return actual >= expected
+        if op == ">":
+            return actual > expected
+        if op == "<=":
+            return actual <= expected
+        if op == "<":
+            return actual < expected
+        if op == "IN":
+            return actual in (expected or [])
+    except TypeError:
+        return False
+    raise UnsupportedQueryError(f"Unsupported operator {op}")
+
+
+def _matches(props: Dict[str, Any], conditions: List[Condition]) -> bool:
+    return all(_compare(props.get(cond.prop), cond.op, cond.value) for cond in conditions)
+
+
+@dataclass
+class _Graph:
+    props: Dict[int, Dict[str, Any]] = field(default_factory=dict)
+    by_label: Dict[str, List[int]] = field(default_factory=dict)
+    by_record: Dict[Tuple[str, str], int] = field(default_factory=dict)
+    # Measurement id -> [(c, ctx, s, r1, r2, r3)] for the required part of the pattern.
+    joins: Dict[int, List[Tuple[int, int, int, Dict, Dict, Dict]]] = field(default_factory=dict)
+    degrades: Dict[Tuple[int, int], List[Dict[str, Any]]] = field(default_factory=dict)
+
+
+class LocalGraphStore(GraphStore):
+    """In-process backend over a snapshot written by ``export_snapshot``.
+
+    Answers the retrieval pattern (match/filter/optional DEGRADES/limit) with
+    the same row shapes as Neo4j; any other Cypher raises ``UnsupportedQueryError``.
+    Node/relationship properties are decoded into memory by the first query, a
+    single pass over the snapshot; ``warm_up`` pays that up front. ``values``
+    arrays stay in sqlite and are read per result row.
+    """
+
+    def __init__(self, path: Path, default_limit: int = 100) -> None:
+        self.path = Path(path)
+        if not self.path.exists():
+            raise FileNotFoundError(f"KG snapshot not found: {self.path}")
+        self.default_limit = default_limit
+        self._conn = sqlite3.connect(
+            f"file:{self.path.as_posix()}?mode=ro", uri=True, check_same_thread=False
+        )
+        self._lock = threading.Lock()
+        self._graph: Optional[_Graph] = None
+
+    def _load(self) -> _Graph:
+        with self._lock:
+            if self._graph is not None:
+                return self._graph
+            graph = _Graph()
+            for node_id, label, record_id, props in self._conn.execute(
+                "SELECT id, label, record_id, props FROM nodes"
+            ):
+                graph.props[node_id] = json.loads(props)
+                graph.by_label.setdefault(label, []).append(node_id)
+                if record_id is not None:
+                    graph.by_record[(label, record_id)] = node_id
+            rels: Dict[str, Dict[int, List[Tuple[int, Dict[str, Any]]]]] = {}
+            for rel_type, start_id, end_id, props in self._conn.execute(
+                "SELECT type, start_id, end_id, props FROM rels "
+                "WHERE type IN ('MEASURES', 'SUPPLIES', 'ESTIMATES', 'DEGRADES')"
+            ):
+                props = json.loads(props)
+                if rel_type == "DEGRADES":
+                    graph.degrades.setdefault((start_id, end_id), []).append(props)
+                elif rel_type == "SUPPLIES":
+                    rels.setdefault(rel_type, {}).setdefault(end_id, []).append((start_id, props))
+                else:
+                    rels.setdefault(rel_type, {}).setdefault(start_id, []).append((end_id, props))
+            for m_id in graph.by_label.get("Measurement", []):
+                joins = [
+                    (c_id, ctx_id, s_id, r1, r2, r3)
+                    for c_id, r1 in rels.get("MEASURES", {}).get(m_id, [])
+                    for ctx_id, r2 in rels.get("SUPPLIES", {}).get(m_id, [])
+                    for s_id, r3 in rels.get("ESTIMATES", {}).get(m_id, [])
+                ]
+                if joins:
+                    graph.joins[m_id] = joins
+            self._graph = graph
+            return graph
+
+    def _candidates(
+        self, graph: _Graph, alias: str, conditions: List[Condition]
+    ) -> Optional[Set[int]]:
+        if not conditions:
+            return None
+        label = ALIAS_LABELS[alias]
+        seeded = [c for c in conditions if c.prop == "recordId" and c.op in ("=", "IN")]
+        if seeded:
+            wanted = seeded[0].value if seeded[0].op == "IN" else [seeded[0].value]
+            ids = [graph.by_record.get((label, str(v))) for v in wanted or []]
+            pool: Iterable[int] = [node_id for node_id in ids if node_id is not None]
+        else:
+            pool = graph.by_label.get(label, [])
+        return {node_id for node_id in pool if _matches(graph.props[node_id], conditions)}
+
+    def match(
+        self, pattern: RetrievalPattern, returns: Optional[List[ReturnItem]] = None
+    ) -> List[Dict[str, Any]]:
+        graph = self._load()
+        returns = returns or [ReturnItem(alias) for alias in RETURN_ALIASES]
+        node_conditions: Dict[str, List[Condition]] = {alias: [] for alias in ALIAS_LABELS}
+        rel_conditions: Dict[str, List[Condition]] = {"r1": [], "r2": [], "r3": []}
+        for cond in pattern.conditions:
+            if cond.alias in node_conditions:
+                node_conditions[cond.alias].append(cond)
+            elif cond.alias in rel_conditions:
+                rel_conditions[cond.alias].append(cond)
+            else:
+                raise UnsupportedQueryError(f"Unsupported filter on {cond.alias}.{cond.prop}")
+        allowed = {
+            alias: self._candidates(graph, alias, conds) for alias, conds in node_conditions.items()
+        }
+        limit = pattern.limit if pattern.limit is not None else self.default_limit
+        if limit == 0:
+            return []
+        m_ids = sorted(allowed["m"]) if allowed["m"] is not None else graph.by_label.get(
+            "Measurement", []
+        )
+
+        def ok(alias: str, node_id: int) -> bool:
+            return allowed[alias] is None or node_id in allowed[alias]
+
+        matched = []
+        for m_id in m_ids:
+            for c_id, ctx_id, s_id, r1, r2, r3 in graph.joins.get(m_id, []):
+                if not (ok("c", c_id) and ok("ctx", ctx_id) and ok("s", s_id)):
+                    continue
+                if not (
+                    _matches(r1, rel_conditions["r1"])
+                    and _matches(r2, rel_conditions["r2"])
+                    and _matches(r3, rel_conditions["r3"])
+                ):
+                    continue
+                for r4 in graph.degrades.get((ctx_id, c_id)) or [None]:
+                    matched.append((m_id, c_id, ctx_id, s_id, r1, r2, r3, r4))
+                    if 0 <= limit <= len(matched):
+                        break
+                if 0 <= limit <= len(matched):
+                    break
+            if 0 <= limit <= len(matched):
+                break
+        return self._build_rows(graph, matched, returns)
+
+    def _build_rows(
+        self,
+        graph: _Graph,
+        matched: List[Tuple[Any, ...]],
+        returns: List[ReturnItem],
+    ) -> List[Dict[str, Any]]:
+        modes = {item.alias: item.mode for item in returns}
+        full_ids = {
+            ids[i]
+            for ids in matched
+            for i, alias in ((0, "m"), (3, "s"))
+            if modes.get(alias, "full") == "full"
+        }
+        values = self._node_values(full_ids)
+        rows = []
+        for m_id, c_id, ctx_id, s_id, r1, r2, r3, r4 in matched:
+            nodes: Dict[str, Dict[str, Any]] = {}
+            for alias, node_id in (("c", c_id), ("ctx", ctx_id), ("m", m_id), ("s", s_id)):
+                node = dict(graph.props[node_id])
+                if alias in ("m", "s"):
+                    node["values"] = None if modes.get(alias) == "lean" else values.get(node_id)
+                nodes[alias] = node
+            rels = {
+                "r1": ("m", "MEASURES", r1, "c"),
+                "r2": ("ctx", "SUPPLIES", r2, "m"),
+                "r3": ("m", "ESTIMATES", r3, "s"),
+                "r4": ("ctx", "DEGRADES", r4, "c"),
+            }
+            row: Dict[str, Any] = {}
+            for item in returns:
+                if item.alias in nodes:
+                    row[item.alias] = nodes[item.alias]
+                    continue
+                start, rel_type, props, end = rels[item.alias]
+                if props is None:
+                    row[item.alias] = None
+                elif item.mode == "props":
+                    row[item.alias] = dict(props, type=rel_type)
+                else:
+                    row[item.alias] = (nodes[start], rel_type, nodes[end])
+            rows.append(row)
+        return rows
+
+    def _node_values(self, node_ids: Set[int]) -> Dict[int, Any]:
+        if not node_ids:
+            return {}
+        ids = sorted(node_ids)
+        placeholders = ",".join("?" * len(ids))
+        with self._lock:
+            return dict(
+                self._conn.execute(
+                    f"SELECT id, node_values FROM nodes WHERE id IN ({placeholders})", ids
+                ).fetchall()
+            )
+
+    def run_read(
+        self, cypher: str, parameters: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        parsed = parse_retrieval_cypher(cypher, parameters)
+        return self.match(parsed.pattern, parsed.returns)
+
+    def run_read_batch(
+        self, patterns: List[RetrievalPattern], returns: Sequence[str] = RETURN_ALIASES
+    ) -> List[List[Dict[str, Any]]]:
+        items = [ReturnItem(alias) for alias in returns]
+        return [self.match(pattern, items) for pattern in patterns]
+
+    def warm_up(self) -> None:
+        self._load()
+
+    def data_version(self) -> Optional[str]:
+        signature = file_signature(self.path)
+        return None if signature is None else f"{signature[0]}:{signature[1]}"
+
+    def explain(
+        self, cypher: str, parameters: Optional[Dict[str, Any]] = None
+    ) -> Optional[QueryPlan]:
+        """Measurements the join would scan: the filtered candidates, or all of them."""
+        parsed = parse_retrieval_cypher(cypher, parameters)
+        graph = self._load()
+        conditions = [cond for cond in parsed.pattern.conditions if cond.alias == "m"]
+        candidates = self._candidates(graph, "m", conditions)
+        if candidates is None:
+            return QueryPlan(
+                float(len(graph.by_label.get("Measurement", []))), ["NodeByLabelScan"]
+            )
+        return QueryPlan(float(len(candidates)), ["NodeIndexSeek"])
+
+    def fetch_values(self, label: str, record_ids: List[Any]) -> Dict[Any, Any]:
+        if not record_ids:
+            return {}
+        graph = self._load()
+        ids = {
+            graph.by_record[(label, str(record_id))]: record_id
+            for record_id in record_ids
+            if (label, str(record_id)) in graph.by_record
+        }
+        return {
+            ids[node_id]: decode_values(
+                value,
+                graph.props[node_id].get("valuesKeys"),
+                graph.props[node_id].get("valuesShape"),
+            )
+            for node_id, value in self._node_values(set(ids)).items()
+        }
+
+    def fetch_rows_by_ids(self, pairs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        rows: List[Dict[str, Any]] = []
+        for pair in pairs:
+            pattern = RetrievalPattern(
+                conditions=[
+                    Condition("m", "recordId", "=", pair["m"]),
+                    Condition("s", "recordId", "=", pair["s"]),
+                ],
+                limit=None,
+            )
+            rows.extend(self.match(pattern))
+        return rows
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+ALIAS_LABELS = {"c": "Component", "ctx": "Context", "m": "Measurement", "s": "State"}
+RELATIONSHIP_ALIASES = ("r1", "r2", "r3", "r4")
+RETURN_ALIASES = ("c", "ctx", "m", "s") + RELATIONSHIP_ALIASES
+
+MATCH_CLAUSES = (
+    "MATCH (m:Measurement)-[r1:MEASURES]->(c:Component)",
+    "MATCH (ctx:Context)-[r2:SUPPLIES]->(m)",
+    "MATCH (m)-[r3:ESTIMATES]->(s:State)",
+)
+OPTIONAL_CLAUSE = "OPTIONAL MATCH (ctx)-[r4:DEGRADES]->(c)"
+
+_OP_SUFFIX = {"=": "eq", "<>": "ne", ">=": "min", ">": "gt", "<=": "max", "<": "lt", "IN": "in"}
+
+
+@dataclass
+class Condition:
+    alias: str
+    prop: str
+    op: str
+    value: Any
+
+    @property
+    def param_name(self) -> str:
+        return f"{self.alias}_{self.prop}_{_OP_SUFFIX[self.op]}"
+
+
+@dataclass
+class RetrievalPattern:
+    """The retrieval query shape: Measurement/Component/Context/State join plus filters."""
+
+    conditions: List[Condition] = field(default_factory=list)
+    limit: Optional[int] = 3
+
+    def sorted_conditions(self) -> List[Condition]:
+        aliases = list(ALIAS_LABELS)
+        ops = list(_OP_SUFFIX)
+        return sorted(
+            self.conditions,
+            key=lambda cond: (aliases.index(cond.alias), cond.prop, ops.index(cond.op)),
+        )
+
+    def shape(self) -> Tuple[Any, ...]:
+        """Filter set and limit without the values; equal shapes can share one batched query."""
+        return (
+            tuple((cond.alias, cond.prop, cond.op) for cond in self.sorted_conditions()),
+            self.limit,
+        )
+
+    def to_cypher(self) -> Tuple[str, Dict[str, Any]]:
+        """Parameterized Cypher; patterns with the same filter set share one query text."""
+        parameters: Dict[str, Any] = {}
+        predicates = []
+        for cond in self.sorted_conditions():
+            name = cond.param_name
+            if name in parameters:
+                raise ValueError(f"Duplicate condition {cond.alias}.{cond.prop} {cond.op}")
+            parameters[name] = cond.value
+            predicates.append(f"{cond.alias}.{cond.prop} {cond.op} ${name}")
+        if self.limit is not None:
+            parameters["limit"] = int(self.limit)
+        lines = list(MATCH_CLAUSES)
+        if predicates:
+            lines.append("WHERE " + "\n  AND ".join(predicates))
+        lines.append(OPTIONAL_CLAUSE)
+        lines.append(f"RETURN {', '.join(RETURN_ALIASES)}")
+        if self.limit is not None:
+            lines.append("LIMIT $limit")
+        return "\n".join(lines), parameters
+
+
+def batch_to_cypher(
+    patterns: Sequence[RetrievalPattern], returns: Sequence[str] = RETURN_ALIASES
+) -> Tuple[str, Dict[str, Any]]:
+    """One ``UNWIND $queries`` query answering same-shape patterns in a single round trip.
+
+    Each pattern's filter values become one entry of ``$queries``; rows come back
+    tagged with ``query_index`` (the pattern's position), each pattern limited on
+    its own inside the subquery.
+    """
+    if not patterns:
+        raise ValueError("No patterns to batch.")
+    first = patterns[0]
+    if first.limit is None:
+        raise ValueError("Batched patterns need a LIMIT.")
+    queries = []
+    for index, pattern in enumerate(patterns):
+        if pattern.shape() != first.shape():
+            raise ValueError("Batched patterns must have the same shape.")
+        entry: Dict[str, Any] = {"index": index}
+        for cond in pattern.conditions:
+            entry[cond.param_name] = cond.value
+        queries.append(entry)
+    predicates = [
+        f"{cond.alias}.{cond.prop} {cond.op} q.{cond.param_name}"
+        for cond in first.sorted_conditions()
+    ]
+    lines = ["UNWIND $queries AS q", "CALL {", "  WITH q"]
+    lines.extend(f"  {clause}" for clause in MATCH_CLAUSES)
+    if predicates:
+        lines.append("  WHERE " + "\n    AND ".join(predicates))
+    lines.append(f"  {OPTIONAL_CLAUSE}")
+    lines.append(f"  RETURN {', '.join(returns)}")
+    lines.append("  LIMIT $limit")
+    lines.append("}")
+    lines.append(f"RETURN q.index AS query_index, {', '.join(returns)}")
+    # A closing LIMIT keeps the store from appending its default one to the whole batch.
+    lines.append("LIMIT $total")
+    parameters = {
+        "queries": queries,
+        "limit": int(first.limit),
+        "total": int(first.limit) * len(patterns),
+    }
+    return "\n".join(lines), parameters
@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import re
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from src.config import Neo4jConfig, load_yaml_config
+from src.kg.pattern import RETURN_ALIASES, RetrievalPattern, batch_to_cypher
+from src.kg.values import node_values
+
+_LIMIT_RE = re.compile(r"\bLIMIT\b", re.IGNORECASE)
+_RETURN_RE = re.compile(r"\bRETURN\b", re.IGNORECASE)
+# Line comments, skipping string literals so ``'http://...'`` survives.
+_COMMENT_RE = re.compile(r"('(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\")|//[^\n]*")
+
+ROWS_BY_IDS_QUERY = """
+UNWIND $pairs AS pair
+MATCH (m:Measurement {recordId: pair.m})-[r1:MEASURES]->(c:Component)
+MATCH (ctx:Context)-[r2:SUPPLIES]->(m)
+MATCH (m)-[r3:ESTIMATES]->(s:State {recordId: pair.s})
+OPTIONAL MATCH (ctx)-[r4:DEGRADES]->(c)
+RETURN c, ctx, m, s, r1, r2, r3, r4
+LIMIT $limit
+""".strip()
+
+
+def _top_level(query: str) -> str:
+    """``query`` with string literals, quoted names and bracketed/braced text blanked out."""
+    chars = list(query)
+    depth = 0
+    quote: Optional[str] = None
+    i = 0
+    while i < len(chars):
+        char = chars[i]
+        if quote is not None:
+            if char == "\\":
+                chars[i] = " "
+                i += 1
+                if i < len(chars):
+                    chars[i] = " "
+            elif char == quote:
+                quote = None
+            else:
+                chars[i] = " "
+        elif char in "'\"`":
+            quote = char
+        elif char in "([{":
+            depth += 1
+        elif char in ")]}":
+            depth = max(depth - 1, 0)
+        elif depth:
+            chars[i] = " "
+        i += 1
+    return "".join(chars)
+
+
+def ensure_limit(cypher: str, default_limit: int) -> str:
+    """``cypher`` with ``LIMIT default_limit`` appended unless its final RETURN has a LIMIT."""
+    query = _COMMENT_RE.sub(lambda m: m.group(1) or "", cypher).strip().rstrip(";").rstrip()
+    if default_limit <= 0:
+        return query
+    # Only the top level counts: a subquery's RETURN or LIMIT does not bound the result.
+    masked = _top_level(query)
+    returns = list(_RETURN_RE.finditer(masked))
+    if not returns or _LIMIT_RE.search(masked, returns[-1].end()):
+        return query
+    return f"{query}\nLIMIT {int(default_limit)}"
+
+
+@dataclass
+class QueryPlan:
+    """Planner estimate for a query: operator names and the largest row estimate."""
+
+    estimated_rows: float
+    operators: List[str] = field(default_factory=list)
+
+
+class GraphStore(ABC):
+    """Read-only access to the battery KG."""
+
+    @abstractmethod
+    def run_read(
+        self, cypher: str, parameters: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        ...
+
+    def iter_read(
+        self, cypher: str, parameters: Optional[Dict[str, Any]] = None, fetch_size: int = 1000
+    ) -> Iterator[Dict[str, Any]]:
+        """Rows of a long read without a default LIMIT (e.g. exports), streamed where possible."""
+        yield from self.run_read(cypher, parameters)
+
+    def run_read_batch(
+        self, patterns: List[RetrievalPattern], returns: Sequence[str] = RETURN_ALIASES
+    ) -> List[List[Dict[str, Any]]]:
+        """Rows of each same-shape pattern, fetched in one ``batch_to_cypher`` round trip."""
+        cypher, parameters = batch_to_cypher(patterns, returns)
+        results: List[List[Dict[str, Any]]] = [[] for _ in patterns]
+        for row in self.run_read(cypher, parameters):
+            results[row.pop("query_index")].append(row)
+        return results
+
+    def explain(
+        self, cypher: str, parameters: Optional[Dict[str, Any]] = None
+    ) -> Optional[QueryPlan]:
+        """Plan ``cypher`` without running it; ``None`` when the backend has no planner."""
+        return None
+
+    def warm_up(self) -> None:
+        """Open connections / load data up front so the first query does not pay for it."""
+
+    def data_version(self) -> Optional[str]:
+        """Cheap token that changes when the KG data changes; ``None`` when unknown."""
+        return None
+
+    def fetch_values(self, label: str, record_ids: List[Any]) -> Dict[Any, Any]:
+        """Decoded ``values`` of ``label`` nodes (see ``src.kg.values``), keyed by recordId."""
+        if not record_ids:
+            return {}
+        rows = self.run_read(
+            f"MATCH (n:{label}) WHERE n.recordId IN $ids "
+            "RETURN n.recordId AS recordId, n.values AS values, "
+            "n.valuesKeys AS valuesKeys, n.valuesShape AS valuesShape LIMIT $limit",
+            {"ids": list(record_ids), "limit": len(record_ids)},
+        )
+        return {row["recordId"]: node_values(row) for row in rows}
+
+    def fetch_rows_by_ids(self, pairs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Full retrieval rows for ``{"m": recordId, "s": recordId}`` pairs, in input order."""
+        if not pairs:
+            return []
+        rows = self.run_read(ROWS_BY_IDS_QUERY, {"pairs": pairs, "limit": len(pairs) * 4})
+        order = {(pair["m"], pair["s"]): i for i, pair in enumerate(pairs)}
+        rows.sort(key=lambda row: order.get((row["m"]["recordId"], row["s"]["recordId"]), 0))
+        return rows
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "GraphStore":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+class Neo4jStore(GraphStore):
+    def __init__(self, config: Neo4jConfig) -> None:
+        from neo4j import GraphDatabase
+
+        self.config = config
+        self.driver = GraphDatabase.driver(
+            config.uri,
+            auth=(config.user, config.password),
+            max_connection_lifetime=config.max_connection_lifetime,
+            max_connection_pool_size=config.max_connection_pool_size,
+            connection_acquisition_timeout=config.connection_acquisition_timeout,
+        )
+
+    def session(self, **kwargs: Any):
+        kwargs.setdefault("database", self.config.database)
+        kwargs.setdefault("fetch_size", self.config.fetch_size)
+        return self.driver.session(**kwargs)
+
+    def run_read(
+        self,
+        cypher: str,
+        parameters: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        from neo4j import READ_ACCESS, unit_of_work
+
+        query = ensure_limit(cypher, self.config.default_limit)
+
+        @unit_of_work(timeout=timeout if timeout is not None else self.config.read_tx_timeout)
+        def work(tx) -> List[Dict[str, Any]]:
+            return [record.data() for record in tx.run(query, parameters or {})]
+
+        with self.session(default_access_mode=READ_ACCESS) as session:
+            return session.execute_read(work)
+
+    def iter_read(
+        self, cypher: str, parameters: Optional[Dict[str, Any]] = None, fetch_size: int = 1000
+    ) -> Iterator[Dict[str, Any]]:
+        from neo4j import READ_ACCESS
+
+        with self.session(default_access_mode=READ_ACCESS, fetch_size=fetch_size) as session:
+            for record in session.run(cypher, parameters or {}):
+                yield record.data()
+
+    def explain(
+        self, cypher: str, parameters: Optional[Dict[str, Any]] = None
+    ) -> Optional[QueryPlan]:
+        from neo4j import READ_ACCESS
+
+        query = ensure_limit(cypher, self.config.default_limit)
+        with self.session(default_access_mode=READ_ACCESS) as session:
+            plan = session.run(f"EXPLAIN {query}", parameters or {}).consume().plan
+        if not plan:
+            return None
+        operators: List[str] = []
+        estimated = 0.0
+        stack = [plan]
+        while stack:
+            node = stack.pop()
+            operators.append(str(node.get("operatorType", "")).split("@")[0])
+            args = node.get("args") or node.get("arguments") or {}
+            estimated = max(estimated, float(args.get("EstimatedRows") or 0.0))
+            stack.extend(node.get("children") or [])
+        return QueryPlan(estimated_rows=estimated, operators=operators)
+
+    def warm_up(self) -> None:
+        self.driver.verify_connectivity()
+
+    def data_version(self) -> Optional[str]:
+        # Both counts come from the count store, so this does not scan the graph.
+        # Property-only rewrites keep the counts; caches rely on their TTL for those.
+        from neo4j import READ_ACCESS
+
+        with self.session(default_access_mode=READ_ACCESS) as session:
+            nodes = session.run("MATCH (n) RETURN count(n) AS n").single()["n"]
+            rels = session.run("MATCH ()-[r]->() RETURN count(r) AS n").single()["n"]
+        return f"{nodes}:{rels}"
+
+    def close(self) -> None:
+        self.driver.close()
+
+
+def load_neo4j_store(path: Path = Path("configs/neo4j.yaml")) -> Neo4jStore:
+    return Neo4jStore(Neo4jConfig(**load_yaml_config(path)))
+
+
+def load_graph_store(
+    neo4j_config: Path = Path("configs/neo4j.yaml"), snapshot: Optional[Path] = None
+) -> GraphStore:
+    """Local snapshot backend when ``snapshot`` is given, otherwise Neo4j."""
+    if snapshot is not None:
+        from src.kg.local_store import LocalGraphStore
+
+        return LocalGraphStore(snapshot)
+    return load_neo4j_store(neo4j_config)
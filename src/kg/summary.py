@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+SUMMARY_SIGNALS = ("voltage_v", "current_a", "temperature_c")
+SUMMARY_STATS = ("start", "end", "mean")
+
+# Filter fields used by retrieval queries, per label.
+INDEXED_PROPERTIES: Dict[str, Tuple[str, ...]] = {
+    "Component": ("chemistry", "ratedCapacity_Ah"),
+    "Context": ("temperature_C", "lifeStage", "operatingSubphase"),
+    "State": ("stateType", "recordId"),
+}
+
+
+def summary_property(signal: str, stat: str) -> str:
+    return f"summary_{signal}_{stat}"
+
+
+MEASUREMENT_SUMMARY_PROPERTIES = tuple(
+    summary_property(signal, stat) for signal in SUMMARY_SIGNALS for stat in SUMMARY_STATS
+)
+INDEXED_PROPERTIES["Measurement"] = ("recordId",) + MEASUREMENT_SUMMARY_PROPERTIES
+
+
+def flatten_summary(summary: Any, prefix: str = "summary") -> Dict[str, float]:
+    """Explode a (JSON) summary map into flat typed properties.
+
+    ``{"voltage_v": {"mean": 3.7}}`` becomes ``{"summary_voltage_v_mean": 3.7}``.
+    Non-numeric leaves are skipped.
+    """
+    if isinstance(summary, str):
+        try:
+            summary = json.loads(summary)
+        except json.JSONDecodeError:
+            return {}
+    flat: Dict[str, float] = {}
+    if not isinstance(summary, dict):
+        return flat
+    for key, value in summary.items():
+        name = f"{prefix}_{key}"
+        if isinstance(value, dict):
+            flat.update(flatten_summary(value, name))
+        elif isinstance(value, bool):
+            continue
+        elif isinstance(value, (int, float)):
+            flat[name] = float(value)
+    return flat
+
+
+def index_name(label: str, prop: str) -> str:
+    return f"{label.lower()}_{prop}"
+
+
+def index_statements() -> List[str]:
+    return [
+        f"CREATE RANGE INDEX {index_name(label, prop)} IF NOT EXISTS "
+        f"FOR (n:{label}) ON (n.{prop})"
+        for label, props in INDEXED_PROPERTIES.items()
+        for prop in props
+    ]
+
+
+def create_indexes(driver, database: Optional[str] = None) -> List[str]:
+    statements = index_statements()
+    with driver.session(database=database) as session:
+        for statement in statements:
+            session.run(statement).consume()
+        session.run("CALL db.awaitIndexes(300)").consume()
+    return statements
+
+
+def iter_record_pages(
+    session, label: str, where: str, returns: str, batch_size: int
+) -> Iterator[List[Dict[str, Any]]]:
+    """Pages of ``label`` nodes (``id`` plus ``returns``) in string recordId order.
+
+    Each page seeks past the last recordId on its range index, so a full pass is
+    linear; nodes without a recordId are not visited.
+    """
+    session.run(
+        f"CREATE RANGE INDEX {index_name(label, 'recordId')} IF NOT EXISTS "
+        f"FOR (n:{label}) ON (n.recordId)"
+    ).consume()
+    session.run("CALL db.awaitIndexes(300)").consume()
+    query = (
+        f"MATCH (n:{label}) WHERE n.recordId > $after AND {where} "
+        f"RETURN n.recordId AS id, {returns} ORDER BY n.recordId LIMIT $batch_size"
+    )
+    after = ""
+    while True:
+        records = session.run(query, after=after, batch_size=batch_size).data()
+        if not records:
+            return
+        yield records
+        after = records[-1]["id"]
+
+
+def materialize_summaries(
+    driver,
+    label: str,
+    database: Optional[str] = None,
+    batch_size: int = 1000,
+) -> int:
+    write_query = (
+        "UNWIND $rows AS row "
+        f"MATCH (n:{label} {{recordId: row.id}}) "
+        "SET n += row.props"
+    )
+    updated = 0
+    with driver.session(database=database) as session:
+        pages = iter_record_pages(
+            session, label, "n.summary IS NOT NULL", "n.summary AS summary", batch_size
+        )
+        for records in pages:
+            rows = []
+            for record in records:
+                props = flatten_summary(record["summary"])
+                if props:
+                    rows.append({"id": record["id"], "props": props})
+            if rows:
+                session.execute_write(lambda tx: tx.run(write_query, rows=rows).consume())
+            updated += len(rows)
+    return updated
@@ -0,0 +1,198 @@
+"""
+Storage formats for Measurement/State ``values`` arrays and the one accessor that
+reads all of them.
+
+- ``json``: a JSON string (the original dump format), e.g. ``{"voltage_v": [...]}``.
+- ``list``: a native Neo4j float list, flattened row-major.
+- ``float32``: little-endian float32 bytes, flattened row-major (a Neo4j byte array).
+
+For ``list`` and ``float32`` the layout lives next to the array, since a property
+cannot hold a map: ``valuesShape`` (e.g. ``[4, 30]``) and, for maps of
+signals, ``valuesKeys`` naming the rows (e.g. ``["time_s", "voltage_v", ...]``).
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from src.kg.summary import iter_record_pages
+
+VALUE_FORMATS = ("json", "list", "float32")
+LAYOUT_PROPERTIES = ("valuesKeys", "valuesShape")
+FLOAT32_LE = np.dtype("<f4")
+FLOAT32_DIGITS = 7
+
+
+def _as_array(values: Any) -> np.ndarray:
+    if isinstance(values, dict):
+        rows = [np.asarray(row, dtype=np.float64) for row in values.values()]
+        if len({row.shape for row in rows}) > 1:
+            raise ValueError("All value arrays of a node must have the same length.")
+        return np.stack(rows) if rows else np.empty((0, 0))
+    return np.asarray(values, dtype=np.float64)
+
+
+def encode_values(values: Any, fmt: str = "json") -> Dict[str, Any]:
+    """Node properties storing ``values`` (a map of arrays, or a 1-/2-D array) as ``fmt``.
+
+    Layout properties are ``None`` where unused, so ``SET n += props`` clears stale ones.
+    """
+    if fmt not in VALUE_FORMATS:
+        raise ValueError(f"Unknown values format {fmt!r}; expected one of {VALUE_FORMATS}.")
+    if values is None:
+        return {"values": None, "valuesKeys": None, "valuesShape": None}
+    if fmt == "json":
+        return {"values": json.dumps(to_plain(values)), "valuesKeys": None, "valuesShape": None}
+    keys = [str(key) for key in values] if isinstance(values, dict) else None
+    array = _as_array(values)
+    flat = array.ravel()
+    return {
+        "values": flat.astype(FLOAT32_LE).tobytes() if fmt == "float32" else flat.tolist(),
+        "valuesKeys": keys,
+        "valuesShape": list(array.shape),
+    }
+
+
+def decode_values(
+    raw: Any, keys: Optional[Sequence[str]] = None, shape: Optional[Sequence[int]] = None
+) -> Any:
+    """Decode a stored ``values`` property in any format.
+
+    float32 bytes become a read-only NumPy view of the buffer (``np.frombuffer``,
+    no copy); with ``keys`` the result is a map of row views. Native lists with a
+    layout become float64 arrays. JSON strings without a layout decode to plain
+    Python as before; anything already decoded is returned unchanged.
+    """
+    if raw is None or isinstance(raw, (np.ndarray, dict)):
+        return raw
+    if isinstance(raw, (bytes, bytearray, memoryview)):
+        array = np.frombuffer(raw, dtype=FLOAT32_LE)
+    else:
+        if isinstance(raw, str):
+            try:
+                raw = json.loads(raw)
+            except json.JSONDecodeError:
+                return raw
+        if not shape and not keys:
+            return raw
+        array = np.asarray(raw, dtype=np.float64)
+    if shape:
+        array = array.reshape([int(dim) for dim in shape])
+    elif keys:
+        array = array.reshape(len(keys), -1)
+    if keys:
+        return dict(zip(keys, array))
+    return array
+
+
+def node_values(node: Dict[str, Any]) -> Any:
+    """Decoded ``values`` of a node (or projected node map), using its layout properties."""
+    return decode_values(node.get("values"), node.get("valuesKeys"), node.get("valuesShape"))
+
+
+def _plain_array(values: np.ndarray) -> Any:
+    if values.dtype != FLOAT32_LE:
+        return values.tolist()
+    # Round to float32 precision so a stored 44.08 prints as 44.08, not 44.080002:
+    # scaling by an exact power of ten, rounding and scaling back gives the nearest double.
+    array = values.astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        magnitude = np.floor(np.log10(np.abs(array)))
+    digits = FLOAT32_DIGITS - 1 - np.nan_to_num(magnitude, nan=0.0, posinf=0.0, neginf=0.0)
+    scale = 10.0 ** np.clip(digits, 0, 22)
+    return (np.round(array * scale) / scale).tolist()
+
+
+def to_plain(values: Any) -> Any:
+    """JSON-serializable copy of decoded values (arrays become lists)."""
+    if isinstance(values, np.ndarray):
+        return _plain_array(values)
+    if isinstance(values, dict):
+        return {key: to_plain(value) for key, value in values.items()}
+    if isinstance(values, (list, tuple)):
+        return [to_plain(value) for value in values]
+    return values
+
+
+def plain_node(node: Any) -> Any:
+    """``node`` with decoded array ``values`` as plain lists (other nodes unchanged).
+
+    Full relationships are ``(start, TYPE, end)`` tuples; their nodes are converted too.
+    """
+    if isinstance(node, tuple):
+        return tuple(plain_node(item) for item in node)
+    if not isinstance(node, dict) or not isinstance(node.get("values"), (np.ndarray, dict)):
+        return node
+    return dict(node, values=to_plain(node["values"]))
+
+
+def json_default(value: Any) -> Any:
+    """``json.dumps`` fallback for rows that still hold decoded value arrays."""
+    if isinstance(value, np.ndarray):
+        return to_plain(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def decode_rows(rows: List[Dict[str, Any]], aliases: Sequence[str] = ("m", "s")) -> None:
+    """Replace list/float32 ``values`` in result rows by decoded arrays, in place.
+
+    float32 values stay zero-copy views; they are only turned into lists when a
+    row is formatted (``plain_node``) or written out (``json_default``). JSON
+    strings are left as they are.
+    """
+    for row in rows:
+        for alias in aliases:
+            node = row.get(alias)
+            if not isinstance(node, dict) or node.get("valuesShape") is None:
+                continue
+            node["values"] = node_values(node)
+            for prop in LAYOUT_PROPERTIES:
+                node.pop(prop, None)
+
+
+def convert_values(node: Dict[str, Any], fmt: str) -> Dict[str, Any]:
+    """Properties re-encoding a node's ``values`` in ``fmt``."""
+    return encode_values(to_plain(node_values(node)), fmt)
+
+
+def migrate_values(
+    driver,
+    label: str,
+    fmt: str,
+    database: Optional[str] = None,
+    batch_size: int = 500,
+) -> int:
+    """Rewrite ``values`` of every ``label`` node in ``fmt`` page by page; returns nodes updated.
+
+    Ragged arrays that have no ``list``/``float32`` layout are left as they are.
+    """
+    write_query = (
+        "UNWIND $rows AS row "
+        f"MATCH (n:{label} {{recordId: row.id}}) "
+        "SET n += row.props"
+    )
+    updated = 0
+    with driver.session(database=database) as session:
+        pages = iter_record_pages(
+            session,
+            label,
+            "n.values IS NOT NULL",
+            "n.values AS values, n.valuesKeys AS valuesKeys, n.valuesShape AS valuesShape",
+            batch_size,
+        )
+        for records in pages:
+            rows = []
+            for record in records:
+                try:
+                    rows.append({"id": record["id"], "props": convert_values(record, fmt)})
+                except ValueError:
+                    continue
+            if rows:
+                session.execute_write(lambda tx: tx.run(write_query, rows=rows).consume())
+            updated += len(rows)
+    return updated
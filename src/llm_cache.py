@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+class CompletionCache:
+    """Size-bounded LRU store of chat completions in a local sqlite file.
+
+    Entries are keyed by a hash of the canonical request payload, so any
+    change to the model, messages or sampling parameters is a cache miss.
+    """
+
+    def __init__(self, path: Path, max_bytes: int = 512 * 1024 * 1024) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " response BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS completions_last_access ON completions(last_access)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS completions_model ON completions(model)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM completions"
+        ).fetchone()[0]
+
+    @staticmethod
+    def make_key(payload: Dict[str, Any]) -> str:
+        canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE completions SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key: str, model: str, response: Dict[str, Any]) -> None:
+        blob = json.dumps(response, ensure_ascii=False).encode("utf-8")
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT size FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, model, response, size, last_access)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, model, blob, len(blob), time.time()),
+            )
+            self._total_bytes += len(blob) - (old[0] if old else 0)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM completions ORDER BY last_access ASC LIMIT 64"
+            ).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                return
+            for key, size in rows:
+                self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                self._total_bytes -= size
+                if self._total_bytes <= self.max_bytes:
+                    return
+
+    def invalidate_model(self, model: str) -> int:
+        with self._lock:
+            freed, count = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0), COUNT(*) FROM completions WHERE model = ?",
+                (model,),
+            ).fetchone()
+            self._conn.execute("DELETE FROM completions WHERE model = ?", (model,))
+            self._conn.commit()
+            self._total_bytes -= freed
+        return count
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM completions")
+            self._conn.commit()
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "entries": entries,
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -1,11 +1,35 @@
 from __future__ import annotations
 
+import asyncio
+import http.client
 import json
+import threading
 import time
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
-from urllib.error import HTTPError, URLError
-from urllib.request import Request, urlopen
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+from urllib.request import getproxies, proxy_bypass
+
+from src import tracing
+from src.config import LLMConfig
+from src.llm_cache import CompletionCache
+from src.rate_limit import (
+    RETRYABLE_STATUSES,
+    THROTTLE_STATUSES,
+    RateLimiter,
+    backoff_delay,
+    parse_retry_after,
+    shared_limiter,
+)
+
+_STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.CannotSendRequest,
+    ConnectionResetError,
+    BrokenPipeError,
+)
 
 
 @dataclass
@@ -17,6 +41,131 @@ class LLMRequest:
     extra: Optional[Dict[str, Any]] = None
 
 
+class LLMHTTPError(RuntimeError):
+    def __init__(self, status: int, body: str, retry_after: Optional[float] = None) -> None:
+        super().__init__(f"HTTP {status}: {body}")
+        self.status = status
+        self.body = body
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status in RETRYABLE_STATUSES
+
+
+class ConnectionPool:
+    """Thread-safe pool of keep-alive HTTP(S) connections, keyed by origin."""
+
+    def __init__(self, timeout_s: float = 60, max_idle_per_host: int = 16) -> None:
+        self.timeout_s = timeout_s
+        self.max_idle_per_host = max_idle_per_host
+        self._idle: Dict[Tuple[str, str, int], List[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+
+    def _connect(self, scheme: str, host: str, port: int) -> http.client.HTTPConnection:
+        proxy = getproxies().get(scheme)
+        if proxy and not proxy_bypass(host):
+            proxy_parts = urlsplit(proxy)
+            proxy_port = proxy_parts.port or (443 if proxy_parts.scheme == "https" else 80)
+            conn_cls = (
+                http.client.HTTPSConnection
+                if proxy_parts.scheme == "https"
+                else http.client.HTTPConnection
+            )
+            conn = conn_cls(proxy_parts.hostname, proxy_port, timeout=self.timeout_s)
+            if scheme == "https":
+                conn.set_tunnel(host, port)
+            return conn
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, port, timeout=self.timeout_s)
+        return http.client.HTTPConnection(host, port, timeout=self.timeout_s)
+
+    def acquire(self, key: Tuple[str, str, int]) -> Tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        return self._connect(*key), False
+
+    def release(self, key: Tuple[str, str, int], conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close(self) -> None:
+        with self._lock:
+            conns = [conn for idle in self._idle.values() for conn in idle]
+            self._idle.clear()
+        for conn in conns:
+            conn.close()
+
+    def _route(self, url: str) -> Tuple[Tuple[str, str, int], str]:
+        parts = urlsplit(url)
+        scheme = parts.scheme or "http"
+        port = parts.port or (443 if scheme == "https" else 80)
+        key = (scheme, parts.hostname or "", port)
+        target = parts.path or "/"
+        if parts.query:
+            target = f"{target}?{parts.query}"
+        if scheme == "http" and getproxies().get("http") and not proxy_bypass(key[1]):
+            target = url
+        return key, target
+
+    def _open(
+        self, method: str, url: str, body: bytes, headers: Dict[str, str]
+    ) -> Tuple[Tuple[str, str, int], http.client.HTTPConnection, http.client.HTTPResponse]:
+        key, target = self._route(url)
+        while True:
+            conn, reused = self.acquire(key)
+            try:
+                conn.request(method, target, body=body, headers=headers)
+                return key, conn, conn.getresponse()
+            except _STALE_CONNECTION_ERRORS:
+                conn.close()
+                if reused:
+                    # The server dropped an idle keep-alive connection; retry on a fresh one.
+                    continue
+                raise
+            except BaseException:
+                conn.close()
+                raise
+
+    def request(
+        self, method: str, url: str, body: bytes, headers: Dict[str, str]
+    ) -> Tuple[int, bytes, http.client.HTTPMessage]:
+        key, conn, resp = self._open(method, url, body, headers)
+        try:
+            data = resp.read()
+        except BaseException:
+            conn.close()
+            raise
+        if resp.will_close:
+            conn.close()
+        else:
+            self.release(key, conn)
+        return resp.status, data, resp.headers
+
+    @contextmanager
+    def stream(
+        self, method: str, url: str, body: bytes, headers: Dict[str, str]
+    ) -> Iterator[http.client.HTTPResponse]:
+        """Open a request and yield the unread response; the connection is reused
+        only if the caller consumed the body completely."""
+        key, conn, resp = self._open(method, url, body, headers)
+        try:
+            yield resp
+        except BaseException:
+            conn.close()
+            raise
+        if resp.isclosed() and not resp.will_close:
+            self.release(key, conn)
+        else:
+            conn.close()
+
+
 class LLMClient:
     def __init__(
         self,
@@ -25,37 +174,109 @@ class LLMClient:
         max_retries: int = 3,
         retry_backoff: float = 2.0,
         timeout_s: int = 60,
+        pool: Optional[ConnectionPool] = None,
+        cache: Optional[CompletionCache] = None,
+        rpm: Optional[float] = None,
+        tpm: Optional[float] = None,
+        max_concurrency: int = 64,
+        max_backoff: float = 60.0,
     ) -> None:
         self.api_base = api_base.rstrip("/")
         self.api_key = api_key
         self.max_retries = max_retries
         self.retry_backoff = retry_backoff
         self.timeout_s = timeout_s
+        self.pool = pool or ConnectionPool(timeout_s=timeout_s)
+        self.cache = cache
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max_concurrency
+        self.max_backoff = max_backoff
 
-    def _post_json(self, url: str, payload: Dict[str, Any]) -> Dict[str, Any]:
-        data = json.dumps(payload).encode("utf-8")
-        headers = {
+    @classmethod
+    def from_config(cls, llm_config: LLMConfig, **kwargs: Any) -> "LLMClient":
+        if llm_config.cache_path and "cache" not in kwargs:
+            kwargs["cache"] = CompletionCache(
+                Path(llm_config.cache_path), max_bytes=llm_config.cache_max_mb * 1024 * 1024
+            )
+        return cls(
+            api_base=llm_config.api_base,
+            api_key=llm_config.api_key,
+            max_retries=llm_config.max_retries,
+            retry_backoff=llm_config.retry_backoff,
+            rpm=llm_config.rpm,
+            tpm=llm_config.tpm,
+            max_concurrency=llm_config.max_concurrency,
+            **kwargs,
+        )
+
+    def close(self) -> None:
+        self.pool.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    def _headers(self) -> Dict[str, str]:
+        return {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}",
         }
-        last_error: Optional[Exception] = None
-        for attempt in range(self.max_retries + 1):
-            req = Request(url, data=data, headers=headers, method="POST")
+
+    def limiter(self, model: str) -> RateLimiter:
+        return shared_limiter(self.api_base, model, self.rpm, self.tpm, self.max_concurrency)
+
+    @staticmethod
+    def estimate_tokens(payload: Dict[str, Any]) -> int:
+        """Prompt plus completion tokens to reserve against a TPM budget before sending."""
+        chars = sum(len(str(m.get("content", ""))) for m in payload.get("messages", []))
+        return chars // 4 + int(payload.get("max_tokens") or 512)
+
+    def _on_error(self, limiter: RateLimiter, estimate: int, exc: Exception, attempt: int) -> None:
+        """Re-raise ``exc`` unless it is retryable; otherwise back off before the next attempt."""
+        retry_after = None
+        if isinstance(exc, LLMHTTPError):
+            # Rejected requests do not count against the token budget.
+            limiter.settle(estimate, 0)
+            if not exc.retryable:
+                raise exc
+            retry_after = exc.retry_after if exc.status in THROTTLE_STATUSES else None
+        if attempt >= self.max_retries:
+            if isinstance(exc, LLMHTTPError):
+                raise exc
+            raise RuntimeError(f"Network error after retries: {exc}") from exc
+        tracing.add(retries=1)
+        # With Retry-After the limiter holds every request to this endpoint until it passes.
+        if retry_after is None:
+            time.sleep(backoff_delay(attempt, self.retry_backoff, self.max_backoff))
+
+    def _send_once(self, url: str, data: bytes) -> Dict[str, Any]:
+        status, body, headers = self.pool.request("POST", url, data, self._headers())
+        tracing.add(requests=1, bytes_sent=len(data), bytes_received=len(body))
+        if status >= 400:
+            raise LLMHTTPError(
+                status,
+                body.decode("utf-8", errors="replace"),
+                parse_retry_after(headers.get("Retry-After")),
+            )
+        return json.loads(body.decode("utf-8"))
+
+    def _post_json(self, url: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        data = json.dumps(payload).encode("utf-8")
+        limiter = self.limiter(str(payload.get("model", "")))
+        estimate = self.estimate_tokens(payload)
+        attempt = 0
+        while True:
             try:
-                with urlopen(req, timeout=self.timeout_s) as resp:
-                    return json.loads(resp.read().decode("utf-8"))
-            except HTTPError as exc:
-                body = exc.read().decode("utf-8") if exc.fp else ""
-                raise RuntimeError(f"HTTP {exc.code}: {body}") from exc
-            except (URLError, ConnectionError) as exc:
-                last_error = exc
+                with limiter.slot(estimate):
+                    response = self._send_once(url, data)
             except Exception as exc:
-                last_error = exc
-            if attempt < self.max_retries:
-                time.sleep(self.retry_backoff * (attempt + 1))
-        raise RuntimeError(f"Network error after retries: {last_error}") from last_error
+                self._on_error(limiter, estimate, exc, attempt)
+                attempt += 1
+                continue
+            limiter.settle(estimate, sum(self.extract_usage(response).values()) or None)
+            return response
 
-    def chat(self, request: LLMRequest) -> Dict[str, Any]:
+    @staticmethod
+    def build_payload(request: LLMRequest) -> Dict[str, Any]:
         payload: Dict[str, Any] = {
             "model": request.model,
             "messages": request.messages,
@@ -65,9 +286,112 @@ class LLMClient:
             payload["max_tokens"] = int(request.max_tokens)
         if request.extra:
             payload.update(request.extra)
+        return payload
+
+    def _cache_key(self, payload: Dict[str, Any]) -> Optional[str]:
+        if self.cache is None:
+            return None
+        return self.cache.make_key({"api_base": self.api_base, **payload})
+
+    def _cache_put(self, key: Optional[str], model: str, response: Dict[str, Any]) -> None:
+        if self.cache is not None and key is not None and response.get("choices"):
+            self.cache.put(key, model, response)
+
+    def chat(self, request: LLMRequest) -> Dict[str, Any]:
         url = f"{self.api_base}/chat/completions"
-        return self._post_json(url, payload)
+        payload = self.build_payload(request)
+        key = self._cache_key(payload)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                tracing.add(cache_hits=1)
+                return cached
+        response = self._post_json(url, payload)
+        tracing.add(**self.extract_usage(response))
+        self._cache_put(key, request.model, response)
+        return response
+
+    async def achat(self, request: LLMRequest) -> Dict[str, Any]:
+        """``chat`` on a worker thread; each in-flight call holds one executor thread."""
+        return await asyncio.to_thread(self.chat, request)
+
+    def chat_stream(self, request: LLMRequest) -> Iterator[str]:
+        """Yield content deltas of a streamed (SSE) completion.
+
+        Cache hits are yielded as a single delta; completed streams are cached
+        under the same key as ``chat``.
+        """
+        url = f"{self.api_base}/chat/completions"
+        payload = self.build_payload(request)
+        key = self._cache_key(payload)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                tracing.add(cache_hits=1)
+                yield self.extract_text(cached)
+                return
+        payload.update(stream=True, stream_options={"include_usage": True})
+        data = json.dumps(payload).encode("utf-8")
+        parts: List[str] = []
+        usage: Dict[str, Any] = {}
+        limiter = self.limiter(request.model)
+        estimate = self.estimate_tokens(payload)
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            received = 0
+            try:
+                with limiter.slot(estimate), self.pool.stream(
+                    "POST", url, data, self._headers()
+                ) as resp:
+                    if resp.status >= 400:
+                        body = resp.read().decode("utf-8", errors="replace")
+                        retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+                        raise LLMHTTPError(resp.status, body, retry_after)
+                    for line in iter(resp.readline, b""):
+                        received += len(line)
+                        if not line.startswith(b"data:"):
+                            continue
+                        chunk = line[5:].strip()
+                        if chunk == b"[DONE]":
+                            resp.read()
+                            break
+                        event = json.loads(chunk.decode("utf-8"))
+                        usage = event.get("usage") or usage
+                        for choice in event.get("choices") or []:
+                            delta = (choice.get("delta") or {}).get("content")
+                            if delta:
+                                if not parts:
+                                    elapsed = time.perf_counter() - start
+                                    tracing.annotate(first_token_s=round(elapsed, 6))
+                                parts.append(delta)
+                                yield delta
+                break
+            except Exception as exc:
+                if parts:
+                    # Content was already handed to the caller; a retry would duplicate it.
+                    raise
+                self._on_error(limiter, estimate, exc, attempt)
+                attempt += 1
+        tracing.add(requests=1, bytes_sent=len(data), bytes_received=received)
+        response = {
+            "choices": [{"message": {"role": "assistant", "content": "".join(parts)}}],
+            "usage": usage,
+        }
+        tracing.add(**self.extract_usage(response))
+        limiter.settle(estimate, sum(self.extract_usage(response).values()) or None)
+        self._cache_put(key, request.model, response)
 
     @staticmethod
     def extract_text(response: Dict[str, Any]) -> str:
         return response.get("choices", [{}])[0].get("message", {}).get("content", "")
+
+    @staticmethod
+    def extract_usage(response: Dict[str, Any]) -> Dict[str, int]:
+        """Prompt/completion token counts from the response ``usage`` block, if present."""
+        usage = response.get("usage") or {}
+        return {
+            key: int(usage[key])
+            for key in ("prompt_tokens", "completion_tokens")
+            if isinstance(usage.get(key), (int, float))
+        }
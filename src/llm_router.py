@@ -0,0 +1,318 @@
+"""
+Route chat completions across several OpenAI-compatible providers: rank them by
+observed latency and error rate, fail over on errors and hedge slow requests.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Union
+
+from src import tracing
+from src.config import LLMConfig
+from src.llm_cache import CompletionCache
+from src.llm_client import LLMClient, LLMRequest
+
+
+class ProviderStats:
+    """EWMA latency and error rate of one provider, plus a window for percentiles."""
+
+    def __init__(self, alpha: float = 0.2, window: int = 200) -> None:
+        self.alpha = alpha
+        self.latency_s: Optional[float] = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.wins = 0
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+        self._recent: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, elapsed_s: float, ok: bool, failure_threshold: int, cooldown_s: float) -> None:
+        with self._lock:
+            self.requests += 1
+            self.error_rate += self.alpha * ((0.0 if ok else 1.0) - self.error_rate)
+            if ok:
+                self.consecutive_failures = 0
+                self._recent.append(elapsed_s)
+                if self.latency_s is None:
+                    self.latency_s = elapsed_s
+                else:
+                    self.latency_s += self.alpha * (elapsed_s - self.latency_s)
+                return
+            self.errors += 1
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= failure_threshold:
+                self.down_until = time.monotonic() + cooldown_s
+
+    def win(self) -> None:
+        with self._lock:
+            self.wins += 1
+
+    def expected_cost(self) -> float:
+        """Expected seconds to a good answer; untried providers sort first, failing ones last."""
+        if self.latency_s is None:
+            return float("inf") if self.errors else 0.0
+        return self.latency_s / max(1.0 - self.error_rate, 0.05)
+
+    def is_down(self) -> bool:
+        return time.monotonic() < self.down_until
+
+    def percentile(self, q: float, min_samples: int = 20) -> Optional[float]:
+        with self._lock:
+            if len(self._recent) < min_samples:
+                return None
+            ordered = sorted(self._recent)
+        return ordered[max(1, math.ceil(q / 100.0 * len(ordered))) - 1]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "wins": self.wins,
+            "ewma_latency_ms": round(1000 * self.latency_s, 3) if self.latency_s else None,
+            "ewma_error_rate": round(self.error_rate, 4),
+            "down": self.is_down(),
+        }
+
+
+@dataclass
+class Provider:
+    name: str
+    client: LLMClient
+    model: str
+    temperature: Optional[float] = None
+    max_tokens: Optional[int] = None
+    stats: ProviderStats = field(default_factory=ProviderStats)
+
+
+class LLMRouter:
+    """Drop-in replacement for ``LLMClient`` over several providers.
+
+    Each request goes to the provider with the lowest expected latency (EWMA
+    latency inflated by EWMA error rate). On an error the next provider is
+    tried. With ``hedge_after_s`` set, a request still running after that
+    delay (or the provider's ``hedge_quantile`` latency, if higher) is also
+    sent to the next provider and the first valid answer wins; the slower
+    request finishes in the background and only updates the stats.
+
+    Streams fail over before their first delta but are not hedged. The hedge
+    timer runs from submission, so ``max_workers`` should cover every request
+    the providers can have in flight (``from_config`` sizes it from
+    ``max_concurrency``); a request queued for a worker would be hedged early.
+    """
+
+    def __init__(
+        self,
+        providers: List[Provider],
+        hedge_after_s: Optional[float] = None,
+        hedge_quantile: Optional[float] = None,
+        max_retries: int = 1,
+        failure_threshold: int = 3,
+        cooldown_s: float = 30.0,
+        max_workers: int = 32,
+        cache: Optional[CompletionCache] = None,
+    ) -> None:
+        if not providers:
+            raise ValueError("LLMRouter needs at least one provider.")
+        self.providers = providers
+        self.hedge_after_s = hedge_after_s
+        self.hedge_quantile = hedge_quantile
+        self.max_retries = max_retries
+        self.failure_threshold = failure_threshold
+        self.cooldown_s = cooldown_s
+        self.max_workers = max_workers
+        self.cache = cache
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, llm_config: LLMConfig, **kwargs: Any) -> "LLMRouter":
+        cache = kwargs.pop("cache", None)
+        if cache is None and llm_config.cache_path:
+            cache = CompletionCache(
+                Path(llm_config.cache_path), max_bytes=llm_config.cache_max_mb * 1024 * 1024
+            )
+        providers = [
+            Provider(
+                name=entry.name,
+                # The router fails over instead of retrying the same endpoint.
+                client=LLMClient(
+                    entry.api_base,
+                    entry.resolve_api_key(),
+                    max_retries=0,
+                    cache=cache,
+                    rpm=entry.rpm or llm_config.rpm,
+                    tpm=entry.tpm or llm_config.tpm,
+                    max_concurrency=llm_config.max_concurrency,
+                ),
+                model=entry.model,
+                temperature=entry.temperature,
+                max_tokens=entry.max_tokens,
+            )
+            for entry in llm_config.providers
+        ]
+        # One worker per request the providers' limiters can admit at once.
+        kwargs.setdefault("max_workers", llm_config.max_concurrency * len(providers))
+        return cls(
+            providers,
+            hedge_after_s=llm_config.hedge_after_s,
+            hedge_quantile=llm_config.hedge_quantile,
+            max_retries=llm_config.max_retries,
+            cache=cache,
+            **kwargs,
+        )
+
+    def close(self) -> None:
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+        for provider in self.providers:
+            provider.client.pool.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {provider.name: provider.stats.as_dict() for provider in self.providers}
+
+    def ranked(self) -> List[Provider]:
+        """Healthy providers by expected cost, then those cooling down after failures."""
+        return sorted(
+            self.providers, key=lambda p: (p.stats.is_down(), p.stats.expected_cost())
+        )
+
+    def _attempts(self) -> List[Provider]:
+        order = self.ranked()
+        return [order[i % len(order)] for i in range(len(order) + self.max_retries)]
+
+    def hedge_delay(self, provider: Provider) -> Optional[float]:
+        if self.hedge_after_s is None:
+            return None
+        delay = self.hedge_after_s
+        if self.hedge_quantile is not None:
+            observed = provider.stats.percentile(self.hedge_quantile)
+            if observed is not None:
+                delay = max(delay, observed)
+        return delay
+
+    def _request_for(self, provider: Provider, request: LLMRequest) -> LLMRequest:
+        return replace(
+            request,
+            model=provider.model,
+            temperature=(
+                provider.temperature if provider.temperature is not None else request.temperature
+            ),
+            max_tokens=(
+                request.max_tokens if request.max_tokens is not None else provider.max_tokens
+            ),
+        )
+
+    def _record(self, provider: Provider, start: float, ok: bool) -> None:
+        provider.stats.record(
+            time.perf_counter() - start, ok, self.failure_threshold, self.cooldown_s
+        )
+
+    def _call(self, provider: Provider, request: LLMRequest) -> Dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            response = provider.client.chat(self._request_for(provider, request))
+            if not LLMClient.extract_text(response).strip():
+                raise ValueError(f"Empty completion from provider {provider.name!r}")
+        except Exception:
+            self._record(provider, start, ok=False)
+            raise
+        self._record(provider, start, ok=True)
+        return response
+
+    def _submit(self, provider: Provider, request: LLMRequest) -> Future:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="llm-router"
+                )
+            pool = self._pool
+        return pool.submit(contextvars.copy_context().run, self._call, provider, request)
+
+    def chat(self, request: LLMRequest) -> Dict[str, Any]:
+        attempts = self._attempts()
+        pending: Dict[Future, Provider] = {}
+        last_error: Optional[Exception] = None
+
+        def launch() -> Provider:
+            provider = attempts.pop(0)
+            pending[self._submit(provider, request)] = provider
+            return provider
+
+        delay = self.hedge_delay(launch())
+        while pending:
+            hedge = delay if attempts and len(pending) == 1 else None
+            done, _ = wait(list(pending), timeout=hedge, return_when=FIRST_COMPLETED)
+            if not done:
+                tracing.add(hedges=1)
+                launch()
+                continue
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    response = future.result()
+                except Exception as exc:
+                    last_error = exc
+                    continue
+                provider.stats.win()
+                tracing.annotate(provider=provider.name)
+                for loser in pending:
+                    loser.cancel()
+                return response
+            if not pending and attempts:
+                tracing.add(failovers=1)
+                delay = self.hedge_delay(launch())
+        raise RuntimeError(f"All LLM providers failed: {last_error}") from last_error
+
+    async def achat(self, request: LLMRequest) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.chat, request)
+
+    def chat_stream(self, request: LLMRequest) -> Iterator[str]:
+        last_error: Optional[Exception] = None
+        for attempt, provider in enumerate(self._attempts()):
+            if attempt:
+                tracing.add(failovers=1)
+            start = time.perf_counter()
+            yielded = False
+            try:
+                for delta in provider.client.chat_stream(self._request_for(provider, request)):
+                    yielded = True
+                    yield delta
+            except Exception as exc:
+                self._record(provider, start, ok=False)
+                if yielded:
+                    raise
+                last_error = exc
+                continue
+            self._record(provider, start, ok=True)
+            provider.stats.win()
+            tracing.annotate(provider=provider.name)
+            return
+        raise RuntimeError(f"All LLM providers failed: {last_error}") from last_error
+
+    extract_text = staticmethod(LLMClient.extract_text)
+    extract_usage = staticmethod(LLMClient.extract_usage)
+
+
+ChatClient = Union[LLMClient, LLMRouter]
+
+
+def build_llm_client(llm_config: LLMConfig, **kwargs: Any) -> ChatClient:
+    """A router when the config lists several providers, else a plain client."""
+    if len(llm_config.providers) > 1:
+        return LLMRouter.from_config(llm_config, **kwargs)
+    return LLMClient.from_config(llm_config, **kwargs)
@@ -0,0 +1,386 @@
+"""
+Shared KG prompting pipeline: user_query -> Cypher -> Neo4j -> enhanced prompt.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import json
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src import tracing
+from src.generation import GenerationModule
+from src.generation.context_packer import ContextPacker, pack_value_dict
+from src.kg.features import query_hints, query_summary
+from src.kg.knn_index import MeasurementIndex
+from src.kg.store import ROWS_BY_IDS_QUERY, GraphStore
+from src.kg.values import decode_rows, plain_node
+from src.retrieval import RetrievalModule, RetrievalResult
+from src.retrieval.preflight import CypherPreflight, PreflightError
+from src.retrieval.rule_based import RuleBasedQueryBuilder
+from src.retrieval.semantic_cache import CachedRetrieval, SemanticCache
+from src.retrieval.two_phase import retrieve_two_phase
+
+
+def format_value_dict(
+    value_dict: Dict[str, Any], max_keys: int, token_budget: Optional[int] = None
+) -> str:
+    return pack_value_dict(value_dict, max_keys, token_budget)
+
+
+def _discard_result(future: Future) -> None:
+    future.exception()
+
+
+def execute_cypher_neo4j(
+    store: GraphStore, cypher: str, parameters: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, Any]]:
+    with tracing.span("graph.execute_cypher") as span:
+        rows = store.run_read(cypher, parameters)
+        span.set(rows=len(rows), bytes_received=tracing.json_size(rows))
+    return rows
+
+
+def format_triplets(rows: List[Dict[str, Any]], max_rows: int) -> str:
+    with tracing.span("format_triplets") as span:
+        lines = []
+        for row in rows[:max_rows]:
+            parts = [f"{key}={plain_node(value)}" for key, value in row.items()]
+            lines.append("; ".join(parts))
+        text = "\n".join(lines)
+        span.set(rows=min(len(rows), max_rows), chars=len(text))
+    return text
+
+
+@dataclass
+class PipelineAssets:
+    schema_text: str
+    cypher_example: str
+    value_dict_text: str
+    value_dict: Dict[str, Any] = field(default_factory=dict)
+
+
+def load_pipeline_assets(
+    schema_file: Path = Path("configs/prompts/kg_schema.txt"),
+    cypher_example_file: Path = Path("configs/prompts/cypher_example.cypher"),
+    value_dict_file: Path = Path("configs/kg_value_dict_min.json"),
+    value_dict_max_keys: int = 80,
+    value_dict_token_budget: Optional[int] = None,
+) -> PipelineAssets:
+    schema_text = schema_file.read_text(encoding="utf-8").strip()
+    cypher_example = cypher_example_file.read_text(encoding="utf-8").strip()
+    value_dict_raw = json.loads(value_dict_file.read_text(encoding="utf-8"))
+    return PipelineAssets(
+        schema_text=schema_text,
+        cypher_example=cypher_example,
+        value_dict_text=format_value_dict(
+            value_dict_raw, value_dict_max_keys, value_dict_token_budget
+        ),
+        value_dict=value_dict_raw,
+    )
+
+
+@dataclass
+class GraphResult:
+    rows: List[Dict[str, Any]]
+    cypher: str
+    parameters: Dict[str, Any]
+    # Relaxation step that produced the rows ("" when the original query matched).
+    relaxation: str = ""
+
+
+@dataclass
+class PipelineOutput:
+    user_query: str
+    retrieval_prompt: str
+    retrieval_raw: str
+    cypher: str
+    cypher_parameters: Dict[str, Any]
+    retrieval_source: str
+    rows: List[Dict[str, Any]]
+    triplets: str
+    enhanced_prompt: str
+    # Wall-clock seconds per stage: retrieval, graph, format, generation.
+    timings: Dict[str, float] = field(default_factory=dict)
+    # ContextPacker report (token budget, tokens before/after, rows kept) when packing is on.
+    context_report: Dict[str, Any] = field(default_factory=dict)
+    # Relaxation step applied when the generated Cypher matched nothing ("" otherwise);
+    # ``cypher``/``cypher_parameters`` are then the relaxed query.
+    relaxation: str = ""
+
+
+class KGPromptingPipeline:
+    """Shared modules, graph store and assets; safe to call from many threads."""
+
+    def __init__(
+        self,
+        retrieval: RetrievalModule,
+        generation: GenerationModule,
+        store: GraphStore,
+        assets: PipelineAssets,
+        triplets_max_rows: int = 50,
+        lean_retrieval: bool = False,
+        example_rows: int = 3,
+        knn_index: Optional[MeasurementIndex] = None,
+        rule_based: Optional[RuleBasedQueryBuilder] = None,
+        context_packer: Optional[ContextPacker] = None,
+        dispatch_workers: int = 8,
+        preflight: Optional[CypherPreflight] = None,
+        semantic_cache: Optional[SemanticCache] = None,
+    ) -> None:
+        self.retrieval = retrieval
+        self.generation = generation
+        self.store = store
+        self.assets = assets
+        self.triplets_max_rows = triplets_max_rows
+        self.lean_retrieval = lean_retrieval
+        self.example_rows = example_rows
+        self.knn_index = knn_index
+        self.rule_based = rule_based
+        self.context_packer = context_packer
+        self.dispatch_workers = dispatch_workers
+        self.preflight = preflight
+        self.semantic_cache = semantic_cache
+        self._dispatch_pool: Optional[ThreadPoolExecutor] = None
+        self._dispatch_lock = threading.Lock()
+
+    def _dispatch(self, fn: Callable[..., Any], *args: Any) -> Future:
+        """Run ``fn`` in the background, keeping the caller's trace context."""
+        with self._dispatch_lock:
+            if self._dispatch_pool is None:
+                self._dispatch_pool = ThreadPoolExecutor(
+                    max_workers=self.dispatch_workers, thread_name_prefix="kg-dispatch"
+                )
+        return self._dispatch_pool.submit(contextvars.copy_context().run, fn, *args)
+
+    def close(self) -> None:
+        with self._dispatch_lock:
+            if self._dispatch_pool is not None:
+                self._dispatch_pool.shutdown(wait=True)
+                self._dispatch_pool = None
+
+    def select_examples(self, user_query: str) -> Optional[RetrievalResult]:
+        """Pick example measurements from the k-NN index, skipping the retrieval LLM."""
+        if self.knn_index is None:
+            return None
+        summary = query_summary(user_query)
+        if summary is None:
+            return None
+        hints = query_hints(user_query, self.assets.value_dict)
+        with tracing.span("retrieval.knn") as span:
+            matches, filters = self.knn_index.query_relaxed(summary, self.example_rows, hints)
+            span.set(matches=len(matches))
+        if not matches:
+            return None
+        pairs = [{"m": match.record_id, "s": match.state_record_id} for match in matches]
+        rationale = f"k-NN over Measurement summaries with filters {filters}: " + ", ".join(
+            f"{match.record_id} (distance {match.distance:.3f})" for match in matches
+        )
+        return RetrievalResult(
+            sparql=ROWS_BY_IDS_QUERY,
+            rationale=rationale,
+            raw="",
+            parameters={"pairs": pairs},
+            source="knn",
+        )
+
+    def fetch_rows(
+        self, user_query: str, cypher: str, parameters: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        if self.lean_retrieval:
+            with tracing.span("graph.two_phase") as span:
+                rows = retrieve_two_phase(
+                    self.store, cypher, user_query, top_k=self.example_rows, parameters=parameters
+                )
+                span.set(rows=len(rows))
+        else:
+            rows = execute_cypher_neo4j(self.store, cypher, parameters)
+        decode_rows(rows)
+        return rows
+
+    def query_rows(
+        self, user_query: str, cypher: str, parameters: Optional[Dict[str, Any]] = None
+    ) -> GraphResult:
+        """``fetch_rows`` behind the pre-flight check, relaxing the query while it matches nothing.
+
+        Raises ``PreflightError`` when the query is rejected.
+        """
+        parameters = parameters or {}
+        if self.preflight is None:
+            return GraphResult(self.fetch_rows(user_query, cypher, parameters), cypher, parameters)
+        with tracing.span("graph.preflight") as span:
+            report = self.preflight.check(cypher, parameters)
+            if report.plan is not None:
+                span.set(estimated_rows=report.plan.estimated_rows)
+        result = GraphResult(self.fetch_rows(user_query, cypher, parameters), cypher, parameters)
+        if result.rows:
+            return result
+        for relaxed in self.preflight.relaxations(cypher, parameters):
+            with tracing.span("graph.relax") as span:
+                span.set(step=relaxed.step)
+                try:
+                    self.preflight.check(relaxed.cypher, relaxed.parameters)
+                except PreflightError as exc:
+                    # A looser query can exceed the plan limits; try the next step.
+                    span.set(rejected=str(exc))
+                    continue
+                rows = self.fetch_rows(user_query, relaxed.cypher, relaxed.parameters)
+                span.set(rows=len(rows))
+            if rows:
+                return GraphResult(rows, relaxed.cypher, relaxed.parameters, relaxed.step)
+        return result
+
+    def cached_retrieval(self, user_query: str) -> Tuple[Optional[str], Optional[CachedRetrieval]]:
+        """Semantic cache key of the query and the cached retrieval for it, if any."""
+        if self.semantic_cache is None:
+            return None, None
+        with tracing.span("retrieval.semantic_cache") as span:
+            key = self.semantic_cache.key(user_query, self.assets.value_dict)
+            cached = self.semantic_cache.get(key)
+            span.set(keyed=key is not None, hit=cached is not None)
+        return key, cached
+
+    def _rule_based_cypher(self, user_query: str) -> Optional[RetrievalResult]:
+        with tracing.span("retrieval.rules") as span:
+            result = self.rule_based.generate_cypher(user_query)
+            span.set(matched=result is not None)
+        return result
+
+    def run(
+        self, user_query: str, on_delta: Optional[Callable[[str], Any]] = None
+    ) -> PipelineOutput:
+        """Run one query; ``on_delta`` receives enhanced-prompt chunks when generation streams."""
+        with tracing.span("pipeline.run") as span:
+            output = self._run(user_query, on_delta)
+            span.set(retrieval_source=output.retrieval_source, rows=len(output.rows))
+        return output
+
+    def _run(
+        self, user_query: str, on_delta: Optional[Callable[[str], Any]] = None
+    ) -> PipelineOutput:
+        timings: Dict[str, float] = {}
+        start = time.perf_counter()
+
+        def lap(stage: str) -> None:
+            nonlocal start
+            now = time.perf_counter()
+            timings[stage] = timings.get(stage, 0.0) + now - start
+            start = now
+
+        retrieval_prompt = ""
+        graph: Optional[GraphResult] = None
+        cache_key, cached = self.cached_retrieval(user_query)
+        if cached is not None:
+            # A near-duplicate query already ran: reuse its final Cypher and rows.
+            retrieval_result = RetrievalResult(
+                sparql=cached.cypher,
+                rationale=None,
+                raw=cached.raw,
+                parameters=cached.parameters,
+                source="cache",
+            )
+            graph = GraphResult(cached.rows, cached.cypher, cached.parameters, cached.relaxation)
+            lap("retrieval")
+        elif (retrieval_result := self.select_examples(user_query)) is not None:
+            lap("retrieval")
+            with tracing.span("graph.fetch_rows_by_ids") as span:
+                rows = self.store.fetch_rows_by_ids(retrieval_result.parameters["pairs"])
+                span.set(rows=len(rows))
+            decode_rows(rows)
+        elif self.rule_based is not None and (
+            retrieval_result := self._rule_based_cypher(user_query)
+        ):
+            lap("retrieval")
+            graph = self.query_rows(
+                user_query, retrieval_result.sparql, retrieval_result.parameters
+            )
+        else:
+            # One snapshot per query: the service may swap ``self.assets`` on reload.
+            assets = self.assets
+            retrieval_prompt = self.retrieval.build_prompt(
+                user_query=user_query,
+                kg_schema=assets.schema_text,
+                value_dict=assets.value_dict_text,
+                cypher_example=assets.cypher_example,
+            )
+            # With a streaming retrieval module the graph query starts as soon as the
+            # Cypher field is complete, overlapping with the rationale.
+            dispatched: Dict[str, Future] = {}
+
+            def dispatch(cypher: str) -> None:
+                if cypher not in dispatched:
+                    dispatched[cypher] = self._dispatch(self.query_rows, user_query, cypher)
+
+            try:
+                retrieval_result = self.retrieval.generate_cypher(
+                    user_query=user_query,
+                    kg_schema=assets.schema_text,
+                    value_dict=assets.value_dict_text,
+                    cypher_example=assets.cypher_example,
+                    on_cypher=dispatch,
+                )
+                lap("retrieval")
+                early = dispatched.pop(retrieval_result.sparql, None)
+            finally:
+                # Reads for a superseded Cypher (or of a failed retrieval) are not used.
+                # Queued ones are cancelled; a running read cannot be stopped, so it
+                # finishes in the background and its error, if any, is discarded.
+                for stale in dispatched.values():
+                    if not stale.cancel():
+                        stale.add_done_callback(_discard_result)
+            if early is not None:
+                graph = early.result()
+            else:
+                graph = self.query_rows(user_query, retrieval_result.sparql)
+        if graph is not None:
+            rows = graph.rows
+        lap("graph")
+        if cache_key is not None and cached is None and rows:
+            self.semantic_cache.put(
+                cache_key,
+                CachedRetrieval(
+                    cypher=graph.cypher if graph is not None else retrieval_result.sparql,
+                    parameters=(
+                        graph.parameters if graph is not None else retrieval_result.parameters
+                    ),
+                    rows=rows,
+                    source=retrieval_result.source,
+                    raw=retrieval_result.raw,
+                    relaxation=graph.relaxation if graph is not None else "",
+                ),
+            )
+        context_report: Dict[str, Any] = {}
+        if self.context_packer is not None:
+            with tracing.span("pack_context") as span:
+                packed = self.context_packer.pack_rows(rows, user_query)
+                context_report = packed.report.as_dict()
+                span.set(**context_report)
+            triplets_text = packed.text
+        else:
+            triplets_text = format_triplets(rows, self.triplets_max_rows)
+        lap("format")
+        enhanced = self.generation.build_enhanced_prompt(
+            user_query=user_query, kg_triplets=triplets_text, on_delta=on_delta
+        )
+        lap("generation")
+        return PipelineOutput(
+            user_query=user_query,
+            retrieval_prompt=retrieval_prompt,
+            retrieval_raw=retrieval_result.raw,
+            cypher=graph.cypher if graph is not None else retrieval_result.sparql,
+            cypher_parameters=(
+                graph.parameters if graph is not None else retrieval_result.parameters
+            ),
+            retrieval_source=retrieval_result.source,
+            rows=rows,
+            triplets=triplets_text,
+            enhanced_prompt=enhanced.enhanced_prompt,
+            timings=timings,
+            context_report=context_report,
+            relaxation=graph.relaxation if graph is not None else "",
+        )
@@ -0,0 +1,242 @@
+"""
+Command-line options shared by the pipeline scripts, and the pipeline they describe.
+
+``add_pipeline_arguments`` registers the graph/LLM backends, prompt assets and
+retrieval options; ``build_pipeline`` turns the parsed arguments into a
+``KGPromptingPipeline`` so every script wires the same features the same way.
+"""
+
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from src.config import LLMConfig, load_llm_config
+from src.generation import GenerationModule
+from src.generation.context_packer import ContextPacker
+from src.kg.batching import BatchingGraphStore
+from src.kg.knn_index import MeasurementIndex
+from src.kg.store import GraphStore, Neo4jStore, load_graph_store
+from src.llm_router import ChatClient, LLMRouter, build_llm_client
+from src.pipeline import KGPromptingPipeline, PipelineAssets, load_pipeline_assets
+from src.retrieval import RetrievalModule
+from src.retrieval.preflight import CypherPreflight, load_vocabulary
+from src.retrieval.rule_based import RuleBasedQueryBuilder
+from src.retrieval.semantic_cache import SemanticCache
+
+DEFAULT_STREAM_HELP = (
+    "Stream completions: the graph query starts as soon as the Cypher field arrives."
+)
+
+
+def add_pipeline_arguments(
+    parser: argparse.ArgumentParser, backends: bool = True, stream_help: str = DEFAULT_STREAM_HELP
+) -> None:
+    """Add the pipeline options; ``backends=False`` leaves out the Neo4j/snapshot/LLM configs."""
+    if backends:
+        parser.add_argument("--neo4j-config", default="configs/neo4j.yaml")
+        parser.add_argument(
+            "--graph-snapshot",
+            default=None,
+            help="Local KG snapshot (scripts/export_kg_snapshot.py) used instead of Neo4j.",
+        )
+        parser.add_argument("--llm-config", default="configs/llm_baseline.yaml")
+        parser.add_argument(
+            "--llm-cache", default=None, help="sqlite file for cached LLM completions."
+        )
+    parser.add_argument("--value-dict", default="configs/kg_value_dict_min.json")
+    parser.add_argument("--schema-file", default="configs/prompts/kg_schema.txt")
+    parser.add_argument("--cypher-example-file", default="configs/prompts/cypher_example.cypher")
+    parser.add_argument("--retrieval-prompt", default="configs/prompts/retrieval_system_prompt.txt")
+    parser.add_argument(
+        "--generation-prompt", default="configs/prompts/generation_system_prompt.txt"
+    )
+    parser.add_argument("--value-dict-max-keys", type=int, default=80)
+    parser.add_argument("--triplets-max-rows", type=int, default=50)
+    parser.add_argument(
+        "--context-token-budget",
+        type=int,
+        default=None,
+        help="Pack KG rows into at most this many (estimated) tokens instead of dumping "
+        "--triplets-max-rows raw rows.",
+    )
+    parser.add_argument(
+        "--value-dict-token-budget",
+        type=int,
+        default=None,
+        help="Let value dictionary keys beyond the filter fields fill this many tokens "
+        "of the retrieval prompt.",
+    )
+    parser.add_argument(
+        "--lean-retrieval",
+        action="store_true",
+        help="Fetch ids/summaries first and value arrays only for the top --example-rows rows.",
+    )
+    parser.add_argument("--example-rows", type=int, default=3)
+    parser.add_argument(
+        "--rule-based-retrieval",
+        action="store_true",
+        help="Build Cypher deterministically from the (V, I, T) sequence and query hints; "
+        "the retrieval LLM is only used when the sequence cannot be parsed.",
+    )
+    parser.add_argument(
+        "--knn-index",
+        default=None,
+        help="Measurement index directory (scripts/build_measurement_index.py); "
+        "selects examples without the retrieval LLM when the query has a (V, I, T) sequence.",
+    )
+    parser.add_argument("--stream", action="store_true", help=stream_help)
+    parser.add_argument(
+        "--preflight",
+        action="store_true",
+        help="Check generated Cypher against the KG schema (read-only, known labels and "
+        "properties) before it runs, and relax queries that match nothing.",
+    )
+    parser.add_argument(
+        "--max-plan-rows",
+        type=float,
+        default=None,
+        help="With --preflight, reject queries whose EXPLAIN plan estimates more rows.",
+    )
+    parser.add_argument(
+        "--semantic-cache",
+        action="store_true",
+        help="Reuse the Cypher and KG rows of an earlier query with the same hints and "
+        "similar (V, I, T) summary, skipping the retrieval LLM and the graph query.",
+    )
+    parser.add_argument("--semantic-cache-size", type=int, default=1024)
+    parser.add_argument("--semantic-cache-ttl", type=float, default=3600.0, help="Seconds.")
+    parser.add_argument(
+        "--batch-graph-reads",
+        action="store_true",
+        help="Merge Neo4j retrieval queries that run at the same time into one "
+        "parameterized UNWIND read (one plan and one round trip per batch).",
+    )
+    parser.add_argument("--graph-batch-size", type=int, default=64)
+    parser.add_argument(
+        "--graph-batch-wait-ms",
+        type=float,
+        default=5.0,
+        help="How long the first query of a batch waits for others to join it.",
+    )
+
+
+def asset_files(args: argparse.Namespace) -> Dict[str, Path]:
+    """``load_pipeline_assets`` file arguments, e.g. for watching them for changes."""
+    return {
+        "schema_file": Path(args.schema_file),
+        "cypher_example_file": Path(args.cypher_example_file),
+        "value_dict_file": Path(args.value_dict),
+    }
+
+
+def load_assets(args: argparse.Namespace) -> PipelineAssets:
+    return load_pipeline_assets(
+        **asset_files(args),
+        value_dict_max_keys=args.value_dict_max_keys,
+        value_dict_token_budget=args.value_dict_token_budget,
+    )
+
+
+def load_llm(args: argparse.Namespace) -> LLMConfig:
+    llm_cfg = load_llm_config(Path(args.llm_config))
+    if args.llm_cache:
+        llm_cfg.cache_path = args.llm_cache
+    return llm_cfg
+
+
+def build_pipeline(
+    args: argparse.Namespace,
+    assets: Optional[PipelineAssets] = None,
+    llm_config: Optional[LLMConfig] = None,
+    llm_client: Optional[ChatClient] = None,
+    store: Optional[GraphStore] = None,
+) -> KGPromptingPipeline:
+    """Pipeline described by ``add_pipeline_arguments`` options.
+
+    Assets, the LLM config/client and the graph store are loaded from ``args``
+    unless given; ``close_pipeline`` closes the store and client it opened.
+    """
+    assets = assets or load_assets(args)
+    llm_config = llm_config or load_llm(args)
+    llm_client = llm_client or build_llm_client(llm_config)
+    retrieval = RetrievalModule(
+        llm_config, Path(args.retrieval_prompt), client=llm_client, stream=args.stream
+    )
+    generation = GenerationModule(
+        llm_config, Path(args.generation_prompt), client=llm_client, stream=args.stream
+    )
+    if store is None:
+        snapshot = Path(args.graph_snapshot) if args.graph_snapshot else None
+        store = load_graph_store(Path(args.neo4j_config), snapshot)
+    if args.batch_graph_reads and isinstance(store, Neo4jStore):
+        # A local snapshot has no round trip to save.
+        store = BatchingGraphStore(
+            store, max_batch=args.graph_batch_size, max_wait_s=args.graph_batch_wait_ms / 1000
+        )
+    knn_index = MeasurementIndex.load(Path(args.knn_index)) if args.knn_index else None
+    return KGPromptingPipeline(
+        retrieval,
+        generation,
+        store,
+        assets,
+        triplets_max_rows=args.triplets_max_rows,
+        lean_retrieval=args.lean_retrieval,
+        example_rows=args.example_rows,
+        knn_index=knn_index,
+        rule_based=(
+            RuleBasedQueryBuilder(assets.value_dict, limit=args.example_rows)
+            if args.rule_based_retrieval
+            else None
+        ),
+        context_packer=(
+            ContextPacker(
+                args.context_token_budget,
+                max_rows=args.triplets_max_rows,
+                min_rows=args.example_rows,
+            )
+            if args.context_token_budget
+            else None
+        ),
+        preflight=(
+            CypherPreflight(
+                load_vocabulary(Path(args.schema_file)),
+                store,
+                max_estimated_rows=args.max_plan_rows,
+            )
+            if args.preflight
+            else None
+        ),
+        semantic_cache=(
+            SemanticCache(
+                max_entries=args.semantic_cache_size,
+                ttl_s=args.semantic_cache_ttl,
+                kg_version=store.data_version,
+            )
+            if args.semantic_cache
+            else None
+        ),
+    )
+
+
+def pipeline_stats(pipeline: KGPromptingPipeline) -> Dict[str, Any]:
+    """Stats of the optional layers the pipeline uses, by name."""
+    stats: Dict[str, Any] = {}
+    if isinstance(pipeline.store, BatchingGraphStore):
+        stats["graph_batching"] = pipeline.store.stats()
+    if pipeline.semantic_cache is not None:
+        stats["semantic_cache"] = pipeline.semantic_cache.stats()
+    client = pipeline.generation.client
+    if client.cache is not None:
+        stats["llm_cache"] = client.cache.stats()
+    if isinstance(client, LLMRouter):
+        stats["llm_providers"] = client.stats()
+    return stats
+
+
+def close_pipeline(pipeline: KGPromptingPipeline) -> None:
+    """Stop the pipeline's workers and close its graph store and LLM client."""
+    pipeline.close()
+    pipeline.store.close()
+    pipeline.generation.client.close()
@@ -0,0 +1,223 @@
+"""
+Client-side rate limiting for LLM endpoints: token buckets for requests and
+tokens per minute, Retry-After pauses, jittered exponential backoff and an
+AIMD concurrency limit, shared by every client of the same endpoint.
+"""
+
+from __future__ import annotations
+
+import email.utils
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+from src import tracing
+
+# 408/425/429 and transient server errors; other 4xx mean the request itself is wrong.
+RETRYABLE_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+# Statuses that mean "slow down", as opposed to a transient failure of one request.
+THROTTLE_STATUSES = frozenset({429, 503})
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a ``Retry-After`` header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(when.timestamp() - time.time(), 0.0)
+
+
+def backoff_delay(
+    attempt: int, base_s: float, cap_s: float = 60.0, rng: Optional[random.Random] = None
+) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)]."""
+    if base_s <= 0:
+        return 0.0
+    return (rng or random).uniform(0.0, min(cap_s, base_s * (2**attempt)))
+
+
+class TokenBucket:
+    """Refills at ``rate_per_s`` up to ``capacity``; the balance may go negative
+    when actual usage is settled above the estimate, delaying later callers."""
+
+    def __init__(self, rate_per_s: float, capacity: float) -> None:
+        self.rate_per_s = rate_per_s
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate_per_s)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Take ``amount`` now and return how long the caller must wait before using it."""
+        with self._lock:
+            self._refill(time.monotonic())
+            # A request larger than the bucket waits for a full bucket instead of forever.
+            self._tokens -= min(amount, self.capacity)
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate_per_s
+
+    def adjust(self, amount: float) -> None:
+        """Return (positive) or take (negative) tokens after the real cost is known."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+
+class AIMDLimiter:
+    """Concurrency limit that grows by one per window of successes and halves on throttling.
+
+    ``acquire`` returns the current epoch; a throttle only shrinks the limit if
+    its request started after the previous decrease, so one burst of 429s from
+    requests already in flight counts as a single signal.
+    """
+
+    def __init__(
+        self, initial: int = 8, minimum: int = 1, maximum: int = 64, decrease: float = 0.5
+    ) -> None:
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.decrease = decrease
+        self.in_flight = 0
+        self._epoch = 0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> int:
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+            return self._epoch
+
+    def release(self) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def on_success(self) -> None:
+        with self._cond:
+            if self.limit < self.maximum:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+                self._cond.notify_all()
+
+    def on_throttle(self, epoch: int) -> None:
+        with self._cond:
+            if epoch == self._epoch:
+                self.limit = max(self.minimum, self.limit * self.decrease)
+                self._epoch += 1
+
+
+class RateLimiter:
+    """Per-endpoint scheduler: RPM/TPM buckets, Retry-After pauses and AIMD concurrency."""
+
+    def __init__(
+        self,
+        rpm: Optional[float] = None,
+        tpm: Optional[float] = None,
+        max_concurrency: int = 64,
+        initial_concurrency: Optional[int] = None,
+        burst_s: float = 6.0,
+    ) -> None:
+        # Buckets hold ``burst_s`` seconds of quota so a cold start cannot spend a whole minute.
+        self.requests = TokenBucket(rpm / 60.0, max(1.0, rpm / 60.0 * burst_s)) if rpm else None
+        self.tokens = TokenBucket(tpm / 60.0, max(1.0, tpm / 60.0 * burst_s)) if tpm else None
+        # Start wide open; the limit only drops once the provider actually throttles.
+        self.concurrency = AIMDLimiter(
+            initial_concurrency or max_concurrency, maximum=max_concurrency
+        )
+        self.throttled = 0
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds: float) -> None:
+        """Hold every new request to this endpoint for ``seconds`` (from Retry-After)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def on_throttle(self, epoch: int, retry_after: Optional[float] = None) -> None:
+        with self._lock:
+            self.throttled += 1
+        tracing.add(throttled=1)
+        self.concurrency.on_throttle(epoch)
+        if retry_after:
+            self.pause(retry_after)
+
+    def _wait(self, estimated_tokens: int) -> float:
+        delays = [self._paused_until - time.monotonic()]
+        if self.requests is not None:
+            delays.append(self.requests.reserve(1))
+        if self.tokens is not None:
+            delays.append(self.tokens.reserve(estimated_tokens))
+        return max(0.0, *delays)
+
+    @contextmanager
+    def slot(self, estimated_tokens: int = 0) -> Iterator["RateLimiter"]:
+        """Wait for quota and a concurrency slot for one request.
+
+        An exception with a throttling ``status`` (and optional ``retry_after``)
+        leaving the block shrinks the concurrency limit; a clean exit grows it.
+        Callers ``settle`` real token usage afterwards.
+        """
+        start = time.perf_counter()
+        delay = self._wait(estimated_tokens)
+        if delay > 0:
+            time.sleep(delay)
+        epoch = self.concurrency.acquire()
+        waited = time.perf_counter() - start
+        if waited > 0.001:
+            tracing.add(rate_limit_wait_s=round(waited, 6))
+        try:
+            yield self
+        except Exception as exc:
+            if getattr(exc, "status", None) in THROTTLE_STATUSES:
+                self.on_throttle(epoch, getattr(exc, "retry_after", None))
+            raise
+        else:
+            self.concurrency.on_success()
+        finally:
+            self.concurrency.release()
+
+    def settle(self, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        if self.tokens is not None and actual_tokens is not None:
+            self.tokens.adjust(estimated_tokens - actual_tokens)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "concurrency_limit": round(self.concurrency.limit, 2),
+            "in_flight": self.concurrency.in_flight,
+            "throttled": self.throttled,
+        }
+
+
+_limiters: Dict[Tuple[str, str], RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def shared_limiter(
+    endpoint: str,
+    model: str,
+    rpm: Optional[float] = None,
+    tpm: Optional[float] = None,
+    max_concurrency: int = 64,
+) -> RateLimiter:
+    """The process-wide limiter for ``model`` at ``endpoint`` (providers meter per model),
+    so every client shares one budget; the first caller's limits apply."""
+    key = (endpoint.rstrip("/"), model)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = RateLimiter(rpm, tpm, max_concurrency)
+        return limiter
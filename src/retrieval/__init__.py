@@ -1,3 +1,3 @@
-from .retrieval_module import RetrievalModule
+from .retrieval_module import RetrievalModule, RetrievalResult
 
-__all__ = ["RetrievalModule"]
+__all__ = ["RetrievalModule", "RetrievalResult"]
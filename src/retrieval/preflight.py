@@ -0,0 +1,340 @@
+"""
+Pre-flight checks for generated Cypher (vocabulary, read-only, planner cost)
+and a deterministic relaxation ladder for queries that return no rows.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from src.kg.cypher_pattern import UnsupportedQueryError, parse_retrieval_cypher
+from src.kg.ontology import default_ontology
+from src.kg.pattern import ALIAS_LABELS, Condition, RetrievalPattern
+from src.kg.store import GraphStore, QueryPlan
+from src.kg.summary import SUMMARY_SIGNALS, SUMMARY_STATS
+
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_COMMENT_RE = re.compile(r"//[^\n]*")
+_WRITE_RE = re.compile(
+    r"\b(CREATE|MERGE|SET|DELETE|DETACH|REMOVE|FOREACH|DROP|LOAD\s+CSV|CALL)\b"
+    r"|\bapoc\.(?:create|merge|refactor|periodic|load|export|cypher\.do|nodes\.delete)",
+    re.IGNORECASE,
+)
+_NODE_RE = re.compile(r"\(\s*(\w*)\s*((?::\s*\w+\s*)+)(\{[^}]*\})?\s*\)")
+_REL_RE = re.compile(r"\[\s*(\w*)\s*:\s*([\w|:\s]+?)\s*(\{[^}]*\})?\s*[\]*]")
+_PROPERTY_RE = re.compile(r"(?<![\w.$])(\w+)\.(\w+)\b(?!\s*\()")
+_MAP_KEY_RE = re.compile(r"(\w+)\s*:")
+_SCHEMA_LABEL_RE = re.compile(r"^-\s*:(\w+)")
+_SCHEMA_REL_RE = re.compile(r"\[:(\w+)\]")
+_SCHEMA_SECTION_RE = re.compile(r"^(\w+):$")
+_SCHEMA_ITEM_RE = re.compile(r"^([\w<>]+)")
+
+# Plan operators that mean a full-graph scan or a join without a shared variable.
+REJECTED_OPERATORS = ("AllNodesScan", "CartesianProduct")
+# Categorical filters dropped first to last when a query returns nothing; the state type
+# and record ids define what the query is about and are never dropped.
+DROP_ORDER = (
+    "operatingSubphase",
+    "operatingPhase",
+    "operatingMode",
+    "drivingScenario",
+    "testProfile",
+    "deviceEnv",
+    "lifeStage",
+    "formFactor",
+    "manufacturer",
+    "componentType",
+    "chemistry",
+)
+KEEP_FILTERS = {("s", "stateType"), ("m", "recordId"), ("s", "recordId")}
+
+
+def _relation_type(name: str) -> str:
+    return re.sub(r"(?<=[a-z])(?=[A-Z])", "_", name).upper()
+
+
+def _merge_bounds(conditions: List[Condition]) -> List[Condition]:
+    """Repeated range bounds on one property collapse into the widest one."""
+    merged: List[Condition] = []
+    ranges: Dict[Tuple[str, str, str], int] = {}
+    for cond in conditions:
+        if cond.op not in (">=", ">", "<=", "<"):
+            merged.append(cond)
+            continue
+        key = (cond.alias, cond.prop, cond.op)
+        if key not in ranges:
+            ranges[key] = len(merged)
+            merged.append(cond)
+            continue
+        widest = min if cond.op in (">=", ">") else max
+        seen = merged[ranges[key]]
+        merged[ranges[key]] = replace(seen, value=widest(seen.value, cond.value))
+    return merged
+
+
+@dataclass
+class KGVocabulary:
+    labels: Set[str] = field(default_factory=set)
+    relationships: Set[str] = field(default_factory=set)
+    properties: Dict[str, Set[str]] = field(default_factory=dict)
+    # Property name -> ontology type ("float", "string", ...), for relaxation.
+    types: Dict[str, str] = field(default_factory=dict)
+
+
+def load_vocabulary(schema_file: Path = Path("configs/prompts/kg_schema.txt")) -> KGVocabulary:
+    """Labels, relationship types and properties from ``default_ontology()`` and the schema."""
+    vocab = KGVocabulary()
+    ontology = default_ontology()
+    for cls in ontology["classes"]:
+        label = cls.name.capitalize()
+        vocab.labels.add(label)
+        vocab.properties.setdefault(label, set()).update(cls.attributes)
+        vocab.types.update(cls.attributes)
+    for rel in ontology["relations"]:
+        rel_type = _relation_type(rel.name)
+        vocab.relationships.add(rel_type)
+        vocab.properties.setdefault(rel_type, set()).update(rel.attributes)
+    section: Optional[str] = None
+    for raw in schema_file.read_text(encoding="utf-8").splitlines():
+        line = raw.split("#", 1)[0].strip()
+        if match := _SCHEMA_LABEL_RE.match(line):
+            vocab.labels.add(match.group(1))
+        vocab.relationships.update(_SCHEMA_REL_RE.findall(line))
+        if match := _SCHEMA_SECTION_RE.match(line):
+            section = match.group(1) if match.group(1) in vocab.labels else None
+            continue
+        if section is None or not line:
+            continue
+        for part in line.lstrip("- ").split(","):
+            item = _SCHEMA_ITEM_RE.match(part.strip())
+            if not item:
+                continue
+            name = item.group(1)
+            if "<signal>" in name:
+                names = {
+                    name.replace("<signal>", signal).replace("<stat>", stat)
+                    for signal in SUMMARY_SIGNALS
+                    for stat in SUMMARY_STATS
+                }
+            else:
+                names = {name}
+            vocab.properties.setdefault(section, set()).update(names)
+    for label in vocab.labels:
+        vocab.properties.setdefault(label, set())
+    # Every summary_* column is a float filter.
+    for props in vocab.properties.values():
+        vocab.types.update({p: "float" for p in props if p.startswith("summary_")})
+    return vocab
+
+
+@dataclass
+class PreflightReport:
+    errors: List[str] = field(default_factory=list)
+    plan: Optional[QueryPlan] = None
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
+class PreflightError(ValueError):
+    def __init__(self, report: PreflightReport) -> None:
+        super().__init__("Cypher rejected by pre-flight: " + "; ".join(report.errors))
+        self.report = report
+
+
+@dataclass
+class RelaxedQuery:
+    step: str
+    cypher: str
+    parameters: Dict[str, Any]
+
+
+class CypherPreflight:
+    """Validate generated Cypher before it runs and relax it when it matches nothing.
+
+    ``check`` rejects write clauses, labels/relationships/properties outside
+    the KG vocabulary and, when the store can plan queries, plans estimated
+    above ``max_estimated_rows`` or using a full scan/cartesian product.
+    ``relaxations`` yields progressively looser versions of a retrieval-pattern
+    query: numeric ranges widened, then categorical filters dropped one by one.
+    """
+
+    def __init__(
+        self,
+        vocabulary: KGVocabulary,
+        store: Optional[GraphStore] = None,
+        max_estimated_rows: Optional[float] = None,
+        rejected_operators: Tuple[str, ...] = REJECTED_OPERATORS,
+        widen_factors: Tuple[float, ...] = (2.0, 4.0),
+        max_relaxations: int = 6,
+    ) -> None:
+        self.vocabulary = vocabulary
+        self.store = store
+        self.max_estimated_rows = max_estimated_rows
+        self.rejected_operators = rejected_operators
+        self.widen_factors = widen_factors
+        self.max_relaxations = max_relaxations
+
+    def validate(self, cypher: str) -> List[str]:
+        """Static checks; returns a list of problems (empty when the query is acceptable)."""
+        text = _STRING_RE.sub("''", _COMMENT_RE.sub("", cypher))
+        errors = [
+            f"write or procedure clause {match.group(0).upper()!r} is not allowed"
+            for match in _WRITE_RE.finditer(text)
+        ]
+        vocab = self.vocabulary
+        aliases: Dict[str, str] = {}
+        for alias, labels, props in _NODE_RE.findall(text):
+            for label in re.findall(r"\w+", labels):
+                if label not in vocab.labels:
+                    errors.append(f"unknown label :{label}")
+                elif alias:
+                    aliases.setdefault(alias, label)
+                if props:
+                    errors.extend(self._unknown_keys(label, props))
+        for alias, types, props in _REL_RE.findall(text):
+            rel_types = [t for t in re.split(r"[|:\s]+", types) if t]
+            for rel_type in rel_types:
+                if rel_type not in vocab.relationships:
+                    errors.append(f"unknown relationship type :{rel_type}")
+            known = [t for t in rel_types if t in vocab.relationships]
+            if alias and len(known) == 1:
+                aliases.setdefault(alias, known[0])
+            if props and len(known) == 1:
+                errors.extend(self._unknown_keys(known[0], props))
+        for alias, prop in _PROPERTY_RE.findall(text):
+            label = aliases.get(alias)
+            if label is not None and prop not in vocab.properties.get(label, ()):
+                errors.append(f"unknown property {alias}.{prop} on :{label}")
+        return list(dict.fromkeys(errors))
+
+    def _unknown_keys(self, label: str, props: str) -> List[str]:
+        known = self.vocabulary.properties.get(label, set())
+        return [
+            f"unknown property {key} on :{label}"
+            for key in _MAP_KEY_RE.findall(props)
+            if key not in known
+        ]
+
+    def check(self, cypher: str, parameters: Optional[Dict[str, Any]] = None) -> PreflightReport:
+        """Run ``validate`` and the planner cost guard; raises ``PreflightError`` on failure."""
+        report = PreflightReport(errors=self.validate(cypher))
+        if report.ok and self.store is not None and (
+            self.max_estimated_rows is not None or self.rejected_operators
+        ):
+            try:
+                report.plan = self.store.explain(cypher, parameters)
+            except UnsupportedQueryError as exc:
+                report.errors.append(str(exc))
+            plan = report.plan
+            if plan is not None:
+                for operator in self.rejected_operators:
+                    if operator in plan.operators:
+                        report.errors.append(f"plan uses {operator}")
+                if (
+                    self.max_estimated_rows is not None
+                    and plan.estimated_rows > self.max_estimated_rows
+                ):
+                    report.errors.append(
+                        f"plan estimates {plan.estimated_rows:.0f} rows "
+                        f"(limit {self.max_estimated_rows:.0f})"
+                    )
+        if not report.ok:
+            raise PreflightError(report)
+        return report
+
+    def _widen(self, cond: Condition, bounds: Dict[str, float], factor: float) -> Condition:
+        low, high = bounds.get("low"), bounds.get("high")
+        if low is not None and high is not None:
+            half = (high - low) / 2 or max(abs(low) * 0.05, 1e-3)
+            center = (high + low) / 2
+            low, high = center - half * factor, center + half * factor
+        else:
+            anchor = low if low is not None else high
+            spread = max(abs(anchor) * 0.1, 0.1) * (factor - 1)
+            low = low - spread if low is not None else None
+            high = high + spread if high is not None else None
+        value = low if cond.op in (">=", ">") else high
+        return replace(cond, value=round(value, 6))
+
+    def _relaxed(
+        self, pattern: RetrievalPattern, factor: float, dropped: Set[Tuple[str, str]]
+    ) -> RetrievalPattern:
+        bounds: Dict[Tuple[str, str], Dict[str, float]] = {}
+        for cond in pattern.conditions:
+            if isinstance(cond.value, (int, float)) and not isinstance(cond.value, bool):
+                key = bounds.setdefault((cond.alias, cond.prop), {})
+                if cond.op in (">=", ">"):
+                    key["low"] = float(cond.value)
+                elif cond.op in ("<=", "<"):
+                    key["high"] = float(cond.value)
+        conditions: List[Condition] = []
+        for cond in pattern.conditions:
+            key = (cond.alias, cond.prop)
+            if key in dropped:
+                continue
+            if cond.op in (">=", ">", "<=", "<") and key in bounds:
+                conditions.append(self._widen(cond, bounds[key], factor))
+            elif (
+                cond.op == "="
+                and self.vocabulary.types.get(cond.prop) == "float"
+                and isinstance(cond.value, (int, float))
+                and not isinstance(cond.value, bool)
+            ):
+                # An exact float match becomes a range around the value.
+                spread = max(abs(cond.value) * 0.05, 0.5) * factor
+                conditions.append(Condition(cond.alias, cond.prop, ">=", cond.value - spread))
+                conditions.append(Condition(cond.alias, cond.prop, "<=", cond.value + spread))
+            else:
+                conditions.append(cond)
+        return RetrievalPattern(conditions=_merge_bounds(conditions), limit=pattern.limit)
+
+    def relaxations(
+        self, cypher: str, parameters: Optional[Dict[str, Any]] = None
+    ) -> Iterator[RelaxedQuery]:
+        """Looser variants of a retrieval-pattern query, least to most relaxed.
+
+        Queries outside the retrieval pattern yield nothing.
+        """
+        try:
+            pattern = parse_retrieval_cypher(cypher, parameters).pattern
+        except UnsupportedQueryError:
+            return
+        categorical = [
+            (cond.alias, cond.prop)
+            for cond in pattern.conditions
+            if cond.op in ("=", "IN")
+            and cond.alias in ALIAS_LABELS
+            and (cond.alias, cond.prop) not in KEEP_FILTERS
+            and self.vocabulary.types.get(cond.prop) != "float"
+        ]
+        order = {prop: i for i, prop in enumerate(DROP_ORDER)}
+        # Filters the ladder does not know about go first; they are the likeliest mistakes.
+        categorical = sorted(dict.fromkeys(categorical), key=lambda key: order.get(key[1], -1))
+        steps: List[Tuple[str, float, Set[Tuple[str, str]]]] = [
+            (f"widen x{factor:g}", factor, set()) for factor in self.widen_factors
+        ]
+        widest = self.widen_factors[-1] if self.widen_factors else 1.0
+        dropped: Set[Tuple[str, str]] = set()
+        for key in categorical:
+            dropped = dropped | {key}
+            names = ", ".join(f"{alias}.{prop}" for alias, prop in sorted(dropped))
+            steps.append((f"widen x{widest:g}, drop {names}", widest, dropped))
+        previous: Optional[str] = None
+        for step, factor, drop in steps[: self.max_relaxations]:
+            try:
+                relaxed_cypher, relaxed_parameters = self._relaxed(
+                    pattern, factor, drop
+                ).to_cypher()
+            except ValueError:
+                # E.g. the same equality filter twice: no parameterized form to relax.
+                continue
+            signature = f"{relaxed_cypher}{sorted(relaxed_parameters.items(), key=str)}"
+            if signature == previous:
+                continue
+            previous = signature
+            yield RelaxedQuery(step, relaxed_cypher, relaxed_parameters)
@@ -1,12 +1,64 @@
 from __future__ import annotations
 
 import json
-from dataclasses import dataclass
+import re
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Optional
 
-from src.config import LLMConfig, load_yaml_config
-from src.llm_client import LLMClient, LLMRequest
+from src import tracing
+from src.config import LLMConfig, load_llm_config
+from src.file_cache import read_text_cached
+from src.llm_client import LLMRequest
+from src.llm_router import ChatClient, build_llm_client
+
+
+_CYPHER_FIELD_RE = re.compile(r'"cypher"\s*:\s*"')
+
+
+class CypherStreamExtractor:
+    """Pulls the ``cypher`` string out of a streamed ``{"cypher": ..., "rationale": ...}``
+    reply as soon as its closing quote arrives."""
+
+    def __init__(self) -> None:
+        self.buffer = ""
+        self.cypher: Optional[str] = None
+        self._start: Optional[int] = None
+        self._pos = 0
+        self._done = False
+
+    def feed(self, delta: str) -> Optional[str]:
+        """Add a chunk; returns the Cypher once, on the chunk that completes it.
+
+        A field that is not valid JSON (e.g. an unescaped ``\\d`` in a regex) is
+        never returned; the caller parses the whole reply once the stream ends.
+        """
+        self.buffer += delta
+        if self._done:
+            return None
+        if self._start is None:
+            match = _CYPHER_FIELD_RE.search(self.buffer)
+            if not match:
+                return None
+            self._start = self._pos = match.end()
+        buf = self.buffer
+        i = self._pos
+        while i < len(buf):
+            if buf[i] == "\\":
+                if i + 1 >= len(buf):
+                    break
+                i += 2
+                continue
+            if buf[i] == '"':
+                self._done = True
+                try:
+                    self.cypher = json.loads('"' + buf[self._start : i] + '"').strip()
+                except json.JSONDecodeError:
+                    return None
+                return self.cypher
+            i += 1
+        self._pos = i
+        return None
 
 
 @dataclass
@@ -14,6 +66,8 @@ class RetrievalResult:
     sparql: str
     rationale: Optional[str]
     raw: str
+    parameters: Dict[str, Any] = field(default_factory=dict)
+    source: str = "llm"
 
 
 class RetrievalModule:
@@ -23,17 +77,15 @@ class RetrievalModule:
         system_prompt_path: Path,
         temperature: float = 0.0,
         max_tokens: Optional[int] = None,
+        client: Optional[ChatClient] = None,
+        stream: bool = False,
     ) -> None:
         self.llm_config = llm_config
         self.system_prompt_path = system_prompt_path
         self.temperature = temperature
         self.max_tokens = max_tokens
-        self.client = LLMClient(
-            api_base=llm_config.api_base,
-            api_key=llm_config.api_key,
-            max_retries=llm_config.max_retries,
-            retry_backoff=llm_config.retry_backoff,
-        )
+        self.client = client or build_llm_client(llm_config)
+        self.stream = stream
 
     def build_prompt(
         self,
@@ -42,7 +94,7 @@ class RetrievalModule:
         value_dict: str,
         cypher_example: str,
     ) -> str:
-        template = self.system_prompt_path.read_text(encoding="utf-8")
+        template = read_text_cached(self.system_prompt_path)
         return template.format(
             kg_schema=kg_schema,
             kg_value_dict=value_dict,
@@ -56,16 +108,33 @@ class RetrievalModule:
         kg_schema: str,
         value_dict: str,
         cypher_example: str,
+        on_cypher: Optional[Callable[[str], Any]] = None,
     ) -> RetrievalResult:
-        prompt = self.build_prompt(user_query, kg_schema, value_dict, cypher_example)
-        request = LLMRequest(
-            model=self.llm_config.model,
-            messages=[{"role": "system", "content": prompt}],
-            temperature=self.temperature,
-            max_tokens=self.max_tokens,
-        )
-        response = self.client.chat(request)
-        raw = self.client.extract_text(response).strip()
+        """Generate the retrieval Cypher.
+
+        When streaming, ``on_cypher`` is called with the Cypher as soon as its
+        JSON field is complete, while the rationale is still being generated.
+        """
+        with tracing.span("retrieval.generate_cypher", model=self.llm_config.model):
+            with tracing.span("retrieval.build_prompt") as span:
+                prompt = self.build_prompt(user_query, kg_schema, value_dict, cypher_example)
+                span.set(prompt_chars=len(prompt))
+            request = LLMRequest(
+                model=self.llm_config.model,
+                messages=[{"role": "system", "content": prompt}],
+                temperature=self.temperature,
+                max_tokens=self.max_tokens,
+            )
+            if self.stream:
+                extractor = CypherStreamExtractor()
+                for delta in self.client.chat_stream(request):
+                    cypher = extractor.feed(delta)
+                    if cypher is not None and on_cypher is not None:
+                        on_cypher(cypher)
+                raw = extractor.buffer.strip()
+            else:
+                response = self.client.chat(request)
+                raw = self.client.extract_text(response).strip()
         sparql = raw
         rationale = None
         try:
@@ -84,8 +153,7 @@ def load_retrieval_module(
     temperature: float = 0.0,
     max_tokens: Optional[int] = None,
 ) -> RetrievalModule:
-    llm_dict = load_yaml_config(llm_config_path)
-    llm_config = LLMConfig(**llm_dict)
+    llm_config = load_llm_config(llm_config_path)
     return RetrievalModule(
         llm_config=llm_config,
         system_prompt_path=system_prompt_path,
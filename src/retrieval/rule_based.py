@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Optional
+
+from src.kg.features import query_hints, query_summary
+from src.kg.ontology import default_ontology
+from src.kg.pattern import Condition, RetrievalPattern
+from src.kg.summary import SUMMARY_SIGNALS, summary_property
+from src.retrieval.retrieval_module import RetrievalResult
+
+# Half-width of the summary mean range around the user's mean, per signal.
+DEFAULT_MARGINS = {"voltage_v": 0.3, "current_a": 1.0, "temperature_c": 5.0}
+# Float hints matched as +/- ranges instead of exact values.
+DEFAULT_TOLERANCES = {"temperature_C": 5.0}
+ONTOLOGY_ALIASES = {"component": "c", "context": "ctx", "state": "s"}
+
+
+class RuleBasedQueryBuilder:
+    """Deterministic Cypher for queries with a (V, I, T) sequence and KG hints.
+
+    Filter fields and their types come from the ontology; categorical values
+    must match the value dictionary. ``build`` returns ``None`` when the query
+    has no parseable sequence, so callers can fall back to the retrieval LLM.
+    """
+
+    def __init__(
+        self,
+        value_dict: Dict[str, Any],
+        limit: int = 3,
+        margins: Optional[Dict[str, float]] = None,
+        tolerances: Optional[Dict[str, float]] = None,
+    ) -> None:
+        self.value_dict = value_dict
+        self.limit = limit
+        self.margins = dict(DEFAULT_MARGINS, **(margins or {}))
+        self.tolerances = dict(DEFAULT_TOLERANCES, **(tolerances or {}))
+        self.attribute_types: Dict[str, Dict[str, str]] = {}
+        for cls in default_ontology()["classes"]:
+            alias = ONTOLOGY_ALIASES.get(cls.name)
+            if alias:
+                self.attribute_types[alias] = cls.attributes
+
+    def _alias_for(self, prop: str) -> Optional[str]:
+        for alias, attributes in self.attribute_types.items():
+            if prop in attributes:
+                return alias
+        return None
+
+    def _value_range(self, key: str) -> Dict[str, Any]:
+        return self.value_dict.get(key) or {}
+
+    def build(self, user_query: str) -> Optional[RetrievalPattern]:
+        summary = query_summary(user_query)
+        if summary is None:
+            return None
+        conditions = []
+        for prop, value in query_hints(user_query, self.value_dict).items():
+            alias = self._alias_for(prop)
+            if alias is None:
+                continue
+            tolerance = self.tolerances.get(prop)
+            if self.attribute_types[alias][prop] == "float" and tolerance is not None:
+                conditions.append(Condition(alias, prop, ">=", value - tolerance))
+                conditions.append(Condition(alias, prop, "<=", value + tolerance))
+            else:
+                conditions.append(Condition(alias, prop, "=", value))
+        state_type = (self._value_range("state.SOC.stateType").get("examples") or ["SOC"])[0]
+        conditions.append(Condition("s", "stateType", "=", state_type))
+        for signal in SUMMARY_SIGNALS:
+            prop = summary_property(signal, "mean")
+            mean = summary[prop]
+            bounds = self._value_range(f"measurement.summary.{signal}.mean")
+            low = mean - self.margins[signal]
+            high = mean + self.margins[signal]
+            if bounds.get("min") is not None:
+                low = max(low, float(bounds["min"]))
+            if bounds.get("max") is not None:
+                high = min(high, float(bounds["max"]))
+            if low > high:
+                low, high = high, low
+            conditions.append(Condition("m", prop, ">=", round(low, 4)))
+            conditions.append(Condition("m", prop, "<=", round(high, 4)))
+        return RetrievalPattern(conditions=conditions, limit=self.limit)
+
+    def generate_cypher(self, user_query: str) -> Optional[RetrievalResult]:
+        pattern = self.build(user_query)
+        if pattern is None:
+            return None
+        cypher, parameters = pattern.to_cypher()
+        filters = ", ".join(f"{c.alias}.{c.prop} {c.op} {c.value!r}" for c in pattern.conditions)
+        return RetrievalResult(
+            sparql=cypher,
+            rationale=f"Rule-based query from the parsed (V, I, T) sequence: {filters}",
+            raw="",
+            parameters=parameters,
+            source="rules",
+        )
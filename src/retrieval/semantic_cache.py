@@ -0,0 +1,160 @@
+"""
+Approximate cache in front of the retrieval stage.
+
+Queries are keyed by their categorical hints plus bucketed (V, I, T) summary
+statistics, so near-duplicate measurements of the same cell share one entry. A
+hit reuses the Cypher that already ran (after pre-flight/relaxation) and its KG
+rows, skipping both the retrieval LLM and the graph query.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from src.kg.features import query_hints, query_summary
+
+# Bucket widths per summary signal (V, A, degC) and for numeric hints.
+DEFAULT_BUCKETS = {"voltage_v": 0.02, "current_a": 0.25, "temperature_c": 2.0}
+HINT_BUCKETS = {"temperature_C": 2.0, "ratedCapacity_Ah": 0.1}
+
+
+def _bucket(value: float, width: float) -> int:
+    return int(round(value / width))
+
+
+def semantic_key(
+    user_query: str,
+    value_dict: Dict[str, Any],
+    buckets: Optional[Dict[str, float]] = None,
+) -> Optional[str]:
+    """Cache key of a query, or ``None`` when it has no (V, I, T) sequence to summarize."""
+    summary = query_summary(user_query)
+    if summary is None:
+        return None
+    buckets = buckets or DEFAULT_BUCKETS
+    stats = {}
+    for prop, value in summary.items():
+        signal = next((name for name in buckets if name in prop), None)
+        stats[prop] = _bucket(value, buckets[signal]) if signal else value
+    hints = {
+        name: _bucket(value, HINT_BUCKETS[name]) if name in HINT_BUCKETS else value
+        for name, value in query_hints(user_query, value_dict).items()
+    }
+    return json.dumps({"hints": hints, "summary": stats}, sort_keys=True)
+
+
+@dataclass
+class CachedRetrieval:
+    cypher: str
+    parameters: Dict[str, Any]
+    rows: List[Dict[str, Any]]
+    source: str
+    raw: str = ""
+    relaxation: str = ""
+    created: float = field(default_factory=time.monotonic)
+    kg_version: Optional[str] = None
+
+
+class SemanticCache:
+    """Thread-safe in-memory LRU of retrieval results with a TTL and KG-version check.
+
+    ``kg_version`` (e.g. ``GraphStore.data_version``) is polled at most every
+    ``version_check_s``; when it changes every entry is dropped. Cached rows are
+    shared between hits and must be treated as read-only.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_s: float = 3600.0,
+        kg_version: Optional[Callable[[], Optional[str]]] = None,
+        version_check_s: float = 30.0,
+        buckets: Optional[Dict[str, float]] = None,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.kg_version = kg_version
+        self.version_check_s = version_check_s
+        self.buckets = buckets or dict(DEFAULT_BUCKETS)
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[str, CachedRetrieval]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version: Optional[str] = kg_version() if kg_version is not None else None
+        self._version_checked = time.monotonic()
+
+    def key(self, user_query: str, value_dict: Dict[str, Any]) -> Optional[str]:
+        return semantic_key(user_query, value_dict, self.buckets)
+
+    def _check_version(self) -> None:
+        if self.kg_version is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._version_checked < self.version_check_s:
+                return
+            self._version_checked = now
+        version = self.kg_version()
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+
+    def get(self, key: Optional[str]) -> Optional[CachedRetrieval]:
+        if key is None:
+            return None
+        self._check_version()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry.created > self.ttl_s:
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Optional[str], entry: CachedRetrieval) -> None:
+        if key is None or self.max_entries <= 0:
+            return
+        with self._lock:
+            entry.kg_version = self._version
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self) -> None:
+        with self._lock:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "kg_version": self._version,
+            }
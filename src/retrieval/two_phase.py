@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from src.kg.features import node_summary, query_summary, summary_distance
+from src.kg.store import GraphStore
+
+# Labels whose nodes carry large ``values`` arrays that phase one leaves behind.
+VALUE_LABELS = ("Measurement", "State")
+
+_NODE_ALIAS_RE = re.compile(r"\(\s*(\w+)\s*:\s*(\w+)")
+_REL_ALIAS_RE = re.compile(r"\[\s*(\w+)\s*:\s*\w+")
+_RETURN_RE = re.compile(r"\bRETURN\b", re.IGNORECASE)
+_RETURN_TAIL_RE = re.compile(r"\s+(?=(?:ORDER\s+BY|SKIP|LIMIT)\b)", re.IGNORECASE)
+_IDENT_RE = re.compile(r"^\w+$")
+
+
+def to_lean_cypher(cypher: str) -> Optional[str]:
+    """Rewrite ``RETURN c, ctx, m, ...`` into map projections without value arrays.
+
+    Returns ``None`` when the RETURN clause is not a plain list of aliases, in
+    which case the caller should run the original query.
+    """
+    query = cypher.strip().rstrip(";")
+    returns = list(_RETURN_RE.finditer(query))
+    if not returns:
+        return None
+    head = query[: returns[-1].start()]
+    clause = query[returns[-1].end():]
+    parts = _RETURN_TAIL_RE.split(clause, maxsplit=1)
+    items = [item.strip() for item in parts[0].split(",")]
+    tail = f" {parts[1].strip()}" if len(parts) > 1 else ""
+    if not items or not all(_IDENT_RE.match(item) for item in items):
+        return None
+
+    node_labels = dict(_NODE_ALIAS_RE.findall(head))
+    rel_aliases = set(_REL_ALIAS_RE.findall(head))
+    projections = []
+    for alias in items:
+        if node_labels.get(alias) in VALUE_LABELS:
+            projections.append(f"{alias} {{.*, values: null}} AS {alias}")
+        elif alias in rel_aliases:
+            projections.append(f"{alias} {{.*, type: type({alias})}} AS {alias}")
+        else:
+            projections.append(alias)
+    return f"{head}RETURN {', '.join(projections)}{tail}"
+
+
+def rank_rows(rows: List[Dict[str, Any]], user_query: str) -> List[Dict[str, Any]]:
+    """Order rows by closeness of their Measurement summary to the user's sequence."""
+    target = query_summary(user_query)
+    if target is None:
+        return rows
+    scored = []
+    for position, row in enumerate(rows):
+        measurement = row.get("m") or {}
+        scored.append((summary_distance(target, node_summary(measurement)), position, row))
+    scored.sort(key=lambda item: (item[0], item[1]))
+    return [row for _, _, row in scored]
+
+
+def attach_values(
+    store: GraphStore,
+    rows: List[Dict[str, Any]],
+    aliases: Tuple[str, ...] = ("m", "s"),
+) -> None:
+    """Fetch and decode value arrays for the given rows, in place (see ``src.kg.values``)."""
+    wanted: Dict[str, Set[Any]] = {}
+    for row in rows:
+        for alias in aliases:
+            node = row.get(alias)
+            if node and node.get("recordId") is not None:
+                wanted.setdefault(alias, set()).add(node["recordId"])
+    labels = {"m": "Measurement", "s": "State"}
+    fetched = {
+        alias: store.fetch_values(labels[alias], sorted(ids)) for alias, ids in wanted.items()
+    }
+    for row in rows:
+        for alias, values_by_id in fetched.items():
+            node = row.get(alias)
+            if node and node.get("recordId") in values_by_id:
+                node["values"] = values_by_id[node["recordId"]]
+
+
+def retrieve_two_phase(
+    store: GraphStore,
+    cypher: str,
+    user_query: str,
+    top_k: int = 3,
+    parameters: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    lean = to_lean_cypher(cypher)
+    if lean is None:
+        return store.run_read(cypher, parameters)
+    rows = rank_rows(store.run_read(lean, parameters), user_query)
+    attach_values(store, rows[:top_k])
+    return rows
@@ -0,0 +1,225 @@
+"""
+Append-only store of pipeline runs in one sqlite file.
+
+Each run is one row indexed by query id and timestamp. Large fields (prompts,
+KG results, triplets, traces) are zlib-compressed blobs keyed by a content hash,
+so a prompt or KG payload repeated across runs is stored once.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from src.kg.values import json_default
+
+# Record fields stored as deduplicated blobs; everything else is kept inline.
+BLOB_FIELDS = (
+    "retrieval_prompt",
+    "retrieval_response",
+    "kg_results",
+    "kg_triplets",
+    "enhanced_prompt",
+    "trace",
+)
+
+
+@dataclass
+class RunSummary:
+    run_id: int
+    query_id: str
+    created: float
+    error: Optional[str]
+
+
+def _encode(value: Any) -> Tuple[str, bytes]:
+    if isinstance(value, str):
+        return "text", value.encode("utf-8")
+    data = json.dumps(
+        value, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=json_default
+    )
+    return "json", data.encode("utf-8")
+
+
+def _decode(kind: str, data: bytes) -> Any:
+    text = data.decode("utf-8")
+    return text if kind == "text" else json.loads(text)
+
+
+class RunStore:
+    """Thread-safe writer and reader for pipeline run records."""
+
+    def __init__(self, path: Path, compress_level: int = 6) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.compress_level = compress_level
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            " hash TEXT PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " data BLOB NOT NULL,"
+            " size INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            " run_id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " query_id TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " error TEXT,"
+            " fields TEXT NOT NULL,"
+            " blobs TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS runs_query ON runs(query_id, created)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS runs_created ON runs(created)")
+        self._conn.commit()
+
+    def _put_blob(self, value: Any) -> str:
+        kind, data = _encode(value)
+        digest = hashlib.sha256(kind.encode("ascii") + b"\0" + data).hexdigest()
+        self._conn.execute(
+            "INSERT OR IGNORE INTO blobs (hash, kind, data, size) VALUES (?, ?, ?, ?)",
+            (digest, kind, zlib.compress(data, self.compress_level), len(data)),
+        )
+        return digest
+
+    def append(self, record: Dict[str, Any], created: Optional[float] = None) -> int:
+        """Store one run record (a batch result line plus optional large fields); returns its id."""
+        fields = {k: v for k, v in record.items() if k not in BLOB_FIELDS}
+        query_id = str(record.get("query_id") or "")
+        with self._lock:
+            blobs = {
+                name: self._put_blob(record[name])
+                for name in BLOB_FIELDS
+                if record.get(name) is not None
+            }
+            cursor = self._conn.execute(
+                "INSERT INTO runs (query_id, created, error, fields, blobs) VALUES (?, ?, ?, ?, ?)",
+                (
+                    query_id,
+                    time.time() if created is None else created,
+                    record.get("error"),
+                    json.dumps(fields, ensure_ascii=False, default=str),
+                    json.dumps(blobs),
+                ),
+            )
+            self._conn.commit()
+        return int(cursor.lastrowid)
+
+    def _load(self, row: Tuple[Any, ...]) -> Dict[str, Any]:
+        run_id, created, fields, blobs = row
+        record: Dict[str, Any] = json.loads(fields)
+        for name, digest in json.loads(blobs).items():
+            kind, data = self._conn.execute(
+                "SELECT kind, data FROM blobs WHERE hash = ?", (digest,)
+            ).fetchone()
+            record[name] = _decode(kind, zlib.decompress(data))
+        record["run_id"] = run_id
+        record["created"] = created
+        return record
+
+    def get(self, run_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT run_id, created, fields, blobs FROM runs WHERE run_id = ?", (run_id,)
+            ).fetchone()
+            return self._load(row) if row is not None else None
+
+    def latest(self, query_id: str) -> Optional[Dict[str, Any]]:
+        """Most recent run of ``query_id``."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT run_id, created, fields, blobs FROM runs WHERE query_id = ?"
+                " ORDER BY created DESC, run_id DESC LIMIT 1",
+                (str(query_id),),
+            ).fetchone()
+            return self._load(row) if row is not None else None
+
+    def runs(
+        self,
+        query_id: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        limit: Optional[int] = None,
+    ) -> List[RunSummary]:
+        """Runs matching the filters, newest first, without loading their blobs."""
+        clauses: List[str] = []
+        params: List[Any] = []
+        if query_id is not None:
+            clauses.append("query_id = ?")
+            params.append(str(query_id))
+        if since is not None:
+            clauses.append("created >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created < ?")
+            params.append(until)
+        sql = "SELECT run_id, query_id, created, error FROM runs"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY created DESC, run_id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [RunSummary(*row) for row in rows]
+
+    def iter_records(self, since: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """Full records in insertion order (e.g. to export a JSONL file)."""
+        last = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT run_id, created, fields, blobs FROM runs"
+                    " WHERE run_id > ? AND created >= ? ORDER BY run_id LIMIT 256",
+                    (last, since or 0.0),
+                ).fetchall()
+                records = [self._load(row) for row in rows]
+            if not records:
+                return
+            yield from records
+            last = records[-1]["run_id"]
+
+    def completed_ids(self) -> Set[str]:
+        """Query ids with at least one run that did not fail."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT query_id FROM runs WHERE error IS NULL"
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            runs, queries = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT query_id) FROM runs"
+            ).fetchone()
+            blobs, raw, stored = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(data)), 0) FROM blobs"
+            ).fetchone()
+            references = 0
+            for (row_blobs,) in self._conn.execute("SELECT blobs FROM runs"):
+                references += len(json.loads(row_blobs))
+        return {
+            "runs": runs,
+            "queries": queries,
+            "blobs": blobs,
+            "blob_references": references,
+            "blob_bytes_raw": raw,
+            "blob_bytes_stored": stored,
+            "file_bytes": self.path.stat().st_size if self.path.exists() else 0,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,282 @@
+"""
+Resident KG prompting service: one process keeps the graph store, LLM
+connections, prompt templates and pipeline assets warm and answers queries over
+HTTP, on a TCP port or a Unix socket.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Type
+
+from src import tracing
+from src.file_cache import ReloadingValue
+from src.kg.batching import BatchingGraphStore
+from src.kg.values import json_default
+from src.llm_router import ChatClient, LLMRouter
+from src.pipeline import KGPromptingPipeline, PipelineAssets
+from src.retrieval.preflight import PreflightError, load_vocabulary
+from src.retrieval.rule_based import RuleBasedQueryBuilder
+from src.run_store import RunStore
+
+
+class PipelineService:
+    """Shares one pipeline between concurrent requests and swaps in reloaded assets.
+
+    Changed asset files are picked up on the next query after ``assets`` notices
+    them; the rule-based builder and the pre-flight vocabulary are rebuilt along
+    with them. Templates are re-read by the modules themselves when they change.
+    """
+
+    def __init__(
+        self,
+        pipeline: KGPromptingPipeline,
+        assets: ReloadingValue[PipelineAssets],
+        schema_file: Path,
+        llm_client: Optional[ChatClient] = None,
+        max_concurrent: int = 32,
+        trace_window: int = 1000,
+        run_store: Optional[RunStore] = None,
+    ) -> None:
+        self.pipeline = pipeline
+        self.assets = assets
+        self.schema_file = schema_file
+        self.llm_client = llm_client
+        self.run_store = run_store
+        self.traces = tracing.TraceAggregator(window=trace_window)
+        self.started = time.time()
+        self.queries = 0
+        self.in_flight = 0
+        self._slots = threading.BoundedSemaphore(max(max_concurrent, 1))
+        self._lock = threading.Lock()
+        pipeline.assets = assets.get()
+
+    def refresh_assets(self, force: bool = False) -> bool:
+        if force:
+            self.assets.reload(force=True)
+        assets = self.assets.get()
+        if assets is self.pipeline.assets:
+            return False
+        with self._lock:
+            if assets is self.pipeline.assets:
+                return False
+            pipeline = self.pipeline
+            if pipeline.rule_based is not None:
+                pipeline.rule_based = RuleBasedQueryBuilder(
+                    assets.value_dict,
+                    limit=pipeline.rule_based.limit,
+                    margins=pipeline.rule_based.margins,
+                    tolerances=pipeline.rule_based.tolerances,
+                )
+            if pipeline.preflight is not None:
+                pipeline.preflight.vocabulary = load_vocabulary(self.schema_file)
+            if pipeline.semantic_cache is not None:
+                # Cache keys depend on the value dictionary's hint examples.
+                pipeline.semantic_cache.invalidate()
+            pipeline.assets = assets
+        return True
+
+    def run_query(
+        self,
+        user_query: str,
+        query_id: Optional[str] = None,
+        include_kg_results: bool = False,
+        include_trace: bool = False,
+        on_delta: Optional[Callable[[str], Any]] = None,
+    ) -> Dict[str, Any]:
+        """Run one query; the record has the same fields as a batch result line."""
+        self.refresh_assets()
+        with self._lock:
+            self.queries += 1
+            query_id = query_id or str(self.queries)
+        record: Dict[str, Any] = {"query_id": query_id, "user_query": user_query}
+        start = time.perf_counter()
+        output = None
+        with self._slots:
+            with self._lock:
+                self.in_flight += 1
+            try:
+                with tracing.start_trace(query_id) as trace:
+                    output = self.pipeline.run(user_query, on_delta=on_delta)
+            except PreflightError as exc:
+                record["error"] = f"{type(exc).__name__}: {exc}"
+                record["preflight_errors"] = exc.report.errors
+            except Exception as exc:
+                record["error"] = f"{type(exc).__name__}: {exc}"
+            else:
+                record.update(
+                    {
+                        "retrieval_response": output.retrieval_raw,
+                        "retrieval_source": output.retrieval_source,
+                        "cypher": output.cypher,
+                        "cypher_parameters": output.cypher_parameters,
+                        "kg_row_count": len(output.rows),
+                        "kg_triplets": output.triplets,
+                        "enhanced_prompt": output.enhanced_prompt,
+                        "stage_s": {stage: round(t, 4) for stage, t in output.timings.items()},
+                    }
+                )
+                if output.relaxation:
+                    record["relaxation"] = output.relaxation
+                if output.context_report:
+                    record["context_report"] = output.context_report
+                if include_kg_results:
+                    record["kg_results"] = output.rows
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+        self.traces.add(trace)
+        if include_trace:
+            record["trace"] = trace.to_dict()
+        record["elapsed_s"] = round(time.perf_counter() - start, 4)
+        if self.run_store is not None:
+            stored = dict(record, trace=trace.to_dict())
+            if output is not None:
+                stored["retrieval_prompt"] = output.retrieval_prompt
+                stored["kg_results"] = output.rows
+            self.run_store.append(stored)
+        return record
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "status": "ok",
+            "uptime_s": round(time.time() - self.started, 1),
+            "queries": self.queries,
+            "in_flight": self.in_flight,
+            "assets_version": self.assets.version,
+            "assets_error": self.assets.last_error,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {"health": self.health(), "traces": self.traces.summary()}
+        if isinstance(self.pipeline.store, BatchingGraphStore):
+            stats["graph_batching"] = self.pipeline.store.stats()
+        if self.pipeline.semantic_cache is not None:
+            stats["semantic_cache"] = self.pipeline.semantic_cache.stats()
+        client = self.llm_client
+        if client is not None:
+            if client.cache is not None:
+                stats["llm_cache"] = client.cache.stats()
+            if isinstance(client, LLMRouter):
+                stats["llm_providers"] = client.stats()
+        return stats
+
+
+def make_handler(service: PipelineService) -> Type[BaseHTTPRequestHandler]:
+    """Request handler for ``GET /health``, ``GET /stats``, ``POST /query`` and ``POST /reload``.
+
+    ``POST /query`` takes ``{"user_query": ..., "query_id"?, "include_kg_results"?,
+    "trace"?, "stream"?}``. With ``"stream": true`` the reply is an SSE stream of
+    ``{"delta": ...}`` events (when generation streams) and a final ``result`` event.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+        def address_string(self) -> str:
+            # Unix-socket peers have no (host, port) address.
+            return str(self.client_address[0]) if self.client_address else "unix"
+
+        def send_json(self, status: int, body: Dict[str, Any]) -> None:
+            data = json.dumps(body, ensure_ascii=True, default=json_default).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def send_event(self, event: str, body: Dict[str, Any]) -> None:
+            payload = json.dumps(body, ensure_ascii=True, default=json_default)
+            text = f"event: {event}\ndata: {payload}\n\n"
+            data = text.encode("utf-8")
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+        def do_GET(self) -> None:
+            path = self.path.rstrip("/")
+            if path == "/health":
+                self.send_json(200, service.health())
+            elif path == "/stats":
+                self.send_json(200, service.stats())
+            else:
+                self.send_json(404, {"error": f"Unknown path {self.path}"})
+
+        def do_POST(self) -> None:
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                payload = json.loads(self.rfile.read(length) or b"{}")
+            except json.JSONDecodeError as exc:
+                self.send_json(400, {"error": f"Invalid JSON: {exc}"})
+                return
+            path = self.path.rstrip("/")
+            if path == "/reload":
+                changed = service.refresh_assets(force=True)
+                self.send_json(200, dict(service.health(), reloaded=changed))
+                return
+            if path != "/query":
+                self.send_json(404, {"error": f"Unknown path {self.path}"})
+                return
+            user_query = payload.get("user_query") or payload.get("query")
+            if not isinstance(user_query, str) or not user_query.strip():
+                self.send_json(400, {"error": "Missing user_query."})
+                return
+            options = {
+                "query_id": payload.get("query_id"),
+                "include_kg_results": bool(payload.get("include_kg_results")),
+                "include_trace": bool(payload.get("trace")),
+            }
+            if not payload.get("stream"):
+                record = service.run_query(user_query, **options)
+                status = 200
+                if record.get("error"):
+                    status = 422 if "preflight_errors" in record else 500
+                self.send_json(status, record)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                record = service.run_query(
+                    user_query,
+                    on_delta=lambda delta: self.send_event("delta", {"delta": delta}),
+                    **options,
+                )
+                self.send_event("result", record)
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True
+
+    return Handler
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(
+    service: PipelineService,
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    unix_socket: Optional[Path] = None,
+) -> socketserver.BaseServer:
+    handler = make_handler(service)
+    if unix_socket is not None:
+        if unix_socket.exists():
+            os.unlink(unix_socket)
+        # TCP_NODELAY does not apply to Unix sockets.
+        unix_handler = type("UnixHandler", (handler,), {"disable_nagle_algorithm": False})
+        return UnixHTTPServer(str(unix_socket), unix_handler)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
@@ -0,0 +1,271 @@
+"""
+Lightweight per-query tracing: nested spans with wall time and counters
+(retries, tokens, rows, bytes), written as JSONL and optionally Chrome traces.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import itertools
+import json
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+_ids = itertools.count(1)
+_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("trace", default=None)
+_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("span", default=None)
+
+
+@dataclass
+class Span:
+    name: str
+    span_id: int
+    parent_id: Optional[int]
+    start_ts: float
+    thread_id: int
+    duration_s: float = 0.0
+    attrs: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+    # Work dispatched to other threads (hedged LLM calls, early graph reads) runs with
+    # a copy of the context and updates the same span.
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add(self, **counters: float) -> None:
+        with self._lock:
+            for key, value in counters.items():
+                self.attrs[key] = self.attrs.get(key, 0) + value
+
+    def set(self, **attrs: Any) -> None:
+        with self._lock:
+            self.attrs.update(attrs)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            attrs = dict(self.attrs)
+        data = {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ts": round(self.start_ts, 6),
+            "duration_s": round(self.duration_s, 6),
+            "thread_id": self.thread_id,
+            **attrs,
+        }
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+class _NullSpan:
+    """Returned by ``span`` outside a trace so call sites need no checks."""
+
+    def add(self, **counters: float) -> None:
+        pass
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Trace:
+    def __init__(self, trace_id: str) -> None:
+        self.trace_id = trace_id
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def _record(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self) -> Dict[str, Any]:
+        spans = sorted(self.spans, key=lambda s: s.start_ts)
+        return {"trace_id": self.trace_id, "spans": [s.to_dict() for s in spans]}
+
+
+def enabled() -> bool:
+    return _trace.get() is not None
+
+
+@contextmanager
+def start_trace(trace_id: str) -> Iterator[Trace]:
+    trace = Trace(trace_id)
+    trace_token = _trace.set(trace)
+    span_token = _span.set(None)
+    try:
+        yield trace
+    finally:
+        _span.reset(span_token)
+        _trace.reset(trace_token)
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Any]:
+    trace = _trace.get()
+    if trace is None:
+        yield _NULL_SPAN
+        return
+    parent = _span.get()
+    current = Span(
+        name=name,
+        span_id=next(_ids),
+        parent_id=parent.span_id if parent else None,
+        start_ts=time.time(),
+        thread_id=threading.get_ident(),
+        attrs=dict(attrs),
+    )
+    token = _span.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    except BaseException as exc:
+        current.error = f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        current.duration_s = time.perf_counter() - start
+        _span.reset(token)
+        trace._record(current)
+
+
+def add(**counters: float) -> None:
+    """Add counters (e.g. ``retries=1``) to the innermost open span, if any."""
+    current = _span.get()
+    if current is not None:
+        current.add(**counters)
+
+
+def annotate(**attrs: Any) -> None:
+    """Set attributes (e.g. ``first_token_s``) on the innermost open span, if any."""
+    current = _span.get()
+    if current is not None:
+        current.set(**attrs)
+
+
+def _size_default(value: Any) -> Any:
+    # Byte arrays (packed values) count at their wire size, not their repr.
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return "x" * max(len(value) - 2, 0)
+    return str(value)
+
+
+def json_size(value: Any) -> int:
+    """Approximate payload size in bytes; only computed while a trace is active."""
+    if not enabled():
+        return 0
+    return len(json.dumps(value, default=_size_default).encode("utf-8"))
+
+
+def chrome_events(trace: Trace, pid: int = 1) -> List[Dict[str, Any]]:
+    """Complete ("X") events for chrome://tracing or Perfetto."""
+    events = []
+    for s in trace.spans:
+        args = dict(s.attrs, trace_id=trace.trace_id)
+        if s.error:
+            args["error"] = s.error
+        events.append(
+            {
+                "name": s.name,
+                "ph": "X",
+                "ts": int(s.start_ts * 1e6),
+                "dur": int(s.duration_s * 1e6),
+                "pid": pid,
+                "tid": s.thread_id,
+                "args": args,
+            }
+        )
+    return events
+
+
+class TraceWriter:
+    """Appends one JSONL line per trace and keeps Chrome events until ``close``."""
+
+    def __init__(
+        self, jsonl_path: Optional[Path] = None, chrome_path: Optional[Path] = None
+    ) -> None:
+        self.jsonl_path = jsonl_path
+        self.chrome_path = chrome_path
+        self._lock = threading.Lock()
+        self._events: List[Dict[str, Any]] = []
+        self._file = None
+        if jsonl_path is not None:
+            jsonl_path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = jsonl_path.open("a", encoding="utf-8")
+
+    def write(self, trace: Trace) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.write(json.dumps(trace.to_dict(), default=str) + "\n")
+                self._file.flush()
+            if self.chrome_path is not None:
+                self._events.extend(chrome_events(trace))
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if self.chrome_path is not None:
+                self.chrome_path.parent.mkdir(parents=True, exist_ok=True)
+                self.chrome_path.write_text(
+                    json.dumps({"traceEvents": self._events, "displayTimeUnit": "ms"}),
+                    encoding="utf-8",
+                )
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    return ordered[max(1, math.ceil(q / 100.0 * len(ordered))) - 1]
+
+
+class TraceAggregator:
+    """Per-span-name totals over many traces (durations, counters, errors).
+
+    With ``window`` set, percentiles cover only the last ``window`` spans of each
+    name, so a long-running service keeps bounded memory.
+    """
+
+    def __init__(self, window: Optional[int] = None) -> None:
+        self._lock = threading.Lock()
+        self.window = window
+        self._durations: Dict[str, Deque[float]] = {}
+        self._counters: Dict[str, Dict[str, float]] = {}
+        self._errors: Dict[str, int] = {}
+        self.traces = 0
+
+    def add(self, trace: Trace) -> None:
+        with self._lock:
+            self.traces += 1
+            for s in trace.spans:
+                durations = self._durations.get(s.name)
+                if durations is None:
+                    durations = self._durations[s.name] = deque(maxlen=self.window)
+                durations.append(s.duration_s)
+                counters = self._counters.setdefault(s.name, {})
+                for key, value in s.attrs.items():
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        counters[key] = counters.get(key, 0) + value
+                if s.error:
+                    self._errors[s.name] = self._errors.get(s.name, 0) + 1
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = {}
+            for name, durations in self._durations.items():
+                ordered = sorted(durations)
+                spans[name] = {
+                    "count": len(ordered),
+                    "errors": self._errors.get(name, 0),
+                    "total_s": round(sum(ordered), 4),
+                    "mean_ms": round(1000 * sum(ordered) / len(ordered), 3),
+                    "p50_ms": round(1000 * _percentile(ordered, 50), 3),
+                    "p95_ms": round(1000 * _percentile(ordered, 95), 3),
+                    "max_ms": round(1000 * ordered[-1], 3),
+                    "totals": self._counters.get(name, {}),
+                }
+            return {"traces": self.traces, "spans": spans}